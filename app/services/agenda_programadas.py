@@ -0,0 +1,86 @@
+from app.utils.database_config import db_config
+import os
+import heapq
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+class AgendaProgramadas:
+    """
+    Agenda en memoria (heap) de las notificaciones programadas para la próxima ventana de tiempo.
+    El procesador la usa para despertarse justo a la hora de cada Fecha_Programada en lugar de
+    consultar la base más seguido. La ventana se refresca de forma incremental: solo se leen
+    las filas nuevas (IdNotificacion mayor al último visto) y el tramo que se agrega al final.
+    Las horas se comparan con el reloj del servidor SQL (GETDATE(), el mismo que usa el reclamo),
+    corrigiendo el reloj local con la diferencia medida en cada refresco.
+    """
+
+    def __init__(self, ventana_segundos=None):
+        self.ventana = timedelta(seconds=int(ventana_segundos or os.getenv('PROCESADOR_VENTANA_AGENDA_SEGUNDOS', 900)))
+        self._heap = []  # (Fecha_Programada, IdNotificacion)
+        self._ids = set()
+        self.hasta = None  # fin de la ventana ya cargada
+        self.ultimo_id = 0
+        self._desfase = timedelta(0)  # GETDATE() del servidor menos datetime.now() local
+
+    def _ahora(self):
+        """Hora actual según el servidor SQL"""
+        return datetime.now() + self._desfase
+
+    def refrescar(self):
+        """Agrega a la agenda las programadas nuevas y extiende la ventana hasta ahora + ventana"""
+        query = """
+        SELECT IdNotificacion, Fecha_Programada
+        FROM Notificaciones
+        WHERE Estado = 'pendiente'
+          AND Fecha_Programada > ?
+          AND Fecha_Programada <= ?
+          AND (IdNotificacion > ? OR Fecha_Programada > ?)
+        """
+
+        try:
+            fila = db_config.execute_query(
+                "SELECT MAX(IdNotificacion) AS MaxId, GETDATE() AS Ahora FROM Notificaciones")[0]
+            max_id = fila['MaxId'] or 0
+            ahora = fila['Ahora']
+            self._desfase = ahora - datetime.now()
+            nuevo_hasta = ahora + self.ventana
+            hasta_anterior = self.hasta or ahora
+            filas = db_config.execute_query(query, [ahora, nuevo_hasta, self.ultimo_id, hasta_anterior])
+        except Exception as e:
+            logger.error(f"Error refrescando agenda de notificaciones programadas: {e}")
+            return 0
+
+        agregadas = 0
+        for f in filas:
+            if f['IdNotificacion'] not in self._ids:
+                heapq.heappush(self._heap, (f['Fecha_Programada'], f['IdNotificacion']))
+                self._ids.add(f['IdNotificacion'])
+                agregadas += 1
+
+        self.hasta = nuevo_hasta
+        self.ultimo_id = max(self.ultimo_id, max_id)
+
+        if agregadas:
+            logger.info(f"🗓️ {agregadas} notificaciones programadas agregadas a la agenda "
+                        f"(próxima: {self._heap[0][0].strftime('%d/%m/%Y %H:%M')})")
+        return agregadas
+
+    def segundos_hasta_proxima(self):
+        """Segundos hasta la próxima notificación programada de la agenda (None si no hay)"""
+        if not self._heap:
+            return None
+        return max((self._heap[0][0] - self._ahora()).total_seconds(), 0)
+
+    def descartar_vencidas(self):
+        """Quita de la agenda las que ya vencieron (el ciclo del procesador las reclama) y retorna cuántas"""
+        ahora = self._ahora()
+        vencidas = 0
+        while self._heap and self._heap[0][0] <= ahora:
+            _, id_notificacion = heapq.heappop(self._heap)
+            self._ids.discard(id_notificacion)
+            vencidas += 1
+        return vencidas
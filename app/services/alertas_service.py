@@ -1,27 +1,471 @@
 from app.utils.database_config import db_config
 import logging
+import os
+import random
+import socket
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from app.services.email_service import EmailService
-from app.services.whatsapp_service import WhatsAppService
+from app.services.email_service import EmailService, ErrorSMTP
+from app.services.whatsapp_service import WhatsAppService, ErrorWhatsApp
+from app.services.tipos_notificacion_service import catalogo_tipos
+from app.services.resumen_service import destinatarios_resumen
+from app.services.auditoria_service import auditoria
+from app.utils.tokens_accion import firmador_tokens
 
 logger = logging.getLogger(__name__)
 email_service = EmailService()
 whatsapp_service = WhatsAppService()
 
+# Identificador de este procesador para reclamar notificaciones (varios workers en paralelo)
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+BATCH_SIZE = int(os.getenv('PROCESADOR_BATCH_SIZE', 50))
+LEASE_SEGUNDOS = int(os.getenv('PROCESADOR_LEASE_SEGUNDOS', 300))
+# Con pywhatkit cada WhatsApp tarda ~1 minuto: lotes de 1 para que el lote termine antes del lease.
+# Los proveedores concurrentes (gateway HTTP) usan lotes del mismo tamaño que los emails.
+WHATSAPP_BATCH_SIZE = int(os.getenv('WHATSAPP_BATCH_SIZE') or (BATCH_SIZE if whatsapp_service.max_concurrencia > 1 else 1))
+
+# Envío concurrente de emails: máximo de envíos simultáneos en total y por dominio
+EMAIL_MAX_CONCURRENCIA = int(os.getenv('EMAIL_MAX_CONCURRENCIA', 8))
+EMAIL_MAX_POR_DOMINIO = int(os.getenv('EMAIL_MAX_POR_DOMINIO', 2))
+
+# Reintentos con backoff exponencial: máximo de intentos por medio y espera entre intentos
+REINTENTOS_MAX = {
+    'Email': int(os.getenv('REINTENTOS_MAX_EMAIL', 5)),
+    'Whatsapp': int(os.getenv('REINTENTOS_MAX_WHATSAPP', 3)),
+}
+REINTENTO_BASE_SEGUNDOS = int(os.getenv('REINTENTO_BASE_SEGUNDOS', 60))
+REINTENTO_MAX_SEGUNDOS = int(os.getenv('REINTENTO_MAX_SEGUNDOS', 3600))
+# Reintentos vencidos que se suman a cada lote (aparte de los cupos para notificaciones nuevas)
+REINTENTOS_POR_LOTE = int(os.getenv('PROCESADOR_REINTENTOS_POR_LOTE', 10))
+
+# Supresión de tormentas de alertas: copias con el mismo IdAlerta y destinatarios dentro de la ventana
+# se marcan 'suprimido' apuntando a la que se envió (0 desactiva la supresión)
+SUPRESION_VENTANA_SEGUNDOS = int(os.getenv('SUPRESION_VENTANA_SEGUNDOS', 600))
+# Solo suprime una copia en envío, enviada o esperando un reintento; las que terminaron sin llegar
+# a todos (parcial, error, fallido) o fueron suprimidas o canceladas no
+ESTADOS_SUPRESORES = ('procesando', 'enviado', 'recibido', 'reintentar')
+
+# Modo resumen: los envíos de un destinatario se acumulan durante el ciclo del procesador y se despachan
+# al terminarlo, o antes si el más antiguo lleva RESUMEN_VENTANA_SEGUNDOS esperando
+RESUMEN_VENTANA_SEGUNDOS = int(os.getenv('RESUMEN_VENTANA_SEGUNDOS', 300))
+
+# Cada cuánto se ignora la marca de agua y se hace un barrido completo de pendientes
+PROCESADOR_BARRIDO_COMPLETO_SEGUNDOS = int(os.getenv('PROCESADOR_BARRIDO_COMPLETO_SEGUNDOS', 600))
+
+# Filtros por medio usados al buscar y reclamar notificaciones
+FILTRO_MEDIO_EMAIL = "(n.Medio = 'Email' OR n.Medio IS NULL)"
+FILTRO_MEDIO_WHATSAPP = "n.Medio = 'Whatsapp'"
+
+class ErrorEnvio(Exception):
+    """Falla de envío transitoria (se reintenta); los errores de validación usan ValueError"""
+    pass
+
+class MarcaPendientes:
+    """
+    Marca de agua de la búsqueda de pendientes de un medio.
+    Tras un barrido completo, cada ciclo solo busca filas insertadas después del último
+    IdNotificacion visto o cuya Fecha_Programada venció desde el ciclo anterior, en vez de
+    recorrer todas las pendientes (incluidas las programadas a futuro).
+    Periódicamente, o cuando se liberan leases, se vuelve a hacer un barrido completo.
+    Una invalidación durante el ciclo (filas devueltas a 'pendiente' por debajo de la marca)
+    se mantiene al finalizarlo: el ciclo siguiente hace el barrido completo.
+    """
+    
+    def __init__(self):
+        self.ultimo_id = None  # None: el próximo ciclo hace barrido completo
+        self.corte = None
+        self.corte_ciclo = None
+        self.max_id_ciclo = 0
+        self.ultimo_barrido = 0.0
+        self._invalidada = False
+    
+    def _consultar_marca(self):
+        """Retorna (máximo IdNotificacion, GETDATE() del servidor)"""
+        fila = db_config.execute_query(
+            "SELECT MAX(IdNotificacion) AS MaxId, GETDATE() AS Ahora FROM Notificaciones")[0]
+        return fila['MaxId'] or 0, fila['Ahora']
+    
+    def iniciar_ciclo(self):
+        # Una invalidación anterior ya dejó ultimo_id en None: este ciclo es el barrido completo
+        self._invalidada = False
+        if time.monotonic() - self.ultimo_barrido > PROCESADOR_BARRIDO_COMPLETO_SEGUNDOS:
+            self.ultimo_id = None
+        
+        # Máximo ID al comenzar: lo que se inserte durante el ciclo se verá en el siguiente.
+        # Las notificaciones vencen a la hora exacta de Fecha_Programada: el corte es el GETDATE()
+        # del servidor (el mismo reloj que ProximoIntento y LeaseExpira), no el de este equipo
+        try:
+            self.max_id_ciclo, self.corte_ciclo = self._consultar_marca()
+        except Exception as e:
+            logger.error(f"Error obteniendo marca de agua de notificaciones: {e}")
+            # Sin corte ni marca confiables: barrido completo con GETDATE() en el reclamo
+            self.max_id_ciclo = None
+            self.corte_ciclo = None
+            self.ultimo_id = None
+    
+    def filtro_sql(self):
+        """Retorna (fragmento SQL, parámetros) para restringir la búsqueda a lo nuevo"""
+        if self.ultimo_id is None:
+            return "", []
+        return (
+            "AND (n.IdNotificacion > ? OR (n.Fecha_Programada > ? AND n.Fecha_Programada <= ?))",
+            [self.ultimo_id, self.corte, self.corte_ciclo]
+        )
+    
+    def finalizar_ciclo(self):
+        if self.max_id_ciclo is None or self._invalidada:
+            # Sin marca confiable o invalidada durante el ciclo: repetir barrido completo
+            # (sin contarlo como el barrido periódico)
+            self.ultimo_id = None
+            return
+        if self.ultimo_id is None:
+            self.ultimo_barrido = time.monotonic()
+        self.ultimo_id = self.max_id_ciclo
+        self.corte = self.corte_ciclo
+    
+    def invalidar(self):
+        self.ultimo_id = None
+        self._invalidada = True
+
+class RenovadorLease:
+    """
+    Mientras se envía un lote, extiende cada LEASE_SEGUNDOS/3 el lease de las notificaciones
+    reclamadas por este worker, para que otro worker no las libere (y las reenvíe) aunque el lote
+    tarde más que PROCESADOR_LEASE_SEGUNDOS. Se usa como context manager alrededor del lote o del
+    ciclo; agregar() y quitar() actualizan las notificaciones cubiertas (p. ej. las que esperan un resumen).
+    """
+    
+    def __init__(self, ids_notificacion=()):
+        self.ids = set(ids_notificacion)
+        self.intervalo = max(LEASE_SEGUNDOS / 3, 1)
+        self._lock = threading.Lock()
+        self._fin = threading.Event()
+        self._hilo = None
+    
+    def __enter__(self):
+        self._hilo = threading.Thread(target=self._ciclo, name='renovar-lease', daemon=True)
+        self._hilo.start()
+        return self
+    
+    def agregar(self, ids_notificacion):
+        with self._lock:
+            self.ids.update(ids_notificacion)
+    
+    def quitar(self, ids_notificacion):
+        with self._lock:
+            self.ids.difference_update(ids_notificacion)
+    
+    def __exit__(self, *args):
+        self._fin.set()
+        if self._hilo is not None:
+            self._hilo.join()
+        return False
+    
+    def _ciclo(self):
+        while not self._fin.wait(self.intervalo):
+            self.renovar()
+    
+    def renovar(self):
+        """Extiende el lease de las filas que este worker todavía tiene en 'procesando'"""
+        renovadas = 0
+        with self._lock:
+            ids = sorted(self.ids)
+        # Máximo 2100 parámetros por consulta en SQL Server
+        tamano_lote = 1000
+        for inicio in range(0, len(ids), tamano_lote):
+            lote = ids[inicio:inicio + tamano_lote]
+            placeholders = ', '.join('?' for _ in lote)
+            query = f"""
+            UPDATE Notificaciones
+            SET LeaseExpira = DATEADD(SECOND, ?, GETDATE())
+            WHERE IdNotificacion IN ({placeholders})
+              AND Estado = 'procesando'
+              AND WorkerId = ?
+            """
+            try:
+                renovadas += db_config.execute_non_query(query, [LEASE_SEGUNDOS] + lote + [WORKER_ID])
+            except Exception as e:
+                logger.error(f"❌ Error renovando el lease de {len(lote)} notificaciones: {e}")
+        if renovadas:
+            logger.info(f"⏱️ Lease renovado para {renovadas} notificaciones en envío")
+        return renovadas
+
+MARCAS_PENDIENTES = {
+    'Email': MarcaPendientes(),
+    'Whatsapp': MarcaPendientes(),
+}
+
+class DespachoEmails:
+    """
+    Pool de hilos compartido para enviar emails por destinatario en paralelo.
+    Limita los envíos simultáneos en total (tamaño del pool) y por dominio de destino,
+    para que un servidor de correo lento no frene todo el ciclo.
+    """
+    _executor = None
+    _semaforos_dominio = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def obtener_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=max(EMAIL_MAX_CONCURRENCIA, 1),
+                    thread_name_prefix='envio-email'
+                )
+            return cls._executor
+    
+    @classmethod
+    def _semaforo_dominio(cls, destinatario):
+        dominio = destinatario.rsplit('@', 1)[-1].lower()
+        with cls._lock:
+            semaforo = cls._semaforos_dominio.get(dominio)
+            if semaforo is None:
+                semaforo = threading.BoundedSemaphore(max(EMAIL_MAX_POR_DOMINIO, 1))
+                cls._semaforos_dominio[dominio] = semaforo
+            return semaforo
+    
+    @classmethod
+    def despachar(cls, envios):
+        """
+        Encola los envíos (notif, destinatario) intercalando dominios, para que los hilos
+        no queden todos esperando el límite de un mismo dominio.
+        Retorna un dict (IdNotificacion, destinatario) -> Future con (exito, mensaje_error).
+        """
+        por_dominio = {}
+        for notif, destinatario in envios:
+            dominio = destinatario.rsplit('@', 1)[-1].lower()
+            por_dominio.setdefault(dominio, []).append((notif, destinatario))
+        
+        intercalados = []
+        colas = list(por_dominio.values())
+        for i in range(max((len(cola) for cola in colas), default=0)):
+            intercalados.extend(cola[i] for cola in colas if i < len(cola))
+        
+        executor = cls.obtener_executor()
+        return {
+            (notif['IdNotificacion'], destinatario): executor.submit(cls.enviar_a_destinatario, notif, destinatario)
+            for notif, destinatario in intercalados
+        }
+    
+    @classmethod
+    def enviar_a_destinatario(cls, notif, destinatario):
+        """
+        Envía la notificación a un destinatario respetando el límite de su dominio.
+        Retorna (exito, error), con error un ErrorSMTP (tipo y si es permanente) o None.
+        """
+        try:
+            with cls._semaforo_dominio(destinatario):
+                email_service.enviar_email(
+                    destinatario=destinatario,
+                    asunto=notif['asunto'],
+                    cuerpo=notif['cuerpo'],
+                    notification_id=notif['IdNotificacion'],  # Agregar ID para botones
+                    token_respuesta=notif.get('token_respuesta'),
+                    elevar_errores=True
+                )
+            return True, None
+        
+        except Exception as e:
+            error = ErrorSMTP.desde_excepcion(e)
+            logger.error(f"❌ Error enviando a {destinatario} ({error.tipo}): {str(e)}")
+            return False, ErrorSMTP(f"Error enviando a {destinatario}: {str(e)}", error.tipo, error.permanente)
+    
+    @classmethod
+    def despachar_resumenes(cls, resumenes):
+        """
+        Encola un email de resumen por destinatario.
+        resumenes: {clave_destinatario: [(notif, destinatario), ...]}.
+        Retorna un dict clave_destinatario -> Future con (exito, mensaje_error).
+        """
+        executor = cls.obtener_executor()
+        return {
+            clave: executor.submit(cls.enviar_resumen, envios[0][1], [notif for notif, _ in envios])
+            for clave, envios in resumenes.items()
+        }
+    
+    @classmethod
+    def enviar_resumen(cls, destinatario, notificaciones):
+        """
+        Envía en un solo email todas las notificaciones del lote para el destinatario,
+        cada una con sus botones de acción. Retorna (exito, error) como enviar_a_destinatario.
+        """
+        try:
+            cuerpo = email_service.build_digest_email(notificaciones)
+            asunto = f"Resumen: {len(notificaciones)} notificaciones - {notificaciones[0]['asunto']}"
+            with cls._semaforo_dominio(destinatario):
+                email_service.enviar_email(destinatario=destinatario, asunto=asunto, cuerpo=cuerpo,
+                                           elevar_errores=True)
+            
+            logger.info(f"📚 Resumen de {len(notificaciones)} notificaciones enviado a {destinatario}")
+            return True, None
+        
+        except Exception as e:
+            error = ErrorSMTP.desde_excepcion(e)
+            logger.error(f"❌ Error enviando resumen a {destinatario} ({error.tipo}): {str(e)}")
+            return False, ErrorSMTP(f"Error enviando resumen a {destinatario}: {str(e)}", error.tipo, error.permanente)
+    
+    @classmethod
+    def cerrar(cls):
+        """Espera los envíos en curso, libera el pool de hilos y cierra las sesiones SMTP"""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        email_service.smtp_pool.cerrar_todas()
+
+class DespachoWhatsApp:
+    """
+    Pool de hilos compartido para enviar los WhatsApp de un lote en paralelo cuando el
+    proveedor lo permite (gateway HTTP). Con pywhatkit los envíos siguen siendo secuenciales.
+    """
+    _executor = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def obtener_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=whatsapp_service.max_concurrencia,
+                    thread_name_prefix='envio-whatsapp'
+                )
+            return cls._executor
+    
+    @classmethod
+    def procesar(cls, notificaciones):
+        """Envía las notificaciones y retorna sus resultados en el mismo orden"""
+        if whatsapp_service.max_concurrencia <= 1 or len(notificaciones) <= 1:
+            return [ProcesadorNotificaciones._procesar_notificacion_whatsapp(notif) for notif in notificaciones]
+        return list(cls.obtener_executor().map(ProcesadorNotificaciones._procesar_notificacion_whatsapp, notificaciones))
+    
+    @classmethod
+    def cerrar(cls):
+        """Espera los envíos en curso, libera el pool de hilos y las conexiones del proveedor"""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        whatsapp_service.cerrar()
+
+class ResumenesPendientes:
+    """
+    Envíos en modo resumen acumulados por destinatario durante un ciclo del procesador, para que
+    un destinatario reciba un solo email con las notificaciones de todos los lotes del ciclo.
+    Las notificaciones con algún envío acumulado siguen en 'procesando' (el RenovadorLease del ciclo
+    extiende su lease) y se confirman cuando se despachan los resúmenes.
+    """
+    
+    def __init__(self, ventana_segundos=None):
+        self.ventana = RESUMEN_VENTANA_SEGUNDOS if ventana_segundos is None else ventana_segundos
+        self.notificaciones = []   # (notif, filas, sin_entregar, inicio_envio) a confirmar al despachar
+        self.por_destinatario = {}  # email en minúsculas -> [(notif, email)]
+        self.futures = {}          # (IdNotificacion, email) -> Future de los envíos individuales ya despachados
+        self._desde = None         # time.monotonic() del envío más antiguo acumulado
+    
+    def agregar(self, notif, filas, sin_entregar, inicio_envio, envios, futures):
+        """Acumula los envíos (notif, email) en modo resumen de la notificación y sus envíos individuales"""
+        for _, email in envios:
+            self.por_destinatario.setdefault(email.lower(), []).append((notif, email))
+        self.notificaciones.append((notif, filas, sin_entregar, inicio_envio))
+        self.futures.update(futures)
+        if self._desde is None:
+            self._desde = time.monotonic()
+    
+    def ids(self):
+        return [notif['IdNotificacion'] for notif, _, _, _ in self.notificaciones]
+    
+    def vencido(self):
+        return self._desde is not None and time.monotonic() - self._desde >= self.ventana
+    
+    def vaciar(self):
+        """Retorna lo acumulado (notificaciones, por_destinatario, futures) y empieza de nuevo"""
+        acumulado = (self.notificaciones, self.por_destinatario, self.futures)
+        self.notificaciones, self.por_destinatario, self.futures, self._desde = [], {}, {}, None
+        return acumulado
+
 class ProcesadorNotificaciones:
     @staticmethod
     def procesar_pendientes():
         """
-        Procesa todas las notificaciones pendientes y maneja el envío
+        Procesa todas las notificaciones pendientes y maneja el envío.
+        Reclama lotes de notificaciones (estado 'procesando' con lease) para que
+        varios procesadores puedan ejecutarse en paralelo sin duplicar envíos.
+        Retorna la cantidad de notificaciones procesadas.
         """
         logger.info("🚀 Iniciando procesamiento de notificaciones...")
-        notificaciones = NotificacionesService.obtener_notificaciones_pendientes()
+        NotificacionesService.liberar_leases_expirados()
+        marca = MARCAS_PENDIENTES['Email']
+        marca.iniciar_ciclo()
         
-        if not notificaciones:
+        total_procesadas = 0
+        desde_id = 0
+        fallo_reclamo = False
+        resumenes = ResumenesPendientes()
+        # Un solo renovador para el ciclo: cubre el lote en envío y las notificaciones que esperan su resumen
+        with RenovadorLease() as renovador:
+            try:
+                while True:
+                    notificaciones = NotificacionesService.reclamar_notificaciones_pendientes(
+                        desde_id=desde_id, marca=marca)
+                    
+                    if notificaciones is None:
+                        fallo_reclamo = True
+                        break
+                    if not notificaciones:
+                        break
+                    
+                    # Paginación por clave: el siguiente lote empieza después del último ID nuevo reclamado
+                    # (los reintentos se reclaman aparte y no mueven la paginación)
+                    desde_id = max((notif['IdNotificacion'] for notif in notificaciones
+                                    if not notif['es_reintento']), default=desde_id)
+                    
+                    logger.info(f"📧 Procesando {len(notificaciones)} notificaciones...")
+                    
+                    ids_lote = [notif['IdNotificacion'] for notif in notificaciones]
+                    renovador.agregar(ids_lote)
+                    ProcesadorNotificaciones._procesar_lote_email(notificaciones, resumenes)
+                    renovador.quitar(set(ids_lote) - set(resumenes.ids()))
+                    
+                    if resumenes.vencido():
+                        renovador.quitar(ProcesadorNotificaciones._despachar_resumenes(resumenes))
+                    
+                    total_procesadas += len(notificaciones)
+            finally:
+                ProcesadorNotificaciones._despachar_resumenes(resumenes)
+        
+        # Si el reclamo falló, lo insertado antes del error puede no haberse visto: barrido completo
+        if fallo_reclamo:
+            marca.invalidar()
+        else:
+            marca.finalizar_ciclo()
+        
+        if total_procesadas == 0:
             logger.info("✅ No hay notificaciones pendientes")
-            return
         
-        logger.info(f"📧 Procesando {len(notificaciones)} notificaciones...")
+        return total_procesadas
+    
+    @staticmethod
+    def _procesar_lote_email(notificaciones, resumenes=None):
+        """
+        Envía un lote de notificaciones de email repartiendo los envíos por destinatario
+        en el pool de hilos (con límite global y por dominio) y, al terminar, registra
+        el resultado de cada notificación (enviado / parcial / error).
+        Los envíos en modo resumen se acumulan en resumenes (ResumenesPendientes del ciclo) y esas
+        notificaciones se confirman al despacharlos; sin resumenes se despachan al final del lote.
+        """
+        envios = []  # (notif, destinatarios)
+        # Resultado final de cada notificación, se confirma al final del lote
+        notificaciones, resultados = ProcesadorNotificaciones._suprimir_repetidas(notificaciones)
+        
+        # Con tokens firmados los enlaces se firman al armar el email y no se escribe nada en la base;
+        # si no, se resuelven los tokens de todo el lote en un solo round trip antes de repartir los envíos
+        tokens_firmados = firmador_tokens.habilitado
+        tokens = {} if tokens_firmados else email_service.get_or_create_action_tokens(
+            [notif['IdNotificacion'] for notif in notificaciones if 'error' not in notif]
+        )
         
         for notif in notificaciones:
             try:
@@ -31,125 +475,352 @@ class ProcesadorNotificaciones:
                 
                 logger.info(f"Enviando ID {notif['IdNotificacion']} → {notif['destinatarios']}")
                 
-                # Función para procesar múltiples separadores (igual que arriba)
-                def procesar_emails(texto_emails):
-                    """Procesa emails separados por coma O punto y coma"""
-                    if not texto_emails or not texto_emails.strip():
-                        return []
-                    
-                    # Detectar el separador principal (punto y coma tiene prioridad)
-                    if ';' in texto_emails:
-                        separador = ';'
-                    else:
-                        separador = ','
-                    
-                    return [email.strip() for email in texto_emails.split(separador) if email.strip()]
-                
-                # Enviar email a múltiples destinatarios usando la función mejorada
-                destinatarios_lista = procesar_emails(notif['destinatarios'])
-                exitos = 0
-                errores = []
-                
-                for destinatario in destinatarios_lista:
-                    try:
-                        exito_individual = email_service.enviar_email(
-                            destinatario=destinatario,
-                            asunto=notif['asunto'],
-                            cuerpo=notif['cuerpo'],
-                            notification_id=notif['IdNotificacion']  # Agregar ID para botones
-                        )
-                        
-                        if exito_individual:
-                            exitos += 1
-                        else:
-                            errores.append(f"Error enviando a {destinatario}")
-                            
-                    except Exception as e:
-                        errores.append(f"Error enviando a {destinatario}: {str(e)}")
-                        logger.error(f"❌ Error enviando a {destinatario}: {str(e)}")
-                
-                # Determinar si el envío fue exitoso (al menos uno exitoso)
-                exito_general = exitos > 0
+                destinatarios_lista = ProcesadorNotificaciones._separar_emails(notif['destinatarios'])
                 
-                if exito_general:
-                    # Actualizar estado y auditoría
-                    estado_final = 'enviado' if not errores else 'parcial'
-                    estado_mensaje = f"{exitos}/{len(destinatarios_lista)} enviados"
-                    
-                    NotificacionesService.actualizar_estado_notificacion(
-                        notif['IdNotificacion'], estado_final)
-                    NotificacionesService.registrar_auditoria(
-                        notif['IdNotificacion'], 
-                        'NOTIFICACION_ENVIADA',
-                        estado_mensaje
-                    )
-                    logger.info(f"✅ ID {notif['IdNotificacion']}: {estado_mensaje}")
-                else:
-                    raise Exception(f"Falló envío a todos los destinatarios")
+                # Sin token del lote (error de BD): resolverlo una sola vez antes de repartir
+                notif['token_respuesta'] = None if tokens_firmados else (
+                    tokens.get(notif['IdNotificacion'])
+                    or email_service.get_or_create_action_token(notif['IdNotificacion'])
+                )
                 
+                envios.append((notif, destinatarios_lista))
+            
             except Exception as e:
-                # Manejo de errores
-                NotificacionesService.actualizar_estado_notificacion(
-                    notif['IdNotificacion'], 'error')
-                NotificacionesService.registrar_auditoria(
-                    notif['IdNotificacion'],
-                    'ERROR_NOTIFICACION',
-                    f"Error: {str(e)}"
-                )
-                logger.error(f"❌ ID {notif['IdNotificacion']}: {str(e)}")
+                resultados.append(ProcesadorNotificaciones._resultado_error(notif, 'ERROR_NOTIFICACION', e))
+        
+        # Los destinatarios se expanden una sola vez a NotificacionDestinatarios;
+        # en los reintentos solo se envía a los que todavía no se entregaron
+        try:
+            destinatarios = NotificacionesService.expandir_destinatarios_lote(
+                [(notif['IdNotificacion'], destinatarios_lista) for notif, destinatarios_lista in envios])
+        except Exception as e:
+            logger.error(f"❌ Error expandiendo destinatarios, se envía sin seguimiento por destinatario: {e}")
+            destinatarios = {}
+        
+        envios_pendientes = []  # (notif, todos_los_destinatarios, destinatarios_sin_entregar)
+        for notif, destinatarios_lista in envios:
+            filas = destinatarios.get(notif['IdNotificacion']) or [
+                {'IdDestinatario': None, 'EmailDestinatario': destinatario, 'Estado': 'pendiente'}
+                for destinatario in destinatarios_lista
+            ]
+            envios_pendientes.append((notif, filas, [f for f in filas if f['Estado'] != 'enviado']))
+        
+        # Modo resumen (por tipo o elegido por el destinatario): los envíos se acumulan por destinatario
+        # durante el ciclo y se despachan juntos en un solo email (_despachar_resumenes)
+        en_resumen = {
+            (notif['IdNotificacion'], fila['EmailDestinatario'])
+            for notif, _, sin_entregar in envios_pendientes for fila in sin_entregar
+            if notif['modo_resumen'] or destinatarios_resumen.contiene(fila['EmailDestinatario'])
+        }
+        
+        inicio_envio = time.monotonic()
+        futures = DespachoEmails.despachar(
+            [(notif, fila['EmailDestinatario']) for notif, _, sin_entregar in envios_pendientes for fila in sin_entregar
+             if (notif['IdNotificacion'], fila['EmailDestinatario']) not in en_resumen]
+        )
+        
+        acumular = resumenes if resumenes is not None else ResumenesPendientes()
+        confirmar = []
+        for notif, filas, sin_entregar in envios_pendientes:
+            envios_resumen = [(notif, fila['EmailDestinatario']) for fila in sin_entregar
+                              if (notif['IdNotificacion'], fila['EmailDestinatario']) in en_resumen]
+            if envios_resumen:
+                propios = {clave: future for clave, future in futures.items() if clave[0] == notif['IdNotificacion']}
+                acumular.agregar(notif, filas, sin_entregar, inicio_envio, envios_resumen, propios)
+            else:
+                confirmar.append((notif, filas, sin_entregar, inicio_envio))
+        
+        ProcesadorNotificaciones._confirmar_envios(confirmar, futures, resultados)
+        if resumenes is None:
+            ProcesadorNotificaciones._despachar_resumenes(acumular)
+    
+    @staticmethod
+    def _despachar_resumenes(resumenes):
+        """
+        Envía lo acumulado en resumenes: un email de resumen por destinatario con más de una
+        notificación (uno individual si tiene una sola) y confirma esas notificaciones.
+        Retorna los IDs confirmados.
+        """
+        notificaciones, por_destinatario, futures = resumenes.vaciar()
+        if not notificaciones:
+            return []
+        
+        agrupados = {clave: envios for clave, envios in por_destinatario.items() if len(envios) > 1}
+        futures.update(DespachoEmails.despachar(
+            [envio for envios in por_destinatario.values() if len(envios) == 1 for envio in envios]))
+        for clave, future in DespachoEmails.despachar_resumenes(agrupados).items():
+            for notif, email in agrupados[clave]:
+                futures[(notif['IdNotificacion'], email)] = future
+        
+        logger.info(f"📚 Despachando {len(agrupados)} resúmenes para {len(notificaciones)} notificaciones")
+        ProcesadorNotificaciones._confirmar_envios(notificaciones, futures, [])
+        return [notif['IdNotificacion'] for notif, _, _, _ in notificaciones]
+    
+    @staticmethod
+    def _confirmar_envios(envios_pendientes, futures, resultados):
+        """
+        Espera los envíos de cada notificación (futures por (IdNotificacion, email)) y confirma
+        su resultado y el de cada destinatario junto con los resultados ya calculados.
+        envios_pendientes: [(notif, filas, sin_entregar, inicio_envio)].
+        """
+        # Momento en que terminó cada envío, para la duración por notificación en Auditoria
+        terminados = {}
+        for future in set(futures.values()):
+            future.add_done_callback(lambda f: terminados.setdefault(f, time.monotonic()))
+        
+        seguimiento = []  # (IdDestinatario, exito, error) para actualizar NotificacionDestinatarios
+        for notif, filas, sin_entregar, inicio_envio in envios_pendientes:
+            exitos = len(filas) - len(sin_entregar)
+            errores = []
+            fin_envio = None
+            for fila in sin_entregar:
+                future = futures[(notif['IdNotificacion'], fila['EmailDestinatario'])]
+                exito_individual, error = future.result()
+                fin_envio = max(fin_envio or 0, terminados.get(future) or time.monotonic())
+                if exito_individual:
+                    exitos += 1
+                else:
+                    errores.append(error)
+                if fila['IdDestinatario'] is not None:
+                    seguimiento.append((fila['IdDestinatario'], exito_individual, error))
+            
+            resultado = ProcesadorNotificaciones._resultado_email(
+                notif, [fila['EmailDestinatario'] for fila in filas], exitos, errores)
+            if fin_envio is not None:
+                resultado['duracion_ms'] = int((fin_envio - inicio_envio) * 1000)
+            resultados.append(resultado)
+        
+        NotificacionesService.actualizar_destinatarios_lote(seguimiento)
+        NotificacionesService.confirmar_resultados_lote(resultados)
+    
+    @staticmethod
+    def _suprimir_repetidas(notificaciones):
+        """
+        Colapsa las copias de una misma alerta: entre las notificaciones con igual IdAlerta, medio y
+        destinatarios, solo se envía una; las demás pasan a 'suprimido' apuntando a la que se envió.
+        También se suprimen si otra copia ya se envió dentro de SUPRESION_VENTANA_SEGUNDOS.
+        Retorna (notificaciones_a_enviar, resultados_de_las_suprimidas).
+        """
+        if SUPRESION_VENTANA_SEGUNDOS <= 0:
+            return notificaciones, []
+        
+        candidatas = [n for n in notificaciones if n.get('id_alerta') and 'error' not in n]
+        if not candidatas:
+            return notificaciones, []
+        
+        # Copias ya enviadas (o en envío) de las mismas alertas: {clave: [(IdNotificacion, Estado)]}
+        previas = NotificacionesService.obtener_envios_recientes_por_alerta(
+            sorted({n['id_alerta'] for n in candidatas}),
+            excluir_ids={n['IdNotificacion'] for n in notificaciones})
+        
+        ids_candidatas = {n['IdNotificacion'] for n in candidatas}
+        sobrevivientes = {}  # clave -> IdNotificacion que se envía en este lote
+        a_enviar = []
+        suprimidas = []
+        for notif in sorted(notificaciones, key=lambda n: n['IdNotificacion']):
+            if notif['IdNotificacion'] not in ids_candidatas:
+                a_enviar.append(notif)
+                continue
+            
+            clave = ProcesadorNotificaciones._clave_supresion(
+                notif['id_alerta'], notif['medio'],
+                notif['destinatario'] if 'destinatario' in notif else notif['destinatarios'])
+            
+            # Una copia en envío por otro worker solo cuenta si es anterior, para que no se supriman entre sí
+            id_previa = next((id_previa for id_previa, estado in previas.get(clave, [])
+                              if estado in ESTADOS_SUPRESORES
+                              and (estado != 'procesando' or id_previa < notif['IdNotificacion'])), None)
+            id_sobreviviente = id_previa or sobrevivientes.get(clave)
+            
+            if id_sobreviviente is None:
+                sobrevivientes[clave] = notif['IdNotificacion']
+                a_enviar.append(notif)
+                continue
+            
+            logger.info(f"🔇 ID {notif['IdNotificacion']}: suprimida, repetida de ID {id_sobreviviente} "
+                        f"(IdAlerta {notif['id_alerta']})")
+            suprimidas.append({
+                'IdNotificacion': notif['IdNotificacion'],
+                'estado': 'suprimido',
+                'accion': 'NOTIFICACION_SUPRIMIDA',
+                'descripcion': f"Repetida de ID_{id_sobreviviente} (IdAlerta {notif['id_alerta']})",
+                'medio': notif['medio'],
+                'id_alerta': notif['id_alerta'],
+                'intentos': notif['intentos'],
+                'error_tipo': None,
+                'suprimida_por': id_sobreviviente
+            })
+        
+        if suprimidas:
+            logger.info(f"🔇 {len(suprimidas)} notificaciones repetidas suprimidas en el lote")
+        
+        # Mantener el orden de prioridad original del lote
+        ids_a_enviar = {n['IdNotificacion'] for n in a_enviar}
+        return [n for n in notificaciones if n['IdNotificacion'] in ids_a_enviar], suprimidas
+    
+    @staticmethod
+    def _clave_supresion(id_alerta, medio, destinatarios):
+        """Clave de agrupación: alerta, medio y conjunto de destinatarios (sin importar orden ni mayúsculas)"""
+        lista = ProcesadorNotificaciones._separar_emails(destinatarios or '')
+        return (id_alerta, medio or 'Email', frozenset(d.lower() for d in lista))
+    
+    @staticmethod
+    def _separar_emails(texto_emails):
+        """Procesa emails separados por coma O punto y coma"""
+        if not texto_emails or not texto_emails.strip():
+            return []
+        
+        # Detectar el separador principal (punto y coma tiene prioridad)
+        if ';' in texto_emails:
+            separador = ';'
+        else:
+            separador = ','
+        
+        return [email.strip() for email in texto_emails.split(separador) if email.strip()]
+    
+    @staticmethod
+    def _resultado_email(notif, destinatarios_lista, exitos, errores):
+        """
+        Decide el estado final de la notificación según los envíos individuales
+        """
+        # Determinar si el envío fue exitoso (al menos uno exitoso)
+        exito_general = exitos > 0
+        
+        # Tipo de error para la política de reintentos: el primero transitorio, si hay alguno;
+        # si todas las fallas son permanentes (5xx, dirección rechazada) no se reintenta
+        transitorios = [e for e in errores if not getattr(e, 'permanente', False)]
+        error_tipo = getattr((transitorios or errores or [None])[0], 'tipo', None) or ErrorEnvio.__name__
+        permanente = bool(errores) and not transitorios
+        
+        if not exito_general:
+            resultado = ProcesadorNotificaciones._resultado_error(
+                notif, 'ERROR_NOTIFICACION', ErrorEnvio(f"Falló envío a todos los destinatarios ({error_tipo})"))
+            resultado['error_tipo'] = error_tipo
+            resultado['permanente'] = permanente
+            return resultado
+        
+        estado_final = 'enviado' if not errores else 'parcial'
+        estado_mensaje = f"{exitos}/{len(destinatarios_lista)} enviados"
+        logger.info(f"✅ ID {notif['IdNotificacion']}: {estado_mensaje}")
+        
+        return {
+            'IdNotificacion': notif['IdNotificacion'],
+            'estado': estado_final,
+            'accion': 'NOTIFICACION_ENVIADA',
+            'descripcion': estado_mensaje,
+            'medio': notif['medio'],
+            'id_alerta': notif.get('id_alerta'),
+            'intentos': notif['intentos'],
+            # En un envío parcial se reintenta solo a los destinatarios sin entregar
+            'error_tipo': error_tipo if errores else None,
+            'permanente': permanente
+        }
+    
+    @staticmethod
+    def _resultado_error(notif, accion, error):
+        # Manejo de errores
+        logger.error(f"❌ ID {notif['IdNotificacion']}: {str(error)}")
+        return {
+            'IdNotificacion': notif['IdNotificacion'],
+            'estado': 'error',
+            'accion': accion,
+            'descripcion': f"Error: {str(error)}",
+            'medio': notif.get('medio'),
+            'id_alerta': notif.get('id_alerta'),
+            'intentos': notif.get('intentos', 0),
+            # Los errores de validación (datos de la notificación) no se reintentan
+            'error_tipo': None if isinstance(error, ValueError) else type(error).__name__
+        }
     
     @staticmethod
     def procesar_whatsapp_pendientes():
         """
-        Procesa todas las notificaciones de WhatsApp pendientes y maneja el envío
+        Procesa todas las notificaciones de WhatsApp pendientes y maneja el envío.
+        Retorna la cantidad de notificaciones procesadas.
         """
         logger.info("🚀 Iniciando procesamiento de notificaciones de WhatsApp...")
-        notificaciones = NotificacionesService.obtener_notificaciones_whatsapp_pendientes()
+        NotificacionesService.liberar_leases_expirados()
+        marca = MARCAS_PENDIENTES['Whatsapp']
+        marca.iniciar_ciclo()
         
-        if not notificaciones:
+        total_procesadas = 0
+        desde_id = 0
+        fallo_reclamo = False
+        while True:
+            notificaciones = NotificacionesService.reclamar_notificaciones_whatsapp_pendientes(
+                desde_id=desde_id, marca=marca)
+            
+            if notificaciones is None:
+                fallo_reclamo = True
+                break
+            if not notificaciones:
+                break
+            
+            desde_id = max((notif['IdNotificacion'] for notif in notificaciones
+                            if not notif['es_reintento']), default=desde_id)
+            
+            logger.info(f"📱 Procesando {len(notificaciones)} notificaciones de WhatsApp...")
+            
+            with RenovadorLease(notif['IdNotificacion'] for notif in notificaciones):
+                a_enviar, resultados = ProcesadorNotificaciones._suprimir_repetidas(notificaciones)
+                resultados += DespachoWhatsApp.procesar(a_enviar)
+                NotificacionesService.confirmar_resultados_lote(resultados)
+            
+            total_procesadas += len(notificaciones)
+        
+        # Si el reclamo falló, lo insertado antes del error puede no haberse visto: barrido completo
+        if fallo_reclamo:
+            marca.invalidar()
+        else:
+            marca.finalizar_ciclo()
+        
+        if total_procesadas == 0:
             logger.info("✅ No hay notificaciones de WhatsApp pendientes")
-            return
         
-        logger.info(f"📱 Procesando {len(notificaciones)} notificaciones de WhatsApp...")
+        return total_procesadas
+    
+    @staticmethod
+    def _procesar_notificacion_whatsapp(notif):
+        """
+        Envía una notificación de WhatsApp y retorna su resultado para confirmarlo con el lote
+        """
+        inicio = time.monotonic()
+        try:
+            # Validación final
+            if 'error' in notif:
+                raise ValueError(notif['error'])
+            
+            logger.info(f"Enviando WhatsApp ID {notif['IdNotificacion']} → {notif['destinatario']}")
+            
+            # Enviar WhatsApp (sin botones, solo informativo)
+            whatsapp_service.enviar_notificacion(
+                destinatario=notif['destinatario'],
+                asunto=notif['asunto'],
+                cuerpo=notif['cuerpo'],
+                elevar_errores=True
+            )
+            
+            logger.info(f"✅ WhatsApp ID {notif['IdNotificacion']}: Enviado exitosamente")
+            return {
+                'IdNotificacion': notif['IdNotificacion'],
+                'estado': 'enviado',
+                'accion': 'NOTIFICACION_WHATSAPP_ENVIADA',
+                'descripcion': f"Enviado a {notif['destinatario']}",
+                'medio': notif['medio'],
+                'id_alerta': notif.get('id_alerta'),
+                'intentos': notif['intentos'],
+                'error_tipo': None,
+                'duracion_ms': int((time.monotonic() - inicio) * 1000)
+            }
         
-        for notif in notificaciones:
-            try:
-                # Validación final
-                if 'error' in notif:
-                    raise ValueError(notif['error'])
-                
-                logger.info(f"Enviando WhatsApp ID {notif['IdNotificacion']} → {notif['destinatario']}")
-                
-                # Enviar WhatsApp (sin botones, solo informativo)
-                exito = whatsapp_service.enviar_notificacion(
-                    destinatario=notif['destinatario'],
-                    asunto=notif['asunto'],
-                    cuerpo=notif['cuerpo']
-                )
-                
-                if exito:
-                    # Actualizar estado y auditoría
-                    NotificacionesService.actualizar_estado_notificacion(
-                        notif['IdNotificacion'], 'enviado')
-                    NotificacionesService.registrar_auditoria(
-                        notif['IdNotificacion'], 
-                        'NOTIFICACION_WHATSAPP_ENVIADA',
-                        f"Enviado a {notif['destinatario']}"
-                    )
-                    logger.info(f"✅ WhatsApp ID {notif['IdNotificacion']}: Enviado exitosamente")
-                else:
-                    raise Exception(f"Falló envío de WhatsApp a {notif['destinatario']}")
-                
-            except Exception as e:
-                # Manejo de errores
-                NotificacionesService.actualizar_estado_notificacion(
-                    notif['IdNotificacion'], 'error')
-                NotificacionesService.registrar_auditoria(
-                    notif['IdNotificacion'],
-                    'ERROR_NOTIFICACION_WHATSAPP',
-                    f"Error: {str(e)}"
-                )
-                logger.error(f"❌ WhatsApp ID {notif['IdNotificacion']}: {str(e)}")
+        except Exception as e:
+            resultado = ProcesadorNotificaciones._resultado_error(notif, 'ERROR_NOTIFICACION_WHATSAPP', e)
+            if isinstance(e, ErrorWhatsApp):
+                # Status del gateway para UltimoErrorTipo; los 4xx permanentes van directo a 'fallido'
+                resultado['error_tipo'] = e.tipo
+                resultado['permanente'] = e.permanente
+            resultado['duracion_ms'] = int((time.monotonic() - inicio) * 1000)
+            return resultado
 
 class NotificacionesService:
     """
@@ -159,12 +830,12 @@ class NotificacionesService:
     @staticmethod
     def obtener_notificaciones_pendientes():
         """
-        Obtiene notificaciones que están programadas para HOY (o anterior) y están pendientes.
-        LÓGICA OPTIMIZADA: PRIMERO verifica la fecha (solo día, ignora hora), LUEGO verifica el estado, FINALMENTE el medio.
-        Esto es más intuitivo para usuarios que seleccionan solo fechas en el dashboard.
+        Obtiene notificaciones pendientes cuya Fecha_Programada ya venció (fecha y hora) o que no tienen programación.
+        LÓGICA OPTIMIZADA: PRIMERO verifica la fecha programada, LUEGO verifica el estado, FINALMENTE el medio.
+        Solo consulta (no reclama); el procesador usa reclamar_notificaciones_pendientes.
         """
         query = """
-        SELECT 
+        SELECT
             n.IdNotificacion,
             n.IdTipoNotificacion,
             n.Asunto,
@@ -173,24 +844,19 @@ class NotificacionesService:
             n.Estado,
             n.Fecha_Envio,
             n.Fecha_Programada,
-            n.Medio,
-            nt.descripcion as tipo_descripcion,
-            nt.destinatarios as destinatarios_default,
-            nt.asunto as asunto_default,
-            nt.cuerpo as cuerpo_default
+            n.Medio
         FROM Notificaciones n
-        LEFT JOIN Notificaciones_Tipo nt ON n.IdTipoNotificacion = nt.IdTipoNotificacion
-        WHERE (n.Fecha_Programada IS NULL OR CAST(n.Fecha_Programada AS DATE) <= CAST(GETDATE() AS DATE))  -- FILTRO PRIMARIO: Solo fechas válidas (hoy o anterior - sin hora)
+        WHERE (n.Fecha_Programada IS NULL OR n.Fecha_Programada <= GETDATE())  -- FILTRO PRIMARIO: Solo programadas que ya vencieron (rango sargable)
           AND n.Estado = 'pendiente'  -- FILTRO SECUNDARIO: Solo notificaciones pendientes
           AND (n.Medio = 'Email' OR n.Medio IS NULL)  -- FILTRO TERCIARIO: Solo medio Email (o NULL por defecto)
-        ORDER BY 
+        ORDER BY
             CASE WHEN n.Fecha_Programada IS NULL THEN 0 ELSE 1 END,  -- Prioridad: inmediatas primero
             n.Fecha_Programada ASC,  -- Luego por fecha programada
             n.IdNotificacion ASC     -- Finalmente por ID
         """
         
         try:
-            logger.info("🔍 Buscando notificaciones pendientes para hoy (solo fecha, ignora hora)...")
+            logger.info("🔍 Buscando notificaciones pendientes con Fecha_Programada vencida...")
             
             resultados = db_config.execute_query(query)
             
@@ -200,89 +866,141 @@ class NotificacionesService:
             
             logger.info(f"📋 Encontradas {len(resultados)} notificaciones para procesar")
             
-            # Procesar cada notificación para completar campos faltantes
-            notificaciones_procesadas = []
-            for notif in resultados:
-                
-                # VALIDACIÓN EXTRA: Verificar que realmente esté pendiente
-                if notif['Estado'] != 'pendiente':
-                    logger.error(f"🚨 Notificación {notif['IdNotificacion']} tiene estado '{notif['Estado']}' - SALTANDO")
-                    continue
-                
-                # Combinar destinatarios individuales y del tipo
-                destinatarios_individuales = notif['Destinatario'] or ''
-                destinatarios_tipo = notif['destinatarios_default'] or ''
-                
-                # Función para procesar múltiples separadores
-                def procesar_destinatarios(texto_destinatarios):
-                    """Procesa destinatarios separados por coma O punto y coma"""
-                    if not texto_destinatarios or not texto_destinatarios.strip():
-                        return []
-                    
-                    # Detectar el separador principal (punto y coma tiene prioridad)
-                    if ';' in texto_destinatarios:
-                        separador = ';'
-                    else:
-                        separador = ','
-                    
-                    return [email.strip() for email in texto_destinatarios.split(separador) if email.strip()]
-                
-                # Crear lista de destinatarios únicos usando la función mejorada
-                todos_destinatarios = []
-                todos_destinatarios.extend(procesar_destinatarios(destinatarios_individuales))
-                todos_destinatarios.extend(procesar_destinatarios(destinatarios_tipo))
+            notificaciones_procesadas = NotificacionesService._preparar_notificaciones_email(resultados)
+            
+            logger.info(f"Se encontraron {len(notificaciones_procesadas)} notificaciones pendientes")
+            return notificaciones_procesadas
+        
+        except Exception as e:
+            logger.error(f"Error al obtener notificaciones pendientes: {e}")
+            return []
+    
+    @staticmethod
+    def reclamar_notificaciones_pendientes(limite=None, desde_id=0, marca=None):
+        """
+        Reclama de forma atómica un lote de notificaciones de Email pendientes para este worker.
+        Las filas pasan a 'procesando' con WorkerId y LeaseExpira; otro procesador no las verá
+        hasta que se actualice su estado o expire el lease.
+        Solo considera IDs mayores a desde_id y, si se pasa una marca, solo lo nuevo desde el ciclo anterior.
+        Retorna None si la consulta falló (para no avanzar la marca de agua) y [] si no hay pendientes.
+        """
+        try:
+            while True:
+                resultados = NotificacionesService._reclamar_lote(
+                    FILTRO_MEDIO_EMAIL, limite or BATCH_SIZE, desde_id, marca)
                 
-                # Eliminar duplicados manteniendo el orden
-                destinatarios_unicos = []
-                for email in todos_destinatarios:
-                    if email not in destinatarios_unicos:
-                        destinatarios_unicos.append(email)
+                if not resultados:
+                    return []
                 
-                notif_procesada = {
-                    'IdNotificacion': notif['IdNotificacion'],
-                    'IdTipoNotificacion': notif['IdTipoNotificacion'],
-                    'tipo_descripcion': notif['tipo_descripcion'] or 'Sin tipo',
-                    'asunto': notif['Asunto'] or notif['asunto_default'] or 'Notificación del Sistema',
-                    'cuerpo': notif['Cuerpo'] or notif['cuerpo_default'] or 'Tienes una nueva notificación del sistema.',
-                    'destinatarios': ', '.join(destinatarios_unicos),
-                    'estado': notif['Estado'],
-                    'fecha_envio': notif['Fecha_Envio'],
-                    'fecha_programada': notif['Fecha_Programada']
-                }
+                logger.info(f"📋 Reclamadas {len(resultados)} notificaciones de Email (worker {WORKER_ID})")
+                preparadas = NotificacionesService._preparar_notificaciones_email(resultados, estado_esperado='procesando')
+                if preparadas:
+                    return preparadas
                 
-                # Validar que tenga destinatarios
-                if not notif_procesada['destinatarios'] or not notif_procesada['destinatarios'].strip():
-                    notif_procesada['error'] = 'Sin destinatarios configurados'
-                    logger.warning(f"Notificación {notif['IdNotificacion']} sin destinatarios - Tipo: {notif['IdTipoNotificacion']}")
+                # Todo el lote quedó pospuesto (tipo desconocido): seguir con las siguientes
+                desde_id = max((r['IdNotificacion'] for r in resultados
+                                if r['EstadoAnterior'] != 'reintentar'), default=desde_id)
+        
+        except Exception as e:
+            logger.error(f"Error al reclamar notificaciones pendientes: {e}")
+            return None
+    
+    @staticmethod
+    def _preparar_notificaciones_email(resultados, estado_esperado='pendiente'):
+        """
+        Completa destinatarios, asunto y cuerpo con los valores del tipo y valida los emails
+        """
+        notificaciones_procesadas = []
+        sin_tipo = []
+        for notif in resultados:
+            NotificacionesService._completar_con_tipo(notif)
+            
+            # VALIDACIÓN EXTRA: Verificar que realmente esté pendiente
+            if notif['Estado'] != estado_esperado:
+                logger.error(f"🚨 Notificación {notif['IdNotificacion']} tiene estado '{notif['Estado']}' - SALTANDO")
+                continue
+            
+            if notif['tipo_desconocido']:
+                sin_tipo.append(notif['IdNotificacion'])
+                continue
+            
+            # Combinar destinatarios individuales y del tipo
+            destinatarios_individuales = notif['Destinatario'] or ''
+            destinatarios_tipo = notif['destinatarios_default'] or ''
+            
+            # Función para procesar múltiples separadores
+            def procesar_destinatarios(texto_destinatarios):
+                """Procesa destinatarios separados por coma O punto y coma"""
+                if not texto_destinatarios or not texto_destinatarios.strip():
+                    return []
                 
-                # Validar emails válidos (básico) - verificar que todos los emails contengan @
-                elif notif_procesada['destinatarios']:
-                    emails_invalidos = []
-                    for email in notif_procesada['destinatarios'].split(', '):
-                        if email.strip() and '@' not in email.strip():
-                            emails_invalidos.append(email.strip())
-                    
-                    if emails_invalidos:
-                        notif_procesada['error'] = f'Emails inválidos: {", ".join(emails_invalidos)}'
-                        logger.warning(f"Notificación {notif['IdNotificacion']} con emails inválidos: {emails_invalidos}")
+                # Detectar el separador principal (punto y coma tiene prioridad)
+                if ';' in texto_destinatarios:
+                    separador = ';'
+                else:
+                    separador = ','
                 
-                notificaciones_procesadas.append(notif_procesada)
+                return [email.strip() for email in texto_destinatarios.split(separador) if email.strip()]
             
-            logger.info(f"Se encontraron {len(notificaciones_procesadas)} notificaciones pendientes")
-            return notificaciones_procesadas
+            # Crear lista de destinatarios únicos usando la función mejorada
+            todos_destinatarios = []
+            todos_destinatarios.extend(procesar_destinatarios(destinatarios_individuales))
+            todos_destinatarios.extend(procesar_destinatarios(destinatarios_tipo))
             
-        except Exception as e:
-            logger.error(f"Error al obtener notificaciones pendientes: {e}")
-            return []
+            # Eliminar duplicados manteniendo el orden
+            destinatarios_unicos = []
+            for email in todos_destinatarios:
+                if email not in destinatarios_unicos:
+                    destinatarios_unicos.append(email)
+            
+            notif_procesada = {
+                'IdNotificacion': notif['IdNotificacion'],
+                'IdTipoNotificacion': notif['IdTipoNotificacion'],
+                'tipo_descripcion': notif['tipo_descripcion'] or 'Sin tipo',
+                'asunto': notif['Asunto'] or notif['asunto_default'] or 'Notificación del Sistema',
+                'cuerpo': notif['Cuerpo'] or notif['cuerpo_default'] or 'Tienes una nueva notificación del sistema.',
+                'destinatarios': ', '.join(destinatarios_unicos),
+                'estado': notif['Estado'],
+                'fecha_envio': notif['Fecha_Envio'],
+                'fecha_programada': notif['Fecha_Programada'],
+                'medio': notif['Medio'] or 'Email',
+                'modo_resumen': notif['modo_resumen'],
+                'id_alerta': notif.get('IdAlerta'),
+                'intentos': notif.get('Intentos', 0),
+                'es_reintento': notif.get('EstadoAnterior') == 'reintentar'
+            }
+            
+            # Validar que tenga destinatarios
+            if not notif_procesada['destinatarios'] or not notif_procesada['destinatarios'].strip():
+                notif_procesada['error'] = 'Sin destinatarios configurados'
+                logger.warning(f"Notificación {notif['IdNotificacion']} sin destinatarios - Tipo: {notif['IdTipoNotificacion']}")
+            
+            # Validar emails válidos (básico) - verificar que todos los emails contengan @
+            elif notif_procesada['destinatarios']:
+                emails_invalidos = []
+                for email in notif_procesada['destinatarios'].split(', '):
+                    if email.strip() and '@' not in email.strip():
+                        emails_invalidos.append(email.strip())
+                
+                if emails_invalidos:
+                    notif_procesada['error'] = f'Emails inválidos: {", ".join(emails_invalidos)}'
+                    logger.warning(f"Notificación {notif['IdNotificacion']} con emails inválidos: {emails_invalidos}")
+            
+            notificaciones_procesadas.append(notif_procesada)
+        
+        NotificacionesService._posponer_sin_tipo(sin_tipo, estado_esperado)
+        return notificaciones_procesadas
     
     @staticmethod
     def obtener_notificaciones_whatsapp_pendientes():
         """
-        Obtiene notificaciones de WhatsApp que están programadas para HOY (o anterior) y están pendientes.
+        Obtiene notificaciones de WhatsApp pendientes cuya Fecha_Programada ya venció (fecha y hora, según
+        GETDATE() del servidor) o que no tienen programación.
         Similar a obtener_notificaciones_pendientes pero filtra por medio WhatsApp.
+        Solo consulta (no reclama); el procesador usa reclamar_notificaciones_whatsapp_pendientes.
         """
         query = """
-        SELECT 
+        SELECT
             n.IdNotificacion,
             n.IdTipoNotificacion,
             n.Asunto,
@@ -291,16 +1009,12 @@ class NotificacionesService:
             n.Estado,
             n.Fecha_Envio,
             n.Fecha_Programada,
-            n.Medio,
-            nt.descripcion as tipo_descripcion,
-            nt.asunto as asunto_default,
-            nt.cuerpo as cuerpo_default
+            n.Medio
         FROM Notificaciones n
-        LEFT JOIN Notificaciones_Tipo nt ON n.IdTipoNotificacion = nt.IdTipoNotificacion
-        WHERE (n.Fecha_Programada IS NULL OR CAST(n.Fecha_Programada AS DATE) <= CAST(GETDATE() AS DATE))
+        WHERE (n.Fecha_Programada IS NULL OR n.Fecha_Programada <= GETDATE())
           AND n.Estado = 'pendiente'
           AND n.Medio = 'Whatsapp'  -- Solo WhatsApp
-        ORDER BY 
+        ORDER BY
             CASE WHEN n.Fecha_Programada IS NULL THEN 0 ELSE 1 END,
             n.Fecha_Programada ASC,
             n.IdNotificacion ASC
@@ -317,112 +1031,534 @@ class NotificacionesService:
             
             logger.info(f"📋 Encontradas {len(resultados)} notificaciones de WhatsApp")
             
-            notificaciones_procesadas = []
-            for notif in resultados:
-                
-                # VALIDACIÓN: Verificar que esté pendiente
-                if notif['Estado'] != 'pendiente':
-                    logger.error(f"🚨 Notificación {notif['IdNotificacion']} tiene estado '{notif['Estado']}' - SALTANDO")
-                    continue
-                
-                # Para WhatsApp, el destinatario es un número de teléfono (NO múltiples)
-                destinatario = (notif['Destinatario'] or '').strip()
-                
-                notif_procesada = {
-                    'IdNotificacion': notif['IdNotificacion'],
-                    'IdTipoNotificacion': notif['IdTipoNotificacion'],
-                    'tipo_descripcion': notif['tipo_descripcion'] or 'Sin tipo',
-                    'asunto': notif['Asunto'] or notif['asunto_default'] or 'Notificación del Sistema',
-                    'cuerpo': notif['Cuerpo'] or notif['cuerpo_default'] or 'Tienes una nueva notificación del sistema.',
-                    'destinatario': destinatario,
-                    'estado': notif['Estado'],
-                    'fecha_envio': notif['Fecha_Envio'],
-                    'fecha_programada': notif['Fecha_Programada'],
-                    'medio': notif['Medio']
-                }
-                
-                # Validar que tenga destinatario
-                if not destinatario:
-                    notif_procesada['error'] = 'Sin número de teléfono configurado'
-                    logger.warning(f"Notificación {notif['IdNotificacion']} sin destinatario")
-                
-                # Validar formato de número (debe empezar con +)
-                elif not destinatario.startswith('+'):
-                    notif_procesada['error'] = f'Número debe incluir código de país: {destinatario}'
-                    logger.warning(f"Notificación {notif['IdNotificacion']} con número inválido: {destinatario}")
-                
-                notificaciones_procesadas.append(notif_procesada)
+            notificaciones_procesadas = NotificacionesService._preparar_notificaciones_whatsapp(resultados)
             
             logger.info(f"Se encontraron {len(notificaciones_procesadas)} notificaciones de WhatsApp pendientes")
             return notificaciones_procesadas
-            
+        
         except Exception as e:
             logger.error(f"Error al obtener notificaciones de WhatsApp: {e}")
             return []
     
     @staticmethod
-    def actualizar_estado_notificacion(id_notificacion, nuevo_estado):
-        """
-        Actualiza el estado de una notificación de forma segura.
-        Solo permite cambios desde estado 'pendiente' a otros estados.
-        Estados válidos: 'pendiente' → 'enviado', 'error', 'parcial'
+    def reclamar_notificaciones_whatsapp_pendientes(limite=None, desde_id=0, marca=None):
         """
-        # Primero verificar el estado actual
-        query_verificar = """
-        SELECT Estado, Fecha_Programada, Asunto 
-        FROM Notificaciones 
-        WHERE IdNotificacion = ?
+        Reclama de forma atómica un lote de notificaciones de WhatsApp pendientes para este worker.
+        Retorna None si la consulta falló y [] si no hay pendientes.
         """
-        
         try:
-            resultado_actual = db_config.execute_query(query_verificar, [id_notificacion])
-            
-            if not resultado_actual:
-                logger.error(f"❌ Notificación {id_notificacion} no encontrada")
-                return False
-            
-            estado_previo = resultado_actual[0]['Estado']
-            fecha_prog = resultado_actual[0]['Fecha_Programada']
-            asunto = resultado_actual[0]['Asunto']
-            
-            # VALIDACIÓN CRÍTICA: Solo permitir cambios desde 'pendiente'
-            if estado_previo != 'pendiente':
-                logger.warning(f"🚨 ID {id_notificacion}: No se puede cambiar estado '{estado_previo}' → '{nuevo_estado}'")
-                return False
-            
-            # Actualizar solo si el estado actual es 'pendiente'
-            query_actualizar = """
-            UPDATE Notificaciones 
-            SET Estado = ?, Fecha_Envio = GETDATE()
-            WHERE IdNotificacion = ? AND Estado = 'pendiente'
-            """
+            while True:
+                resultados = NotificacionesService._reclamar_lote(
+                    FILTRO_MEDIO_WHATSAPP, limite or WHATSAPP_BATCH_SIZE, desde_id, marca)
+                
+                if not resultados:
+                    return []
+                
+                logger.info(f"📋 Reclamadas {len(resultados)} notificaciones de WhatsApp (worker {WORKER_ID})")
+                preparadas = NotificacionesService._preparar_notificaciones_whatsapp(resultados, estado_esperado='procesando')
+                if preparadas:
+                    return preparadas
+                
+                # Todo el lote quedó pospuesto (tipo desconocido): seguir con las siguientes
+                desde_id = max((r['IdNotificacion'] for r in resultados
+                                if r['EstadoAnterior'] != 'reintentar'), default=desde_id)
+        
+        except Exception as e:
+            logger.error(f"Error al reclamar notificaciones de WhatsApp: {e}")
+            return None
+    
+    @staticmethod
+    def _preparar_notificaciones_whatsapp(resultados, estado_esperado='pendiente'):
+        """
+        Completa asunto y cuerpo con los valores del tipo y valida el número de teléfono
+        """
+        notificaciones_procesadas = []
+        sin_tipo = []
+        for notif in resultados:
+            NotificacionesService._completar_con_tipo(notif)
+            
+            # VALIDACIÓN: Verificar que esté pendiente
+            if notif['Estado'] != estado_esperado:
+                logger.error(f"🚨 Notificación {notif['IdNotificacion']} tiene estado '{notif['Estado']}' - SALTANDO")
+                continue
+            
+            if notif['tipo_desconocido']:
+                sin_tipo.append(notif['IdNotificacion'])
+                continue
+            
+            # Para WhatsApp, el destinatario es un número de teléfono (NO múltiples)
+            destinatario = (notif['Destinatario'] or '').strip()
+            
+            notif_procesada = {
+                'IdNotificacion': notif['IdNotificacion'],
+                'IdTipoNotificacion': notif['IdTipoNotificacion'],
+                'tipo_descripcion': notif['tipo_descripcion'] or 'Sin tipo',
+                'asunto': notif['Asunto'] or notif['asunto_default'] or 'Notificación del Sistema',
+                'cuerpo': notif['Cuerpo'] or notif['cuerpo_default'] or 'Tienes una nueva notificación del sistema.',
+                'destinatario': destinatario,
+                'estado': notif['Estado'],
+                'fecha_envio': notif['Fecha_Envio'],
+                'fecha_programada': notif['Fecha_Programada'],
+                'medio': notif['Medio'],
+                'id_alerta': notif.get('IdAlerta'),
+                'intentos': notif.get('Intentos', 0),
+                'es_reintento': notif.get('EstadoAnterior') == 'reintentar'
+            }
             
-            filas_afectadas = db_config.execute_non_query(query_actualizar, [nuevo_estado, id_notificacion])
+            # Validar que tenga destinatario
+            if not destinatario:
+                notif_procesada['error'] = 'Sin número de teléfono configurado'
+                logger.warning(f"Notificación {notif['IdNotificacion']} sin destinatario")
             
-            if filas_afectadas > 0:
-                return True
+            # Validar formato de número (debe empezar con +)
+            elif not destinatario.startswith('+'):
+                notif_procesada['error'] = f'Número debe incluir código de país: {destinatario}'
+                logger.warning(f"Notificación {notif['IdNotificacion']} con número inválido: {destinatario}")
+            
+            notificaciones_procesadas.append(notif_procesada)
+        
+        NotificacionesService._posponer_sin_tipo(sin_tipo, estado_esperado)
+        return notificaciones_procesadas
+    
+    @staticmethod
+    def _reclamar_lote(filtro_medio, limite, desde_id=0, marca=None):
+        """
+        UPDATE ... OUTPUT atómico: marca como 'procesando' hasta `limite` notificaciones
+        pendientes del medio indicado, más hasta REINTENTOS_POR_LOTE en 'reintentar' cuyo
+        ProximoIntento ya venció, y retorna sus filas. Los reintentos tienen su propio cupo
+        para no quitarle lugar a las notificaciones nuevas.
+        READPAST hace que workers concurrentes salten las filas que otro está reclamando.
+        Las nuevas se paginan por IdNotificacion (keyset) para no volver a recorrer lo ya visto en el ciclo.
+        """
+        filtro_marca, params_marca = marca.filtro_sql() if marca else ("", [])
+        # Mismo corte que la marca de agua, para no saltear filas que vencen entre ambos
+        corte = marca.corte_ciclo if marca else None
+        
+        query = f"""
+        WITH nuevas AS (
+            SELECT TOP (?) n.IdNotificacion
+            FROM Notificaciones n WITH (UPDLOCK, READPAST, ROWLOCK)
+            WHERE (n.Fecha_Programada IS NULL OR n.Fecha_Programada <= {'?' if corte else 'GETDATE()'})
+              AND n.Estado = 'pendiente'
+              AND {filtro_medio}
+              AND n.IdNotificacion > ?
+              {filtro_marca}
+            ORDER BY n.IdNotificacion ASC
+        ),
+        reintentos AS (
+            SELECT TOP (?) n.IdNotificacion
+            FROM Notificaciones n WITH (UPDLOCK, READPAST, ROWLOCK)
+            WHERE n.Estado = 'reintentar'
+              AND n.ProximoIntento <= GETDATE()
+              AND {filtro_medio}
+            ORDER BY n.ProximoIntento ASC
+        )
+        UPDATE n
+        SET Estado = 'procesando',
+            WorkerId = ?,
+            LeaseExpira = DATEADD(SECOND, ?, GETDATE())
+        OUTPUT
+            inserted.IdNotificacion, inserted.IdTipoNotificacion, inserted.Asunto, inserted.Cuerpo,
+            inserted.Destinatario, inserted.Estado, inserted.Fecha_Envio, inserted.Fecha_Programada,
+            inserted.Medio, inserted.Intentos, inserted.IdAlerta, deleted.Estado AS EstadoAnterior
+        FROM Notificaciones n
+        WHERE n.Estado IN ('pendiente', 'reintentar')
+          AND n.IdNotificacion IN (
+              SELECT IdNotificacion FROM nuevas
+              UNION ALL
+              SELECT IdNotificacion FROM reintentos
+          )
+        """
+        
+        # Con lotes chicos (WhatsApp) los reintentos no deben alargar el lote más allá del lease
+        limite_reintentos = min(REINTENTOS_POR_LOTE, limite)
+        params = ([limite] + ([corte] if corte else []) + [desde_id] + params_marca +
+                  [limite_reintentos, WORKER_ID, LEASE_SEGUNDOS])
+        resultados = db_config.execute_query(query, params)
+        
+        if not resultados:
+            return []
+        
+        # OUTPUT no garantiza orden: restaurar prioridad (inmediatas primero, luego por fecha e ID)
+        resultados.sort(key=lambda r: (
+            r['Fecha_Programada'] is not None,
+            r['Fecha_Programada'] or datetime.min,
+            r['IdNotificacion']
+        ))
+        
+        return resultados
+    
+    @staticmethod
+    def _posponer_sin_tipo(ids_notificacion, estado_esperado):
+        """
+        Deja en 'pendiente' (sin contar un intento) las notificaciones cuyo tipo no está en el catálogo,
+        en lugar de fallarlas por falta de destinatarios; se vuelven a intentar en el próximo barrido.
+        """
+        if not ids_notificacion:
+            return
+        logger.warning(f"⏸️ Tipo de notificación desconocido, quedan pendientes: {ids_notificacion}")
+        if estado_esperado != 'procesando':
+            return
+        
+        placeholders = ', '.join('?' for _ in ids_notificacion)
+        query = f"""
+        UPDATE Notificaciones
+        SET Estado = 'pendiente', WorkerId = NULL, LeaseExpira = NULL
+        WHERE IdNotificacion IN ({placeholders})
+          AND Estado = 'procesando'
+          AND WorkerId = ?
+        """
+        try:
+            db_config.execute_non_query(query, list(ids_notificacion) + [WORKER_ID])
+        except Exception as e:
+            # Si falla, vuelven a 'pendiente' cuando venza el lease
+            logger.error(f"❌ Error devolviendo a pendiente notificaciones sin tipo: {e}")
+        # Quedaron por debajo de la marca de agua
+        for marca in MARCAS_PENDIENTES.values():
+            marca.invalidar()
+    
+    @staticmethod
+    def _completar_con_tipo(fila):
+        """
+        Agrega a la fila los valores por defecto de su tipo tomados del catálogo en memoria
+        (en lugar de hacer JOIN con Notificaciones_Tipo en cada consulta)
+        """
+        tipo = catalogo_tipos.obtener(fila['IdTipoNotificacion'])
+        # Tipo que todavía no está en el catálogo (ni después de recargarlo): no se puede armar la notificación
+        fila['tipo_desconocido'] = fila['IdTipoNotificacion'] is not None and tipo is None
+        tipo = tipo or {}
+        fila['tipo_descripcion'] = tipo.get('descripcion')
+        fila['destinatarios_default'] = tipo.get('destinatarios')
+        fila['asunto_default'] = tipo.get('asunto')
+        fila['cuerpo_default'] = tipo.get('cuerpo')
+        fila['modo_resumen'] = bool(tipo.get('ModoResumen'))
+        return fila
+    
+    @staticmethod
+    def obtener_envios_recientes_por_alerta(ids_alerta, excluir_ids=()):
+        """
+        Busca las copias de las alertas indicadas que están en envío o cuyo último envío fue dentro de
+        SUPRESION_VENTANA_SEGUNDOS, en cualquier estado (_suprimir_repetidas decide cuáles suprimen,
+        ver ESTADOS_SUPRESORES). Retorna {clave_supresion: [(IdNotificacion, Estado), ...]}
+        ordenadas por IdNotificacion. Si la consulta falla no se suprime nada.
+        """
+        previas = {}
+        if not ids_alerta:
+            return previas
+        
+        placeholders = ', '.join('?' for _ in ids_alerta)
+        query = f"""
+        SELECT n.IdNotificacion, n.IdAlerta, n.IdTipoNotificacion, n.Destinatario, n.Medio, n.Estado
+        FROM Notificaciones n
+        WHERE n.IdAlerta IN ({placeholders})
+          AND (n.Estado = 'procesando'
+               OR n.Fecha_Envio >= DATEADD(SECOND, -?, GETDATE()))
+        ORDER BY n.IdNotificacion
+        """
+        
+        try:
+            filas = db_config.execute_query(query, list(ids_alerta) + [SUPRESION_VENTANA_SEGUNDOS])
+        except Exception as e:
+            logger.error(f"❌ Error buscando envíos recientes por IdAlerta: {e}")
+            return previas
+        
+        for fila in filas:
+            if fila['IdNotificacion'] in excluir_ids:
+                continue
+            medio = fila['Medio'] or 'Email'
+            if medio == 'Email':
+                # Mismos destinatarios que arma _preparar_notificaciones_email (individuales + del tipo)
+                tipo = catalogo_tipos.obtener(fila['IdTipoNotificacion']) or {}
+                destinatarios = ';'.join(filter(None, [
+                    (fila['Destinatario'] or '').replace(',', ';'),
+                    (tipo.get('destinatarios') or '').replace(',', ';'),
+                ]))
             else:
-                logger.warning(f"⚠️ No se pudo actualizar ID {id_notificacion} - Estado cambió")
-                return False
-                
+                destinatarios = (fila['Destinatario'] or '').strip()
+            clave = ProcesadorNotificaciones._clave_supresion(fila['IdAlerta'], medio, destinatarios)
+            previas.setdefault(clave, []).append((fila['IdNotificacion'], fila['Estado']))
+        
+        return previas
+    
+    @staticmethod
+    def liberar_leases_expirados():
+        """
+        Devuelve a 'pendiente' las notificaciones cuyo lease expiró
+        (por ejemplo, porque el worker que las reclamó se detuvo a mitad del envío).
+        """
+        query = """
+        UPDATE Notificaciones
+        SET Estado = 'pendiente', WorkerId = NULL, LeaseExpira = NULL
+        WHERE Estado = 'procesando' AND LeaseExpira < GETDATE()
+        """
+        
+        try:
+            liberadas = db_config.execute_non_query(query)
+            if liberadas > 0:
+                logger.warning(f"♻️ Se liberaron {liberadas} notificaciones con lease expirado")
+                # Las filas liberadas pueden estar por debajo de la marca de agua
+                for marca in MARCAS_PENDIENTES.values():
+                    marca.invalidar()
+            return liberadas
         except Exception as e:
-            logger.error(f"❌ Error actualizando ID {id_notificacion}: {e}")
-            return False
+            logger.error(f"❌ Error liberando leases expirados: {e}")
+            return 0
     
     @staticmethod
-    def registrar_auditoria(id_notificacion, accion, descripcion, usuario='sistema'):
+    def confirmar_resultados_lote(resultados, usuario='sistema'):
         """
-        Registra entrada en auditoría
+        Confirma al final de un lote los resultados de envío: aplica todas las transiciones
+        de estado en una sola sentencia y escribe todas las filas de Auditoria en un solo
+        insert masivo. Retorna el conjunto de IDs que efectivamente cambiaron de estado.
         """
+        if not resultados:
+            return set()
+        
+        for r in resultados:
+            NotificacionesService._planificar_reintento(r)
+        
+        actualizadas = NotificacionesService.actualizar_estados_lote(
+            [(r['IdNotificacion'], r['estado'], r.get('espera_segundos'), r.get('error_tipo'), r.get('suprimida_por'))
+             for r in resultados])
+        
+        for r in resultados:
+            if r['IdNotificacion'] not in actualizadas:
+                logger.warning(f"⚠️ No se pudo actualizar ID {r['IdNotificacion']} - Estado cambió")
+        
+        NotificacionesService.registrar_auditoria_lote(resultados, usuario)
+        NotificacionesService.liberar_suprimidas(
+            [r['IdNotificacion'] for r in resultados if r['estado'] == 'fallido' and r['IdNotificacion'] in actualizadas])
+        return actualizadas
+    
+    @staticmethod
+    def liberar_suprimidas(ids_fallidas):
+        """
+        Devuelve a 'pendiente' las copias suprimidas por notificaciones que terminaron 'fallido',
+        para que la alerta se vuelva a intentar con una de ellas. Retorna la cantidad liberada.
+        """
+        if not ids_fallidas:
+            return 0
+        
+        placeholders = ', '.join('?' for _ in ids_fallidas)
+        query = f"""
+        SET NOCOUNT ON;
+        UPDATE Notificaciones
+        SET Estado = 'pendiente', IdSuprimidaPor = NULL
+        OUTPUT inserted.IdNotificacion, deleted.IdSuprimidaPor, inserted.IdAlerta, inserted.Medio
+        WHERE IdSuprimidaPor IN ({placeholders})
+          AND Estado = 'suprimido'
+        """
+        try:
+            liberadas = db_config.execute_query(query, list(ids_fallidas))
+        except Exception as e:
+            logger.error(f"❌ Error liberando copias suprimidas por {ids_fallidas}: {e}")
+            return 0
+        
+        if liberadas:
+            logger.warning(f"♻️ Se liberaron {len(liberadas)} copias suprimidas por notificaciones fallidas")
+            for fila in liberadas:
+                auditoria.registrar(
+                    'SUPRESION_LIBERADA', f"ID_{fila['IdSuprimidaPor']} terminó fallida, la copia vuelve a pendiente",
+                    id_notificacion=fila['IdNotificacion'], id_alerta=fila['IdAlerta'],
+                    medio=fila['Medio'] or 'Email', resultado='pendiente')
+            # Quedaron por debajo de la marca de agua
+            for marca in MARCAS_PENDIENTES.values():
+                marca.invalidar()
+        return len(liberadas)
+    
+    @staticmethod
+    def _planificar_reintento(resultado):
+        """
+        Decide qué pasa con un envío fallido o parcial según la política del medio:
+        si le quedan intentos pasa a 'reintentar' con una espera exponencial con jitter;
+        si no, un error pasa a 'fallido' (dead-letter) y un parcial queda como 'parcial'.
+        Los errores de validación (sin error_tipo) y los permanentes (5xx, dirección rechazada) no se reintentan.
+        """
+        if resultado['estado'] not in ('error', 'parcial') or not resultado.get('error_tipo'):
+            return resultado
+        
+        intento = resultado.get('intentos', 0) + 1
+        maximo = REINTENTOS_MAX.get(resultado.get('medio') or 'Email', REINTENTOS_MAX['Email'])
+        
+        if resultado.get('permanente'):
+            if resultado['estado'] == 'error':
+                resultado['estado'] = 'fallido'
+                resultado['accion'] = 'NOTIFICACION_FALLIDA'
+                resultado['descripcion'] = f"Error permanente ({resultado['error_tipo']}) - {resultado['descripcion']}"
+                logger.error(f"☠️ ID {resultado['IdNotificacion']}: error permanente {resultado['error_tipo']}, sin reintentos")
+            return resultado
+        
+        if intento < maximo:
+            # Backoff exponencial acotado, con la mitad de la espera al azar para no sincronizar reintentos
+            espera = min(REINTENTO_BASE_SEGUNDOS * (2 ** (intento - 1)), REINTENTO_MAX_SEGUNDOS)
+            espera = int(espera / 2 + random.uniform(0, espera / 2))
+            resultado['estado'] = 'reintentar'
+            resultado['espera_segundos'] = espera
+            resultado['accion'] = 'REINTENTO_PROGRAMADO'
+            resultado['descripcion'] = (f"Intento {intento}/{maximo} ({resultado['error_tipo']}), "
+                                        f"próximo en {espera}s - {resultado['descripcion']}")
+            logger.info(f"🔁 ID {resultado['IdNotificacion']}: reintento {intento + 1}/{maximo} en {espera}s")
+        elif resultado['estado'] == 'error':
+            resultado['estado'] = 'fallido'
+            resultado['accion'] = 'NOTIFICACION_FALLIDA'
+            resultado['descripcion'] = f"Sin más reintentos ({intento}/{maximo}) - {resultado['descripcion']}"
+            logger.error(f"☠️ ID {resultado['IdNotificacion']}: sin más reintentos ({intento}/{maximo})")
+        
+        return resultado
+    
+    @staticmethod
+    def actualizar_estados_lote(transiciones):
+        """
+        Aplica varias transiciones (IdNotificacion, nuevo_estado, espera_segundos, error_tipo, suprimida_por)
+        en una sola sentencia. Solo se actualizan las filas que este worker todavía tiene reclamadas
+        ('procesando' con su WorkerId): si el lease se perdió, la fila es de quien la volvió a reclamar.
+        Cada transición (salvo una supresión)
+        cuenta un intento; espera_segundos fija ProximoIntento para el estado 'reintentar'.
+        Retorna el conjunto de IDs actualizados.
+        """
+        actualizadas = set()
+        
+        # Máximo 2100 parámetros por consulta en SQL Server (5 por notificación)
+        tamano_lote = 400
+        for inicio in range(0, len(transiciones), tamano_lote):
+            lote = transiciones[inicio:inicio + tamano_lote]
+            valores = ', '.join('(?, ?, ?, ?, ?)' for _ in lote)
+            query = f"""
+            SET NOCOUNT ON;
+            DECLARE @transiciones TABLE (
+                IdNotificacion INT PRIMARY KEY, Estado NVARCHAR(20), EsperaSegundos INT NULL,
+                ErrorTipo NVARCHAR(100) NULL, SuprimidaPor INT NULL
+            );
+            INSERT INTO @transiciones (IdNotificacion, Estado, EsperaSegundos, ErrorTipo, SuprimidaPor) VALUES {valores};
+            
+            UPDATE n
+            SET Estado = t.Estado,
+                Fecha_Envio = CASE WHEN t.Estado = 'reintentar' THEN n.Fecha_Envio ELSE GETDATE() END,
+                Intentos = n.Intentos + CASE WHEN t.Estado = 'suprimido' THEN 0 ELSE 1 END,
+                ProximoIntento = CASE WHEN t.EsperaSegundos IS NULL THEN NULL
+                                      ELSE DATEADD(SECOND, t.EsperaSegundos, GETDATE()) END,
+                UltimoErrorTipo = COALESCE(t.ErrorTipo, n.UltimoErrorTipo),
+                IdSuprimidaPor = t.SuprimidaPor,
+                WorkerId = NULL,
+                LeaseExpira = NULL
+            OUTPUT inserted.IdNotificacion
+            FROM Notificaciones n
+            INNER JOIN @transiciones t ON t.IdNotificacion = n.IdNotificacion
+            WHERE n.Estado = 'procesando' AND n.WorkerId = ?;
+            """
+            params = []
+            for transicion in lote:
+                params.extend(transicion)
+            params.append(WORKER_ID)
+            
+            try:
+                filas = db_config.execute_query(query, params)
+                actualizadas.update(fila['IdNotificacion'] for fila in filas)
+            except Exception as e:
+                logger.error(f"❌ Error actualizando estados por lote ({len(lote)} notificaciones): {e}")
+        
+        return actualizadas
+    
+    @staticmethod
+    def expandir_destinatarios_lote(envios):
+        """
+        Asegura que cada notificación tenga sus destinatarios en NotificacionDestinatarios:
+        solo las que todavía no tienen filas se expanden desde el texto, con un insert masivo.
+        envios: lista de (IdNotificacion, lista_de_emails).
+        Retorna {IdNotificacion: [{'IdDestinatario', 'EmailDestinatario', 'Estado'}, ...]}.
+        """
+        destinatarios = NotificacionesService._leer_destinatarios(
+            [id_notificacion for id_notificacion, _ in envios])
+        
+        nuevos = []
+        for id_notificacion, emails in envios:
+            if id_notificacion in destinatarios:
+                continue
+            vistos = set()
+            for email in emails:
+                # UNIQUE(IdNotificacion, EmailDestinatario): sin repetidos dentro de la lista
+                if email.lower() not in vistos:
+                    vistos.add(email.lower())
+                    nuevos.append([id_notificacion, email])
+        
+        if nuevos:
+            query = """
+            INSERT INTO NotificacionDestinatarios (IdNotificacion, EmailDestinatario, Estado)
+            VALUES (?, ?, 'pendiente')
+            """
+            db_config.execute_many(query, nuevos)
+            destinatarios.update(NotificacionesService._leer_destinatarios(
+                sorted({id_notificacion for id_notificacion, _ in nuevos})))
+        
+        return destinatarios
+    
+    @staticmethod
+    def _leer_destinatarios(ids_notificacion):
+        """
+        Lee los destinatarios registrados de varias notificaciones.
+        Retorna {IdNotificacion: [filas ordenadas por IdDestinatario]}.
+        """
+        destinatarios = {}
+        
+        # Máximo 2100 parámetros por consulta en SQL Server
+        tamano_lote = 1000
+        for inicio in range(0, len(ids_notificacion), tamano_lote):
+            lote = ids_notificacion[inicio:inicio + tamano_lote]
+            placeholders = ', '.join('?' for _ in lote)
+            query = f"""
+            SELECT IdDestinatario, IdNotificacion, EmailDestinatario, Estado
+            FROM NotificacionDestinatarios
+            WHERE IdNotificacion IN ({placeholders})
+            ORDER BY IdNotificacion, IdDestinatario
+            """
+            for fila in db_config.execute_query(query, lote):
+                destinatarios.setdefault(fila['IdNotificacion'], []).append(fila)
+        
+        return destinatarios
+    
+    @staticmethod
+    def actualizar_destinatarios_lote(seguimiento):
+        """
+        Registra el resultado del envío a cada destinatario (IdDestinatario, exito, error)
+        con un solo update masivo
+        """
+        if not seguimiento:
+            return True
+        
         query = """
-        INSERT INTO Auditoria (accion, detalle, fecha_aud, [user])
-        VALUES (?, ?, GETDATE(), ?)
+        UPDATE NotificacionDestinatarios
+        SET Estado = ?,
+            Intentos = Intentos + 1,
+            UltimoError = ?,
+            FechaEnvio = CASE WHEN ? = 'enviado' THEN GETDATE() ELSE FechaEnvio END
+        WHERE IdDestinatario = ?
         """
         
         try:
-            detalle_completo = f"ID_{id_notificacion}: {descripcion}"
-            db_config.execute_non_query(query, [accion, detalle_completo, usuario])
+            params = []
+            for id_destinatario, exito, error in seguimiento:
+                estado = 'enviado' if exito else 'error'
+                params.append([estado, None if exito else str(error)[:500], estado, id_destinatario])
+            db_config.execute_many(query, params)
             return True
         except Exception as e:
-            logger.error(f"❌ Error en auditoría ID {id_notificacion}: {e}")
+            logger.error(f"❌ Error actualizando destinatarios por lote ({len(seguimiento)} envíos): {e}")
             return False
+    
+    @staticmethod
+    def registrar_auditoria_lote(resultados, usuario='sistema'):
+        """
+        Registra en auditoría el resultado de cada notificación (dicts con IdNotificacion, accion,
+        descripcion, estado y opcionalmente medio, id_alerta y duracion_ms) en columnas propias.
+        Se encolan y el escritor de auditoría las inserta en bloque en segundo plano.
+        """
+        for r in resultados:
+            auditoria.registrar(
+                r['accion'], r['descripcion'], usuario,
+                id_notificacion=r['IdNotificacion'],
+                id_alerta=r.get('id_alerta'),
+                medio=r.get('medio'),
+                duracion_ms=r.get('duracion_ms'),
+                resultado=r.get('estado')
+            )
+        return True
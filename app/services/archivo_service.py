@@ -0,0 +1,174 @@
+from app.utils.database_config import db_config
+from app.utils.tokens_accion import firmador_tokens
+import os
+import time
+import logging
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# Estados que ya no cambian por el procesador (solo por los botones mientras el enlace está vigente)
+ESTADOS_TERMINALES = ('enviado', 'recibido', 'parcial', 'error', 'fallido', 'suprimido', 'resuelto', 'cancelado')
+
+class ArchivadorHistorico:
+    """
+    Traspasa los datos fríos a las tablas de archivo (migrations/add_archivo_historico.sql) para que
+    Notificaciones y Auditoria mantengan un tamaño acotado sin importar el historial:
+    - Notificaciones en estado terminal sin actividad hace más de ARCHIVO_DIAS_NOTIFICACIONES,
+      junto con sus NotificacionDestinatarios.
+    - Filas de Auditoria con más de ARCHIVO_DIAS_AUDITORIA.
+    Cada lote (ARCHIVO_LOTE filas) es un DELETE ... OUTPUT INTO en su propia transacción corta,
+    con ARCHIVO_PAUSA_MS entre lotes; ARCHIVO_MAX_SEGUNDOS limita la duración de cada ejecución.
+    """
+
+    def __init__(self, dias_notificaciones=None, dias_auditoria=None, tamano_lote=None, pausa_ms=None, max_segundos=None):
+        self.dias_notificaciones = int(dias_notificaciones or os.getenv('ARCHIVO_DIAS_NOTIFICACIONES', 120))
+        self.dias_auditoria = int(dias_auditoria or os.getenv('ARCHIVO_DIAS_AUDITORIA', 180))
+        self.tamano_lote = int(tamano_lote or os.getenv('ARCHIVO_LOTE', 1000))
+        self.pausa = int(pausa_ms if pausa_ms is not None else os.getenv('ARCHIVO_PAUSA_MS', 200)) / 1000
+        self.max_segundos = float(max_segundos or os.getenv('ARCHIVO_MAX_SEGUNDOS', 0)) or None
+
+        # Una notificación con enlaces de acción vigentes se queda en la tabla caliente
+        dias_enlaces = -(-firmador_tokens.ttl_segundos // 86400) if firmador_tokens.habilitado else 7
+        if self.dias_notificaciones <= dias_enlaces:
+            logger.warning(f"⚠️ ARCHIVO_DIAS_NOTIFICACIONES ({self.dias_notificaciones}) no supera la vigencia "
+                           f"de los enlaces ({dias_enlaces} días), se usa {dias_enlaces + 1}")
+            self.dias_notificaciones = dias_enlaces + 1
+
+    @staticmethod
+    def _columnas_comunes(tabla, tabla_archivo):
+        """Columnas de la tabla que también existen en su archivo, en el orden de la tabla"""
+        query = """
+        SELECT c.COLUMN_NAME
+        FROM INFORMATION_SCHEMA.COLUMNS c
+        WHERE c.TABLE_NAME = ?
+          AND EXISTS (SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS a
+                      WHERE a.TABLE_NAME = ? AND a.COLUMN_NAME = c.COLUMN_NAME)
+        ORDER BY c.ORDINAL_POSITION
+        """
+        columnas = [fila['COLUMN_NAME'] for fila in db_config.execute_query(query, [tabla, tabla_archivo])]
+        if not columnas:
+            raise RuntimeError(f"No existe {tabla_archivo}: ejecutar migrations/add_archivo_historico.sql")
+        return columnas
+
+    def _tiempo_agotado(self, inicio):
+        return self.max_segundos is not None and time.monotonic() - inicio >= self.max_segundos
+
+    def archivar_notificaciones(self):
+        """Traspasa las notificaciones terminales antiguas. Retorna {'notificaciones', 'destinatarios', 'segundos'}"""
+        columnas_n = self._columnas_comunes('Notificaciones', 'Notificaciones_Archivo')
+        columnas_d = self._columnas_comunes('NotificacionDestinatarios', 'NotificacionDestinatarios_Archivo')
+        lista_n = ', '.join(f'[{c}]' for c in columnas_n)
+        lista_d = ', '.join(f'[{c}]' for c in columnas_d)
+        salida_n = ', '.join(f'deleted.[{c}]' for c in columnas_n)
+        salida_d = ', '.join(f'deleted.[{c}]' for c in columnas_d)
+        estados = ', '.join(f"'{e}'" for e in ESTADOS_TERMINALES)
+
+        query = f"""
+        SET NOCOUNT ON;
+        SET XACT_ABORT ON;
+
+        DECLARE @lote TABLE (IdNotificacion INT PRIMARY KEY);
+        DECLARE @desde INT = ?;
+        DECLARE @corte DATETIME2(0) = DATEADD(DAY, -?, GETDATE());
+        DECLARE @destinatarios INT = 0, @notificaciones INT = 0, @candidatas INT, @ultimo INT;
+
+        -- Candidatas: terminales y sin ninguna actividad (envío, programación o botones) después del corte
+        INSERT INTO @lote (IdNotificacion)
+        SELECT TOP (?) n.IdNotificacion
+        FROM Notificaciones n
+        WHERE n.IdNotificacion > @desde
+          AND n.Estado IN ({estados})
+          AND COALESCE(n.Fecha_Envio, n.Fecha_Programada) < @corte
+          AND (n.Fecha_Programada IS NULL OR n.Fecha_Programada < @corte)
+          AND (n.FechaRecibido IS NULL OR n.FechaRecibido < @corte)
+          AND (n.FechaResuelto IS NULL OR n.FechaResuelto < @corte)
+          AND (n.FechaCancelacion IS NULL OR n.FechaCancelacion < @corte)
+        ORDER BY n.IdNotificacion;
+
+        SELECT @candidatas = COUNT(*), @ultimo = MAX(IdNotificacion) FROM @lote;
+
+        -- No archivar una notificación que una suprimida de la tabla caliente sigue referenciando
+        DELETE l
+        FROM @lote l
+        WHERE EXISTS (SELECT 1 FROM Notificaciones s
+                      WHERE s.IdSuprimidaPor = l.IdNotificacion
+                        AND NOT EXISTS (SELECT 1 FROM @lote l2 WHERE l2.IdNotificacion = s.IdNotificacion));
+
+        BEGIN TRANSACTION;
+
+        DELETE d
+        OUTPUT {salida_d} INTO NotificacionDestinatarios_Archivo ({lista_d})
+        FROM NotificacionDestinatarios d
+        INNER JOIN @lote l ON l.IdNotificacion = d.IdNotificacion;
+        SET @destinatarios = @@ROWCOUNT;
+
+        DELETE n
+        OUTPUT {salida_n} INTO Notificaciones_Archivo ({lista_n})
+        FROM Notificaciones n
+        INNER JOIN @lote l ON l.IdNotificacion = n.IdNotificacion;
+        SET @notificaciones = @@ROWCOUNT;
+
+        COMMIT TRANSACTION;
+
+        SELECT @candidatas AS Candidatas, @ultimo AS UltimoId,
+               @notificaciones AS Notificaciones, @destinatarios AS Destinatarios;
+        """
+
+        inicio = time.monotonic()
+        total = {'notificaciones': 0, 'destinatarios': 0}
+        desde = 0
+        while True:
+            fila = db_config.execute_query(query, [desde, self.dias_notificaciones, self.tamano_lote])[0]
+            total['notificaciones'] += fila['Notificaciones']
+            total['destinatarios'] += fila['Destinatarios']
+
+            if not fila['Candidatas'] or self._tiempo_agotado(inicio):
+                break
+            desde = fila['UltimoId']
+            time.sleep(self.pausa)
+
+        total['segundos'] = round(time.monotonic() - inicio, 1)
+        logger.info(f"🗄️ Notificaciones archivadas: {total['notificaciones']} "
+                    f"(destinatarios: {total['destinatarios']}) en {total['segundos']} s")
+        return total
+
+    def archivar_auditoria(self):
+        """Traspasa las filas de Auditoria antiguas. Retorna {'auditoria', 'segundos'}"""
+        columnas = self._columnas_comunes('Auditoria', 'Auditoria_Archivo')
+        lista = ', '.join(f'[{c}]' for c in columnas)
+        salida = ', '.join(f'deleted.[{c}]' for c in columnas)
+
+        query = f"""
+        SET NOCOUNT ON;
+
+        DELETE TOP (?) a
+        OUTPUT {salida} INTO Auditoria_Archivo ({lista})
+        FROM Auditoria a
+        WHERE a.fecha_aud < DATEADD(DAY, -?, GETDATE());
+
+        SELECT @@ROWCOUNT AS Filas;
+        """
+
+        inicio = time.monotonic()
+        total = 0
+        while True:
+            filas = db_config.execute_query(query, [self.tamano_lote, self.dias_auditoria])[0]['Filas']
+            total += filas
+            if filas < self.tamano_lote or self._tiempo_agotado(inicio):
+                break
+            time.sleep(self.pausa)
+
+        segundos = round(time.monotonic() - inicio, 1)
+        logger.info(f"🗄️ Filas de auditoría archivadas: {total} en {segundos} s")
+        return {'auditoria': total, 'segundos': segundos}
+
+    def ejecutar(self):
+        """Archiva notificaciones y auditoría; retorna el resumen de filas movidas y tiempos"""
+        resumen = {}
+        resumen.update(self.archivar_notificaciones())
+        resumen['segundos_notificaciones'] = resumen.pop('segundos')
+        resumen.update(self.archivar_auditoria())
+        resumen['segundos_auditoria'] = resumen.pop('segundos')
+        return resumen
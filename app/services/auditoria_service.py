@@ -0,0 +1,294 @@
+from app.utils.database_config import db_config
+import os
+import glob
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# Directorio por defecto de los archivos locales de auditoría pendiente (raíz del proyecto)
+DIRECTORIO_PENDIENTE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                    'auditoria_pendiente')
+PREFIJO_ARCHIVO = 'auditoria_pendiente_'
+
+class AuditoriaAsincrona:
+    """
+    Escritor de Auditoria en segundo plano. Los registros se encolan en memoria (cola acotada)
+    y un hilo los inserta en bloque al juntar AUDITORIA_LOTE registros o cada
+    AUDITORIA_INTERVALO_SEGUNDOS, fuera del camino de los envíos y de los clics.
+
+    Cola llena (AUDITORIA_POLITICA): 'archivo' escribe el registro en el archivo local,
+    'bloquear' espera lugar en la cola y 'descartar' lo pierde (se cuenta y se avisa en el log).
+    Si la base no responde el lote va a un archivo local propio de cada proceso
+    (AUDITORIA_DIRECTORIO_PENDIENTE/auditoria_pendiente_<pid>.jsonl, un JSON por línea), que se vuelve
+    a insertar en los próximos vaciados; los archivos que dejó un proceso que ya no escribe en ellos
+    (sin cambios hace AUDITORIA_HUERFANO_SEGUNDOS) los adopta otro proceso renombrándolos, así
+    cada archivo lo inserta un solo proceso. Al cerrar o al salir del proceso se escribe todo lo pendiente.
+    """
+    POLITICAS = ('archivo', 'bloquear', 'descartar')
+    # Orden de los valores de cada registro (columnas de Auditoria) y claves del archivo local
+    CAMPOS = ('accion', 'detalle', 'fecha', 'usuario', 'id_notificacion', 'id_alerta', 'medio', 'duracion_ms', 'resultado')
+
+    def __init__(self, tamano_lote=None, intervalo=None, capacidad=None, politica=None, archivo=None):
+        self.tamano_lote = int(tamano_lote or os.getenv('AUDITORIA_LOTE', 500))
+        self.intervalo = float(intervalo or os.getenv('AUDITORIA_INTERVALO_SEGUNDOS', 2))
+        self.reintento_archivo = float(os.getenv('AUDITORIA_REINTENTO_ARCHIVO_SEGUNDOS', 60))
+        self.politica = (politica or os.getenv('AUDITORIA_POLITICA', 'archivo')).lower()
+        if self.politica not in self.POLITICAS:
+            logger.error(f"AUDITORIA_POLITICA '{self.politica}' no válida, se usa 'archivo'")
+            self.politica = 'archivo'
+        self.directorio = os.path.abspath(os.getenv('AUDITORIA_DIRECTORIO_PENDIENTE') or DIRECTORIO_PENDIENTE)
+        self.huerfano = float(os.getenv('AUDITORIA_HUERFANO_SEGUNDOS', 600))
+        # Con un archivo fijo (pruebas) no se adoptan archivos de otros procesos
+        self._archivo_fijo = archivo
+
+        self._cola = queue.Queue(maxsize=int(capacidad or os.getenv('AUDITORIA_COLA_MAX', 10000)))
+        self._hilo = None
+        self._cerrado = False
+        self._lock = threading.Lock()
+        self._archivo_lock = threading.Lock()
+        self._reproceso_lock = threading.Lock()
+        self._ultimo_reintento = 0.0
+        self._atexit = False
+        self.descartados = 0
+
+    def registrar(self, accion, detalle, usuario='sistema', id_notificacion=None, id_alerta=None,
+                  medio=None, duracion_ms=None, resultado=None):
+        """Encola un registro de auditoría; no espera a la base"""
+        registro = (accion, detalle, datetime.now(), usuario, id_notificacion, id_alerta, medio, duracion_ms, resultado)
+
+        if not self._asegurar_hilo():
+            # Ya cerrado (por ejemplo durante la salida del proceso): escribir directo
+            self._escribir([registro])
+            return
+
+        try:
+            if self.politica == 'bloquear':
+                self._cola.put(registro)
+            else:
+                self._cola.put_nowait(registro)
+        except queue.Full:
+            if self.politica == 'archivo':
+                self._derramar([registro])
+            else:
+                self.descartados += 1
+                if self.descartados % 1000 == 1:
+                    logger.warning(f"⚠️ Cola de auditoría llena, registros descartados: {self.descartados}")
+
+    @property
+    def pendientes(self):
+        return self._cola.qsize()
+
+    @property
+    def archivo(self):
+        """Archivo local de este proceso (el pid se toma al usarlo, así sirve también después de un fork)"""
+        if self._archivo_fijo:
+            return self._archivo_fijo
+        return os.path.join(self.directorio, f'{PREFIJO_ARCHIVO}{os.getpid()}.jsonl')
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return not self._cerrado
+        with self._lock:
+            if self._cerrado:
+                return False
+            if self._hilo is None or not self._hilo.is_alive():
+                if self._hilo is not None:
+                    logger.error("❌ El escritor de auditoría se detuvo, se reinicia")
+                self._hilo = threading.Thread(target=self._ciclo, name='auditoria', daemon=True)
+                self._hilo.start()
+                if not self._atexit:
+                    atexit.register(self.cerrar)
+                    self._atexit = True
+        return True
+
+    def _ciclo(self):
+        while True:
+            try:
+                if not self._pasada():
+                    return
+            except Exception as e:
+                # Un error inesperado no debe detener el hilo: la cola se llenaría y con 'bloquear' colgaría a los llamadores
+                logger.error(f"❌ Error en el escritor de auditoría: {e}")
+                time.sleep(min(self.intervalo, 1))
+
+    def _pasada(self):
+        """Junta y escribe un lote; retorna False al recibir la señal de cierre"""
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamano_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                registro = self._cola.get(timeout=restante)
+            except queue.Empty:
+                break
+            if registro is None:
+                # Cierre: escribir lo que quede en la cola y terminar
+                while True:
+                    try:
+                        registro = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if registro is not None:
+                        lote.append(registro)
+                self._escribir(lote)
+                return False
+            lote.append(registro)
+        self._escribir(lote)
+        return True
+
+    def _insertar(self, registros):
+        query = """
+        INSERT INTO Auditoria (accion, detalle, fecha_aud, [user], IdNotificacion, IdAlerta, Medio, DuracionMs, Resultado)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        db_config.execute_many(query, [list(r) for r in registros])
+
+    def _escribir(self, lote):
+        if lote:
+            try:
+                self._insertar(lote)
+            except Exception as e:
+                logger.error(f"❌ Error escribiendo auditoría ({len(lote)} registros), se guardan en {self.archivo}: {e}")
+                self._derramar(lote)
+                return
+
+        # El archivo local se reintenta cuando la base vuelve a responder o cada reintento_archivo
+        if (lote or time.monotonic() - self._ultimo_reintento > self.reintento_archivo) and self._hay_archivo():
+            try:
+                self._reprocesar_archivo()
+            except Exception as e:
+                logger.error(f"❌ Error reprocesando la auditoría local pendiente: {e}")
+
+    def _en_proceso(self):
+        """Archivos de este proceso listos para insertar (el propio y los adoptados)"""
+        return sorted(glob.glob(glob.escape(self.archivo) + '*.reproceso'))
+
+    def _huerfanos(self):
+        """Archivos de otros procesos sin cambios hace más de AUDITORIA_HUERFANO_SEGUNDOS"""
+        if self._archivo_fijo:
+            return []
+        propio = self.archivo
+        limite = time.time() - self.huerfano
+        huerfanos = []
+        for ruta in glob.glob(os.path.join(glob.escape(self.directorio), PREFIJO_ARCHIVO + '*')):
+            if ruta.startswith(propio):
+                continue
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    huerfanos.append(ruta)
+            except OSError:
+                continue  # otro proceso lo acaba de adoptar o eliminar
+        return huerfanos
+
+    def _hay_archivo(self):
+        return os.path.exists(self.archivo) or bool(self._en_proceso()) or bool(self._huerfanos())
+
+    def _derramar(self, registros):
+        """Agrega los registros al archivo local y lo sincroniza a disco"""
+        try:
+            os.makedirs(os.path.dirname(self.archivo), exist_ok=True)
+            with self._archivo_lock, open(self.archivo, 'a', encoding='utf-8') as f:
+                for registro in registros:
+                    d = dict(zip(self.CAMPOS, registro))
+                    d['fecha'] = d['fecha'].isoformat()
+                    f.write(json.dumps(d, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            logger.error(f"❌ No se pudieron guardar {len(registros)} registros de auditoría en {self.archivo}: {e}")
+
+    def _reprocesar_archivo(self):
+        """Inserta en un solo envío los registros guardados en el archivo local"""
+        if not self._reproceso_lock.acquire(blocking=False):
+            return
+        try:
+            self._ultimo_reintento = time.monotonic()
+            propio = self.archivo
+            with self._archivo_lock:
+                if os.path.exists(propio) and not os.path.exists(propio + '.reproceso'):
+                    os.replace(propio, propio + '.reproceso')
+
+            # El rename es atómico: si dos procesos adoptan el mismo archivo solo uno lo consigue
+            for huerfano in self._huerfanos():
+                try:
+                    os.rename(huerfano, f'{propio}.{os.path.basename(huerfano)}.reproceso')
+                except OSError:
+                    continue
+
+            for en_proceso in self._en_proceso():
+                if not self._insertar_archivo(en_proceso):
+                    return
+        finally:
+            self._reproceso_lock.release()
+
+    def _insertar_archivo(self, en_proceso):
+        """Inserta en un solo envío un archivo local y lo elimina; retorna False si la base no respondió"""
+        registros = []
+        try:
+            with open(en_proceso, encoding='utf-8') as f:
+                for linea in f:
+                    if not linea.strip():
+                        continue
+                    try:
+                        d = json.loads(linea)
+                        d['fecha'] = datetime.fromisoformat(d['fecha'])
+                        registros.append(tuple(d.get(campo) for campo in self.CAMPOS))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"⚠️ Línea de auditoría inválida en {en_proceso}, se omite")
+        except FileNotFoundError:
+            return True
+
+        try:
+            if registros:
+                self._insertar(registros)
+        except Exception as e:
+            logger.warning(f"⚠️ Auditoría local pendiente ({len(registros)} registros), se reintentará: {e}")
+            return False
+
+        try:
+            os.remove(en_proceso)
+        except FileNotFoundError:
+            pass
+        logger.info(f"📼 {len(registros)} registros de auditoría recuperados de {en_proceso}")
+        return True
+
+    def cerrar(self, timeout=10):
+        """Escribe lo pendiente y detiene el hilo"""
+        with self._lock:
+            if self._cerrado:
+                return
+            self._cerrado = True
+            hilo = self._hilo
+        if hilo is None:
+            return
+        try:
+            self._cola.put(None, timeout=timeout)
+        except queue.Full:
+            logger.error("❌ No se pudo detener el escritor de auditoría: cola llena")
+            return
+        hilo.join(timeout)
+
+        # Registros encolados mientras se cerraba
+        resto = []
+        while True:
+            try:
+                registro = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if registro is not None:
+                resto.append(registro)
+        if resto:
+            self._escribir(resto)
+
+# Instancia global para usar en todo el proyecto
+auditoria = AuditoriaAsincrona()
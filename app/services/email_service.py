@@ -3,14 +3,184 @@ from email.mime.text import MIMEText
 from email.utils import formataddr
 import logging
 import os
+import time
 import secrets
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from app.utils.database_config import db_config
+from app.utils.tokens_accion import firmador_tokens, ACCIONES
 
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+class ErrorSMTP(Exception):
+    """
+    Falla de envío de un email, clasificada para la política de reintentos:
+    tipo es el código SMTP ('SMTP550') o la clase de la excepción original ('SMTPServerDisconnected',
+    'TimeoutError'...); permanente indica que reintentar no va a servir (5xx, dirección rechazada).
+    """
+    
+    def __init__(self, mensaje, tipo, permanente=False):
+        super().__init__(mensaje)
+        self.tipo = tipo
+        self.permanente = permanente
+    
+    @classmethod
+    def desde_excepcion(cls, error):
+        if isinstance(error, cls):
+            return error
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            codigos = [codigo for codigo, _ in error.recipients.values()] or [0]
+            return cls(str(error), f"SMTP{codigos[0]}", all(500 <= codigo < 600 for codigo in codigos))
+        if isinstance(error, smtplib.SMTPAuthenticationError):
+            # Credenciales o cuenta: se corrige en la configuración, no es culpa del mensaje
+            return cls(str(error), f"SMTP{error.smtp_code}", False)
+        if isinstance(error, smtplib.SMTPConnectError):
+            return cls(str(error), type(error).__name__, False)
+        if isinstance(error, smtplib.SMTPResponseException):
+            return cls(str(error), f"SMTP{error.smtp_code}", 500 <= error.smtp_code < 600)
+        return cls(str(error), type(error).__name__, False)
+
+class SMTPSessionPool:
+    """
+    Pool de sesiones SMTP autenticadas que se reutilizan entre destinatarios y ciclos.
+    Evita repetir connect + STARTTLS + LOGIN + QUIT en cada email: las sesiones ociosas
+    se verifican con NOOP antes de reutilizarse y se renuevan al llegar al máximo de
+    mensajes por conexión.
+    """
+    
+    def __init__(self, host, port, user, password, max_size=8, max_mensajes_por_conexion=100,
+                 idle_timeout=120, noop_interval=10, timeout=30, espera_maxima=60):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_size = max(max_size, 1)
+        self.max_mensajes_por_conexion = max_mensajes_por_conexion
+        self.idle_timeout = idle_timeout
+        self.noop_interval = noop_interval
+        self.timeout = timeout
+        self.espera_maxima = espera_maxima
+        
+        # Sesiones libres como dict {'server', 'mensajes', 'ultimo_uso'}
+        self._idle = deque()
+        self._total = 0
+        self._cond = threading.Condition(threading.Lock())
+    
+    def _conectar(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(self.user, self.password)
+        except Exception:
+            self._cerrar_server(server)
+            raise
+        return {'server': server, 'mensajes': 0, 'ultimo_uso': time.monotonic()}
+    
+    def _esta_viva(self, sesion):
+        try:
+            return sesion['server'].noop()[0] == 250
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _cerrar_server(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+    
+    def _adquirir(self):
+        limite = time.monotonic() + self.espera_maxima
+        with self._cond:
+            while True:
+                if self._idle:
+                    sesion = self._idle.pop()
+                    break
+                if self._total < self.max_size:
+                    self._total += 1
+                    sesion = None
+                    break
+                # Un servidor colgado retiene todas las sesiones: no esperar indefinidamente
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise ErrorSMTP(f"Sin sesión SMTP libre después de {self.espera_maxima}s", 'EsperaSesionSMTP')
+                self._cond.wait(restante)
+        
+        if sesion is not None:
+            inactiva = time.monotonic() - sesion['ultimo_uso']
+            if inactiva > self.idle_timeout or (inactiva > self.noop_interval and not self._esta_viva(sesion)):
+                logger.info("🔄 Sesión SMTP inactiva o caída, reconectando...")
+                self._cerrar_server(sesion['server'])
+                sesion = None
+        
+        if sesion is None:
+            try:
+                sesion = self._conectar()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+        return sesion
+    
+    def _liberar(self, sesion, descartar=False):
+        if descartar or sesion['mensajes'] >= self.max_mensajes_por_conexion:
+            self._cerrar_server(sesion['server'])
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+        
+        sesion['ultimo_uso'] = time.monotonic()
+        with self._cond:
+            self._idle.append(sesion)
+            self._cond.notify()
+    
+    def enviar(self, remitente, destinatario, mensaje):
+        """
+        Envía un mensaje usando una sesión del pool.
+        Si la sesión se cayó durante el envío, reconecta y reintenta una vez.
+        """
+        for intento in range(2):
+            sesion = self._adquirir()
+            try:
+                sesion['server'].sendmail(remitente, destinatario, mensaje)
+                sesion['mensajes'] += 1
+                self._liberar(sesion)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._liberar(sesion, descartar=True)
+                if intento == 1:
+                    raise
+                logger.info("🔄 Sesión SMTP desconectada durante el envío, reintentando...")
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Error del servidor para este mensaje: limpiar la transacción y conservar la sesión
+                try:
+                    sesion['server'].rset()
+                    self._liberar(sesion)
+                except Exception:
+                    self._liberar(sesion, descartar=True)
+                raise
+            except Exception:
+                self._liberar(sesion, descartar=True)
+                raise
+    
+    def cerrar_todas(self):
+        """Cierra (QUIT) todas las sesiones ociosas"""
+        with self._cond:
+            sesiones = list(self._idle)
+            self._idle.clear()
+            self._total -= len(sesiones)
+            self._cond.notify_all()
+        for sesion in sesiones:
+            self._cerrar_server(sesion['server'])
+
 class EmailService:
     def __init__(self):
         self.smtp_server = os.getenv('SMTP_SERVER')
@@ -19,22 +189,42 @@ class EmailService:
         self.smtp_password = os.getenv('SMTP_PASSWORD')
         self.sender_name = os.getenv('EMAIL_SENDER_NAME', 'Sistema de Notificaciones')
         self.base_url = os.getenv('BASE_URL')
-
-    def enviar_email(self, destinatario, asunto, cuerpo, notification_id=None):
+        
+        # Sesiones SMTP persistentes compartidas entre envíos y ciclos
+        self.smtp_pool = SMTPSessionPool(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_user,
+            self.smtp_password,
+            # Por defecto una sesión por hilo de envío, para que ningún hilo espere una sesión libre
+            max_size=int(os.getenv('SMTP_POOL_MAX_SIZE') or os.getenv('EMAIL_MAX_CONCURRENCIA', 8)),
+            max_mensajes_por_conexion=int(os.getenv('SMTP_MAX_MENSAJES_POR_CONEXION', 100)),
+            idle_timeout=int(os.getenv('SMTP_IDLE_TIMEOUT', 120)),
+            noop_interval=int(os.getenv('SMTP_NOOP_INTERVAL', 10)),
+            espera_maxima=int(os.getenv('SMTP_POOL_ESPERA_MAXIMA', 60)),
+        )
+    
+    def enviar_email(self, destinatario, asunto, cuerpo, notification_id=None, token_respuesta=None,
+                     elevar_errores=False):
         """
         Intenta enviar un email y retorna True si tiene éxito
-        Ahora incluye botones de acción si se proporciona notification_id
+        Ahora incluye botones de acción si se proporciona notification_id.
+        Si se pasa token_respuesta (resuelto por lote) no se consulta la base de datos.
+        Con elevar_errores=True una falla lanza ErrorSMTP (tipo y si es permanente) en lugar de retornar False.
         """
         if not all([self.smtp_server, self.smtp_user, self.smtp_password]):
             logger.error("Configuración SMTP incompleta en variables de entorno")
+            if elevar_errores:
+                raise ErrorSMTP("Configuración SMTP incompleta", 'ConfiguracionSMTP')
             return False
-
+        
         try:
-            logger.info(f"🔍 Conectando SMTP {self.smtp_server}:{self.smtp_port}")
+            logger.info(f"🔍 Enviando por SMTP {self.smtp_server}:{self.smtp_port}")
             
-            # Obtener o generar token para la notificación
+            # Obtener o generar token para la notificación (los firmados no se guardan en la base)
             if notification_id:
-                token_respuesta = self.get_or_create_action_token(notification_id)
+                if not token_respuesta and not firmador_tokens.habilitado:
+                    token_respuesta = self.get_or_create_action_token(notification_id)
                 
                 # Agregar botones al cuerpo del email
                 cuerpo = self.build_email_with_actions(cuerpo, notification_id, token_respuesta)
@@ -43,27 +233,28 @@ class EmailService:
             msg['Subject'] = asunto
             msg['From'] = formataddr(("Sistema de Notificaciones", os.getenv('SMTP_USER'))) #Aqui deben cambiar con la config del servidor SMTP
             msg['To'] = destinatario
-
-            # SOLUCION: Agregar timeout de 30 segundos
-            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.sendmail(self.smtp_user, destinatario, msg.as_string())
             
-            return True
+            # Reutiliza una sesión SMTP ya autenticada (timeout de 30 segundos por operación)
+            self.smtp_pool.enviar(self.smtp_user, destinatario, msg.as_string())
             
+            return True
+        
         except smtplib.SMTPAuthenticationError as e:
             logger.error(f"❌ Error de autenticación SMTP: {str(e)}")
-            return False
+            error = e
         except smtplib.SMTPConnectError as e:
             logger.error(f"❌ Error de conexión SMTP: {str(e)}")
-            return False
+            error = e
         except smtplib.SMTPException as e:
             logger.error(f"❌ Error SMTP general: {str(e)}")
-            return False
+            error = e
         except Exception as e:
             logger.error(f"❌ Error enviando email a {destinatario}: {str(e)}")
-            return False
+            error = e
+        
+        if elevar_errores:
+            raise ErrorSMTP.desde_excepcion(error) from error
+        return False
     
     def generate_action_token(self):
         """Genera un token seguro para las acciones de email"""
@@ -100,12 +291,55 @@ class EmailService:
             
             logger.info(f"🔑 Nuevo token creado para notificación {notification_id}: {nuevo_token[:10]}...")
             return nuevo_token
-                
+        
         except Exception as e:
             logger.error(f"Error obteniendo/creando token para notificación {notification_id}: {e}")
             # Fallback: generar token temporal
             return self.generate_action_token()
     
+    def get_or_create_action_tokens(self, notification_ids):
+        """
+        Resuelve los tokens de varias notificaciones en un solo round trip:
+        genera tokens candidatos, los guarda solo donde TokenRespuesta IS NULL
+        y lee de vuelta el token vigente de cada notificación.
+        Retorna un dict {IdNotificacion: token}.
+        """
+        ids = list(dict.fromkeys(notification_ids))
+        tokens = {}
+        
+        # Máximo 2100 parámetros por consulta en SQL Server (2 por notificación)
+        tamano_lote = 500
+        for inicio in range(0, len(ids), tamano_lote):
+            lote = ids[inicio:inicio + tamano_lote]
+            valores = ', '.join('(?, ?)' for _ in lote)
+            query = f"""
+            SET NOCOUNT ON;
+            DECLARE @candidatos TABLE (IdNotificacion INT PRIMARY KEY, Token NVARCHAR(255));
+            INSERT INTO @candidatos (IdNotificacion, Token) VALUES {valores};
+            
+            UPDATE n
+            SET TokenRespuesta = c.Token, FechaExpiracion = DATEADD(DAY, 7, GETDATE())
+            FROM Notificaciones n
+            INNER JOIN @candidatos c ON c.IdNotificacion = n.IdNotificacion
+            WHERE n.TokenRespuesta IS NULL;
+            
+            SELECT n.IdNotificacion, n.TokenRespuesta
+            FROM Notificaciones n
+            INNER JOIN @candidatos c ON c.IdNotificacion = n.IdNotificacion;
+            """
+            params = []
+            for notification_id in lote:
+                params.extend([notification_id, self.generate_action_token()])
+            
+            try:
+                for fila in db_config.execute_query(query, params):
+                    tokens[fila['IdNotificacion']] = fila['TokenRespuesta']
+            except Exception as e:
+                logger.error(f"Error resolviendo tokens por lote ({len(lote)} notificaciones): {e}")
+        
+        logger.info(f"🔑 Tokens resueltos para {len(tokens)}/{len(ids)} notificaciones")
+        return tokens
+    
     def save_action_token(self, notification_id, token, fecha_expiracion):
         """Guarda el token de acción en la base de datos SOLO si no existe ya uno"""
         try:
@@ -121,31 +355,36 @@ class EmailService:
                 logger.info(f"✅ Token guardado para notificación {notification_id}")
             else:
                 logger.info(f"ℹ️ Token ya existía para notificación {notification_id}, no se sobrescribió")
-                
+        
         except Exception as e:
             logger.error(f"Error guardando token: {e}")
     
-    def build_email_with_actions(self, cuerpo, notification_id, token):
-        """Construye el email con botones de acción"""
+    def build_email_with_actions(self, cuerpo, notification_id, token=None):
+        """
+        Construye el email con botones de acción.
+        Sin token (tokens firmados habilitados) cada botón lleva su propio token firmado con HMAC.
+        """
+        tokens = {accion: token or firmador_tokens.firmar(notification_id, accion) for accion in ACCIONES}
+        dias_vigencia = round(firmador_tokens.ttl_segundos / 86400) if not token else 7
         action_buttons = f"""
         <div style="margin: 30px 0; text-align: center; border-top: 1px solid #eee; padding-top: 20px;">
             <p style="color: #666; margin-bottom: 15px; font-size: 14px;">Utilizar botones en la Red de Masa o vía VPN</p>
             <table cellpadding="0" cellspacing="0" style="margin: 0 auto;">
                 <tr>
                     <td style="padding: 0 8px;">
-                        <a href="{self.base_url}/notifications/{notification_id}/received?token={token}" 
+                        <a href="{self.base_url}/notifications/{notification_id}/received?token={tokens['received']}" 
                            style="background-color: #28a745; color: white; padding: 10px 16px; text-decoration: none; border-radius: 4px; display: inline-block; font-weight: bold; font-size: 13px;">
                             ✅ Recibido
                         </a>
                     </td>
                     <td style="padding: 0 8px;">
-                        <a href="{self.base_url}/notifications/{notification_id}/resolved?token={token}" 
+                        <a href="{self.base_url}/notifications/{notification_id}/resolved?token={tokens['resolved']}" 
                            style="background-color: #007bff; color: white; padding: 10px 16px; text-decoration: none; border-radius: 4px; display: inline-block; font-weight: bold; font-size: 13px;">
                             ✅ Resuelto
                         </a>
                     </td>
                     <td style="padding: 0 8px;">
-                        <a href="{self.base_url}/notifications/{notification_id}/cancel?token={token}" 
+                        <a href="{self.base_url}/notifications/{notification_id}/cancel?token={tokens['cancel']}" 
                            style="background-color: #dc3545; color: white; padding: 10px 16px; text-decoration: none; border-radius: 4px; display: inline-block; font-weight: bold; font-size: 13px;">
                             ❌ Cancelar
                         </a>
@@ -153,7 +392,7 @@ class EmailService:
                 </tr>
             </table>
             <p style="color: #999; font-size: 12px; margin-top: 15px;">
-                Los enlaces expiran en 7 días desde el envío de este email.<br>
+                Los enlaces expiran en {dias_vigencia} días desde el envío de este email.<br>
                 <strong>Nota:</strong> Al marcar como Resuelto o Cancelar, se actualizarán automáticamente todas las notificaciones pendientes relacionadas.
             </p>
         </div>
@@ -167,3 +406,26 @@ class EmailService:
         else:
             # Si es texto plano o HTML simple, agregamos al final
             return cuerpo + action_buttons
+    
+    def build_digest_email(self, items):
+        """
+        Construye un email de resumen con varias notificaciones, cada una con sus propios botones.
+        items: lista de dicts con 'IdNotificacion', 'asunto', 'cuerpo', 'tipo_descripcion' y 'token_respuesta'.
+        """
+        secciones = []
+        for item in items:
+            cuerpo = self.build_email_with_actions(item['cuerpo'], item['IdNotificacion'], item['token_respuesta'])
+            secciones.append(f"""
+        <div style="border: 1px solid #ddd; border-radius: 6px; padding: 16px; margin-bottom: 24px;">
+            <p style="color: #999; font-size: 12px; margin: 0 0 4px 0;">#{item['IdNotificacion']} · {item['tipo_descripcion']}</p>
+            <h3 style="margin: 0 0 12px 0;">{item['asunto']}</h3>
+            {cuerpo}
+        </div>
+        """)
+        
+        return f"""
+        <div style="font-family: Arial, sans-serif;">
+            <h2 style="margin-bottom: 20px;">Resumen de {len(items)} notificaciones</h2>
+            {''.join(secciones)}
+        </div>
+        """
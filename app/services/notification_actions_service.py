@@ -1,4 +1,7 @@
 from app.utils.database_config import db_config
+from app.utils.tokens_accion import firmador_tokens
+from app.services.auditoria_service import auditoria
+import time
 import logging
 from datetime import datetime
 
@@ -9,6 +12,99 @@ class NotificationActionsService:
     Servicio para manejar las acciones de los botones en los emails
     """
     
+    # Tabla de archivo -> (existe, time.monotonic() de la verificación)
+    _tablas_archivo = {}
+    
+    @staticmethod
+    def _existe_archivo(tabla):
+        """
+        Indica si existe la tabla de archivo (migrations/add_archivo_historico.sql es opcional).
+        Se consulta una vez; si no existía se vuelve a verificar cada 5 minutos.
+        """
+        existe, verificada = NotificationActionsService._tablas_archivo.get(tabla, (None, 0))
+        if existe is None or (not existe and time.monotonic() - verificada > 300):
+            fila = db_config.execute_query("SELECT OBJECT_ID(?) AS Archivo", [tabla])
+            existe = bool(fila) and fila[0]['Archivo'] is not None
+            NotificationActionsService._tablas_archivo[tabla] = (existe, time.monotonic())
+        return existe
+    
+    @staticmethod
+    def _filtro_token(notification_id, token, accion):
+        """
+        Valida el token de la acción. Los tokens firmados se verifican en memoria y la base
+        solo se usa para la transición de estado; los tokens aleatorios anteriores se siguen
+        validando contra TokenRespuesta. Retorna (filtro_sql, params) o None si es inválido.
+        """
+        if firmador_tokens.es_firmado(token):
+            valido, motivo = firmador_tokens.verificar(token, notification_id, accion)
+            if not valido:
+                logger.warning(f"Token firmado rechazado para notificación {notification_id} ({accion}): {motivo}")
+                return None
+            return "", []
+        return "AND TokenRespuesta = ? AND FechaExpiracion > GETDATE()", [token]
+    
+    @staticmethod
+    def _ejecutar_transicion(notification_id, filtro, estado, columna_fecha, estados_validos, cascadas=()):
+        """
+        Ejecuta la acción en un solo round trip y en una transacción: UPDATE ... OUTPUT de la
+        notificación (devuelve el estado anterior) y cascadas sobre las relacionadas que todavía se
+        van a enviar ('pendiente' o 'reintentar').
+        Si la notificación ya estaba en el estado destino no hay cascadas. La auditoría la escribe
+        después el escritor en segundo plano.
+        
+        cascadas: lista de (columna, variable de conteo), columna es 'Source_IdNotificacion' o 'IdAlerta'
+        Retorna la fila con EstadoAnterior, Asunto, IdAlerta, Source_IdNotificacion, PorSource
+        y PorAlerta, o None si el token no es válido o la notificación no admite la acción.
+        """
+        filtro_token, params_token = filtro
+        
+        bloques_cascada = []
+        for columna, variable in cascadas:
+            bloques_cascada.append(f"""
+                UPDATE n
+                SET Estado = '{estado}', {columna_fecha} = GETDATE()
+                FROM Notificaciones n
+                INNER JOIN @cambio c ON n.{columna} = c.{columna}
+                WHERE n.Estado IN ('pendiente', 'reintentar')
+                  AND n.IdNotificacion <> @id;
+                SET {variable} = @@ROWCOUNT;
+            """)
+        
+        estados = ', '.join(f"'{e}'" for e in estados_validos)
+        
+        query = f"""
+        SET NOCOUNT ON;
+        SET XACT_ABORT ON;
+        
+        DECLARE @id INT = ?;
+        DECLARE @cambio TABLE (EstadoAnterior NVARCHAR(20), Asunto NVARCHAR(MAX), IdAlerta INT, Source_IdNotificacion INT);
+        DECLARE @por_source INT = 0, @por_alerta INT = 0;
+        
+        BEGIN TRANSACTION;
+        
+        UPDATE Notificaciones
+        SET Estado = '{estado}',
+            {columna_fecha} = COALESCE({columna_fecha}, GETDATE())
+        OUTPUT deleted.Estado, inserted.Asunto, inserted.IdAlerta, inserted.Source_IdNotificacion INTO @cambio
+        WHERE IdNotificacion = @id
+          {filtro_token}
+          AND Estado IN ({estados});
+        
+        IF EXISTS (SELECT 1 FROM @cambio WHERE EstadoAnterior <> '{estado}')
+        BEGIN
+            {''.join(bloques_cascada)}
+        END
+        
+        COMMIT TRANSACTION;
+        
+        SELECT EstadoAnterior, Asunto, IdAlerta, Source_IdNotificacion,
+               @por_source AS PorSource, @por_alerta AS PorAlerta
+        FROM @cambio;
+        """
+        
+        result = db_config.execute_query(query, [notification_id] + params_token)
+        return result[0] if result else None
+    
     @staticmethod
     def mark_as_received(notification_id, token):
         """
@@ -18,18 +114,16 @@ class NotificationActionsService:
         try:
             # Verificar token válido y no expirado
             # Permitir si está en estado 'enviado' o si ya está 'recibido' (para múltiples destinatarios)
-            query_verify = """
-            SELECT IdNotificacion, Estado, FechaExpiracion, Asunto
-            FROM Notificaciones 
-            WHERE IdNotificacion = ? 
-              AND TokenRespuesta = ? 
-              AND FechaExpiracion > GETDATE()
-              AND Estado IN ('enviado', 'recibido')
-            """
-            
-            result = db_config.execute_query(query_verify, [notification_id, token])
+            inicio = time.monotonic()
+            filtro = NotificationActionsService._filtro_token(notification_id, token, 'received')
+            resultado = filtro and NotificationActionsService._ejecutar_transicion(
+                notification_id, filtro,
+                estado='recibido',
+                columna_fecha='FechaRecibido',
+                estados_validos=('enviado', 'recibido')
+            )
             
-            if not result:
+            if not resultado:
                 logger.warning(f"Token inválido o expirado para notificación {notification_id}")
                 return {
                     'success': False, 
@@ -37,10 +131,8 @@ class NotificationActionsService:
                     'type': 'error'
                 }
             
-            # Si ya está marcado como recibido, solo registrar la acción sin cambiar estado
-            current_state = result[0]['Estado']
-            
-            if current_state == 'recibido':
+            # Si ya está marcado como recibido, solo informar sin cambiar estado
+            if resultado['EstadoAnterior'] == 'recibido':
                 # Ya está marcado como recibido por otro destinatario
                 logger.info(f"✅ Notificación {notification_id} ya estaba marcada como recibida")
                 return {
@@ -49,36 +141,21 @@ class NotificationActionsService:
                     'type': 'success'
                 }
             
-            # Actualizar estado a "recibido" solo si no estaba ya marcado
-            query_update = """
-            UPDATE Notificaciones 
-            SET Estado = 'recibido', 
-                FechaRecibido = CASE WHEN FechaRecibido IS NULL THEN GETDATE() ELSE FechaRecibido END
-            WHERE IdNotificacion = ? AND TokenRespuesta = ? AND Estado = 'enviado'
-            """
-            
-            rows_affected = db_config.execute_non_query(query_update, [notification_id, token])
+            NotificationActionsService.log_action(
+                notification_id, 
+                'MARKED_RECEIVED', 
+                'Usuario marcó notificación como recibida',
+                id_alerta=resultado['IdAlerta'],
+                resultado='recibido',
+                duracion_ms=int((time.monotonic() - inicio) * 1000)
+            )
             
-            if rows_affected >= 0:  # Cambio: >= 0 en lugar de > 0 para manejar casos donde ya estaba marcado
-                # Registrar en auditoría
-                NotificationActionsService.log_action(
-                    notification_id, 
-                    'MARKED_RECEIVED', 
-                    'Usuario marcó notificación como recibida'
-                )
-                
-                logger.info(f"✅ Notificación {notification_id} marcada como recibida")
-                return {
-                    'success': True,
-                    'message': '✅ Notificación marcada como recibida correctamente',
-                    'type': 'success'
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': 'No se pudo actualizar la notificación',
-                    'type': 'error'
-                }
+            logger.info(f"✅ Notificación {notification_id} marcada como recibida")
+            return {
+                'success': True,
+                'message': '✅ Notificación marcada como recibida correctamente',
+                'type': 'success'
+            }
                 
         except Exception as e:
             logger.error(f"Error marcando notificación {notification_id} como recibida: {e}")
@@ -94,23 +171,22 @@ class NotificationActionsService:
         Marca una notificación como resuelta usando el token de seguridad.
         Permite múltiples destinatarios con el mismo token.
         Cuando una notificación se marca como resuelta, actualiza automáticamente todas las 
-        notificaciones PENDIENTES que tengan el mismo IdAlerta.
+        notificaciones PENDIENTES que tengan el mismo IdAlerta (en la misma transacción).
         """
         try:
             # Verificar token válido y no expirado
             # Permitir si está en estado 'enviado', 'recibido' o ya 'resuelto' (para múltiples destinatarios)
-            query_verify = """
-            SELECT IdNotificacion, Estado, FechaExpiracion, Asunto, IdAlerta
-            FROM Notificaciones 
-            WHERE IdNotificacion = ? 
-              AND TokenRespuesta = ? 
-              AND FechaExpiracion > GETDATE()
-              AND Estado IN ('enviado', 'recibido', 'resuelto', 'cancelado')
-            """
-            
-            result = db_config.execute_query(query_verify, [notification_id, token])
+            inicio = time.monotonic()
+            filtro = NotificationActionsService._filtro_token(notification_id, token, 'resolved')
+            resultado = filtro and NotificationActionsService._ejecutar_transicion(
+                notification_id, filtro,
+                estado='resuelto',
+                columna_fecha='FechaResuelto',
+                estados_validos=('enviado', 'recibido', 'resuelto', 'cancelado'),
+                cascadas=[('IdAlerta', '@por_alerta')]
+            )
             
-            if not result:
+            if not resultado:
                 logger.warning(f"Token inválido o expirado para notificación {notification_id}")
                 return {
                     'success': False, 
@@ -118,12 +194,8 @@ class NotificationActionsService:
                     'type': 'error'
                 }
             
-            notification_data = result[0]
-            current_state = notification_data['Estado']
-            id_alerta = notification_data['IdAlerta']
-            
-            # Si ya está marcado como resuelto, solo registrar la acción sin cambiar estado
-            if current_state == 'resuelto':
+            # Si ya está marcado como resuelto, solo informar sin cambiar estado
+            if resultado['EstadoAnterior'] == 'resuelto':
                 # Ya está marcado como resuelto por otro destinatario
                 logger.info(f"✅ Notificación {notification_id} ya estaba marcada como resuelta")
                 return {
@@ -132,73 +204,47 @@ class NotificationActionsService:
                     'type': 'success'
                 }
             
-            # Actualizar estado a "resuelto" solo si no estaba ya marcado
-            query_update = """
-            UPDATE Notificaciones 
-            SET Estado = 'resuelto', 
-                FechaResuelto = CASE WHEN FechaResuelto IS NULL THEN GETDATE() ELSE FechaResuelto END
-            WHERE IdNotificacion = ? AND TokenRespuesta = ? AND Estado IN ('enviado', 'recibido', 'cancelado')
-            """
-            
-            rows_affected = db_config.execute_non_query(query_update, [notification_id, token])
-            
-            # NUEVA LÓGICA: Actualizar todas las notificaciones PENDIENTES con el mismo IdAlerta
-            related_resolved = 0
-            if id_alerta is not None:
-                logger.info(f"🔄 Actualizando notificaciones PENDIENTES con IdAlerta: {id_alerta}")
+            id_alerta = resultado['IdAlerta']
+            related_resolved = resultado['PorAlerta']
+            if related_resolved > 0:
+                logger.info(f"✅ Se marcaron como resueltas {related_resolved} notificaciones PENDIENTES con IdAlerta: {id_alerta}")
                 
-                query_update_related = """
-                UPDATE Notificaciones 
-                SET Estado = 'resuelto', 
-                    FechaResuelto = GETDATE()
-                WHERE IdAlerta = ? 
-                  AND Estado = 'pendiente'
-                  AND IdNotificacion != ?
-                """
-                
-                related_resolved = db_config.execute_non_query(query_update_related, [id_alerta, notification_id])
-                
-                if related_resolved > 0:
-                    logger.info(f"✅ Se marcaron como resueltas {related_resolved} notificaciones PENDIENTES con IdAlerta: {id_alerta}")
-                    
-                    # Registrar en auditoría las actualizaciones relacionadas
-                    NotificationActionsService.log_action(
-                        notification_id, 
-                        'ALERTAS_PENDIENTES_RESUELTAS', 
-                        f'Se resolvieron {related_resolved} notificaciones pendientes con IdAlerta: {id_alerta}'
-                    )
-                else:
-                    logger.info(f"ℹ️ No se encontraron notificaciones pendientes para resolver con IdAlerta: {id_alerta}")
-            
-            if rows_affected >= 0:  # Cambio: >= 0 en lugar de > 0 para manejar casos donde ya estaba marcado
-                # Registrar en auditoría la acción principal
+                # Registrar en auditoría las actualizaciones relacionadas
                 NotificationActionsService.log_action(
                     notification_id, 
-                    'NOTIFICACION_RESUELTA',
-                    f"Notificación marcada como resuelta: {notification_data['Asunto']}"
+                    'ALERTAS_PENDIENTES_RESUELTAS', 
+                    f'Se resolvieron {related_resolved} notificaciones pendientes con IdAlerta: {id_alerta}',
+                    id_alerta=id_alerta,
+                    resultado='resuelto'
                 )
-                
-                # Preparar mensaje de respuesta
-                total_resolved = 1 + related_resolved
-                if related_resolved > 0:
-                    message = f'✅ Notificación marcada como resuelta correctamente. También se resolvieron {related_resolved} notificaciones pendientes.'
-                else:
-                    message = '✅ La notificación ha sido marcada como resuelta correctamente'
-                
-                logger.info(f"Notificación {notification_id} marcada como resuelta exitosamente (pendientes resueltas: {related_resolved})")
-                return {
-                    'success': True,
-                    'message': message,
-                    'type': 'success',
-                    'related_resolved': related_resolved,
-                    'total_resolved': total_resolved
-                }
+            elif id_alerta is not None:
+                logger.info(f"ℹ️ No se encontraron notificaciones pendientes para resolver con IdAlerta: {id_alerta}")
+            
+            # Registrar en auditoría la acción principal
+            NotificationActionsService.log_action(
+                notification_id, 
+                'NOTIFICACION_RESUELTA',
+                f"Notificación marcada como resuelta: {resultado['Asunto']}",
+                id_alerta=id_alerta,
+                resultado='resuelto',
+                duracion_ms=int((time.monotonic() - inicio) * 1000)
+            )
+            
+            # Preparar mensaje de respuesta
+            total_resolved = 1 + related_resolved
+            if related_resolved > 0:
+                message = f'✅ Notificación marcada como resuelta correctamente. También se resolvieron {related_resolved} notificaciones pendientes.'
             else:
-                return {
-                    'success': False,
-                    'message': 'No se pudo actualizar la notificación',
-                    'type': 'error'
-                }
+                message = '✅ La notificación ha sido marcada como resuelta correctamente'
+            
+            logger.info(f"Notificación {notification_id} marcada como resuelta exitosamente (pendientes resueltas: {related_resolved})")
+            return {
+                'success': True,
+                'message': message,
+                'type': 'success',
+                'related_resolved': related_resolved,
+                'total_resolved': total_resolved
+            }
                 
         except Exception as e:
             logger.error(f"Error marcando notificación {notification_id} como resuelta: {e}")
@@ -213,24 +259,23 @@ class NotificationActionsService:
         """
         Cancela una notificación usando el token de seguridad.
         Permite múltiples destinatarios con el mismo token.
-        Cuando una notificación se cancela, también cancela todas las notificaciones
-        con el mismo Source_IdNotificacion (lógica existente) o IdAlerta (nueva lógica).
+        Cuando una notificación se cancela, también cancela en la misma transacción todas las
+        notificaciones pendientes con el mismo Source_IdNotificacion o IdAlerta.
         """
         try:
             # Verificar token válido y no expirado
             # Permitir cancelación incluso si ya está cancelada (para múltiples destinatarios)
-            query_verify = """
-            SELECT IdNotificacion, Estado, FechaExpiracion, Asunto, Source_IdNotificacion, IdAlerta
-            FROM Notificaciones 
-            WHERE IdNotificacion = ? 
-              AND TokenRespuesta = ? 
-              AND FechaExpiracion > GETDATE()
-              AND Estado IN ('enviado', 'recibido', 'cancelado', 'resuelto')
-            """
+            inicio = time.monotonic()
+            filtro = NotificationActionsService._filtro_token(notification_id, token, 'cancel')
+            resultado = filtro and NotificationActionsService._ejecutar_transicion(
+                notification_id, filtro,
+                estado='cancelado',
+                columna_fecha='FechaCancelacion',
+                estados_validos=('enviado', 'recibido', 'cancelado', 'resuelto'),
+                cascadas=[('Source_IdNotificacion', '@por_source'), ('IdAlerta', '@por_alerta')]
+            )
             
-            result = db_config.execute_query(query_verify, [notification_id, token])
-            
-            if not result:
+            if not resultado:
                 logger.warning(f"Token inválido o expirado para notificación {notification_id}")
                 return {
                     'success': False, 
@@ -238,13 +283,8 @@ class NotificationActionsService:
                     'type': 'error'
                 }
             
-            notification_data = result[0]
-            current_state = notification_data['Estado']
-            source_id = notification_data['Source_IdNotificacion']
-            id_alerta = notification_data['IdAlerta']
-            
-            # Si ya está cancelada, solo registrar la acción sin cambiar estado
-            if current_state == 'cancelado':
+            # Si ya está cancelada, solo informar sin cambiar estado
+            if resultado['EstadoAnterior'] == 'cancelado':
                 logger.info(f"✅ Notificación {notification_id} ya estaba cancelada")
                 return {
                     'success': True,
@@ -252,93 +292,48 @@ class NotificationActionsService:
                     'type': 'success'
                 }
             
-            # Cancelar la notificación principal solo si no estaba cancelada
-            query_update_main = """
-            UPDATE Notificaciones 
-            SET Estado = 'cancelado', 
-                FechaCancelacion = CASE WHEN FechaCancelacion IS NULL THEN GETDATE() ELSE FechaCancelacion END
-            WHERE IdNotificacion = ? AND TokenRespuesta = ? AND Estado IN ('enviado', 'recibido', 'resuelto')
-            """
-            
-            rows_affected = db_config.execute_non_query(query_update_main, [notification_id, token])
-            
-            related_cancelled = 0
-            
-            if rows_affected >= 0:  # Cambio: >= 0 en lugar de > 0 para manejar casos donde ya estaba marcado
+            source_id = resultado['Source_IdNotificacion']
+            id_alerta = resultado['IdAlerta']
+            if resultado['PorSource'] > 0:
+                logger.info(f"✅ Se cancelaron {resultado['PorSource']} notificaciones relacionadas por Source_IdNotificacion: {source_id}")
+            if resultado['PorAlerta'] > 0:
+                logger.info(f"✅ Se cancelaron {resultado['PorAlerta']} notificaciones PENDIENTES con IdAlerta: {id_alerta}")
                 
-                # LÓGICA EXISTENTE: Cancelar por Source_IdNotificacion (solo pendientes)
-                if source_id is not None:
-                    query_update_related = """
-                    UPDATE Notificaciones 
-                    SET Estado = 'cancelado', 
-                        FechaCancelacion = GETDATE()
-                    WHERE Source_IdNotificacion = ? 
-                      AND Estado = 'pendiente'
-                      AND IdNotificacion != ?
-                    """
-                    
-                    source_cancelled = db_config.execute_non_query(query_update_related, [source_id, notification_id])
-                    related_cancelled += source_cancelled
-                    
-                    if source_cancelled > 0:
-                        logger.info(f"✅ Se cancelaron {source_cancelled} notificaciones relacionadas por Source_IdNotificacion: {source_id}")
-                
-                # NUEVA LÓGICA: Cancelar todas las notificaciones PENDIENTES con el mismo IdAlerta
-                if id_alerta is not None:
-                    logger.info(f"🔄 Cancelando notificaciones PENDIENTES con IdAlerta: {id_alerta}")
-                    
-                    query_cancel_by_alerta = """
-                    UPDATE Notificaciones 
-                    SET Estado = 'cancelado', 
-                        FechaCancelacion = GETDATE()
-                    WHERE IdAlerta = ? 
-                      AND Estado = 'pendiente'
-                      AND IdNotificacion != ?
-                    """
-                    
-                    alerta_cancelled = db_config.execute_non_query(query_cancel_by_alerta, [id_alerta, notification_id])
-                    related_cancelled += alerta_cancelled
-                    
-                    if alerta_cancelled > 0:
-                        logger.info(f"✅ Se cancelaron {alerta_cancelled} notificaciones PENDIENTES con IdAlerta: {id_alerta}")
-                        
-                        # Registrar en auditoría las cancelaciones por IdAlerta
-                        NotificationActionsService.log_action(
-                            notification_id, 
-                            'ALERTAS_PENDIENTES_CANCELADAS', 
-                            f'Se cancelaron {alerta_cancelled} notificaciones pendientes con IdAlerta: {id_alerta}'
-                        )
-                    else:
-                        logger.info(f"ℹ️ No se encontraron notificaciones pendientes para cancelar con IdAlerta: {id_alerta}")
-                
-                # Registrar en auditoría la cancelación principal
+                # Registrar en auditoría las cancelaciones por IdAlerta
                 NotificationActionsService.log_action(
                     notification_id, 
-                    'NOTIFICATION_CANCELLED', 
-                    f'Usuario canceló la notificación. Source_IdNotificacion: {source_id}, IdAlerta: {id_alerta}'
+                    'ALERTAS_PENDIENTES_CANCELADAS', 
+                    f"Se cancelaron {resultado['PorAlerta']} notificaciones pendientes con IdAlerta: {id_alerta}",
+                    id_alerta=id_alerta,
+                    resultado='cancelado'
                 )
-                
-                # Preparar mensaje de respuesta
-                total_cancelled = 1 + related_cancelled
-                if related_cancelled > 0:
-                    message = f'❌ Notificación cancelada correctamente. También se cancelaron {related_cancelled} notificaciones/alertas relacionadas'
-                else:
-                    message = '❌ Notificación cancelada correctamente'
-                
-                logger.info(f"Notificación {notification_id} cancelada (relacionadas: {related_cancelled})")
-                return {
-                    'success': True,
-                    'message': message,
-                    'type': 'success',
-                    'related_cancelled': related_cancelled,
-                    'total_cancelled': total_cancelled
-                }
+            
+            # Registrar en auditoría la cancelación principal
+            NotificationActionsService.log_action(
+                notification_id, 
+                'NOTIFICATION_CANCELLED', 
+                f'Usuario canceló la notificación. Source_IdNotificacion: {source_id}, IdAlerta: {id_alerta}',
+                id_alerta=id_alerta,
+                resultado='cancelado',
+                duracion_ms=int((time.monotonic() - inicio) * 1000)
+            )
+            
+            # Preparar mensaje de respuesta
+            related_cancelled = resultado['PorSource'] + resultado['PorAlerta']
+            total_cancelled = 1 + related_cancelled
+            if related_cancelled > 0:
+                message = f'❌ Notificación cancelada correctamente. También se cancelaron {related_cancelled} notificaciones/alertas relacionadas'
             else:
-                return {
-                    'success': False,
-                    'message': 'No se pudo cancelar la notificación',
-                    'type': 'error'
-                }
+                message = '❌ Notificación cancelada correctamente'
+            
+            logger.info(f"Notificación {notification_id} cancelada (relacionadas: {related_cancelled})")
+            return {
+                'success': True,
+                'message': message,
+                'type': 'success',
+                'related_cancelled': related_cancelled,
+                'total_cancelled': total_cancelled
+            }
                 
         except Exception as e:
             logger.error(f"Error cancelando notificación {notification_id}: {e}")
@@ -351,7 +346,7 @@ class NotificationActionsService:
     @staticmethod
     def get_notification_status(notification_id):
         """
-        Obtiene el estado actual de una notificación
+        Obtiene el estado actual de una notificación (si no está en Notificaciones la busca en el archivo)
         """
         try:
             query = """
@@ -360,8 +355,18 @@ class NotificationActionsService:
             FROM Notificaciones 
             WHERE IdNotificacion = ?
             """
+            params = [notification_id]
+            if NotificationActionsService._existe_archivo('Notificaciones_Archivo'):
+                query += """
+            UNION ALL
+            SELECT IdNotificacion, Estado, FechaRecibido, FechaCancelacion, 
+                   FechaExpiracion, FechaResuelto, Asunto, Destinatario
+            FROM Notificaciones_Archivo 
+            WHERE IdNotificacion = ?
+            """
+                params.append(notification_id)
             
-            result = db_config.execute_query(query, [notification_id])
+            result = db_config.execute_query(query, params)
             
             if result:
                 return result[0]
@@ -369,30 +374,54 @@ class NotificationActionsService:
                 return None
                 
         except Exception as e:
+            # La tabla de archivo pudo eliminarse: se vuelve a verificar
+            NotificationActionsService._tablas_archivo.pop('Notificaciones_Archivo', None)
             logger.error(f"Error obteniendo estado de notificación {notification_id}: {e}")
             return None
     
     @staticmethod
-    def log_action(notification_id, action, description):
+    def log_action(notification_id, action, description, id_alerta=None, resultado=None, duracion_ms=None):
+        """
+        Registra la acción en la tabla de auditoría (en segundo plano, sin demorar la respuesta)
+        """
+        auditoria.registrar(
+            action, description, usuario='user_action',
+            id_notificacion=notification_id,
+            id_alerta=id_alerta,
+            medio='Email',
+            duracion_ms=duracion_ms,
+            resultado=resultado
+        )
+    
+    @staticmethod
+    def get_audit_history(notification_id):
         """
-        Registra la acción en la tabla de auditoría
+        Historial de auditoría de una notificación (búsqueda por índice en Auditoria.IdNotificacion
+        y en Auditoria_Archivo si existe)
         """
         try:
             query = """
-            INSERT INTO Auditoria (accion, detalle, fecha_aud, [user])
-            VALUES (?, ?, GETDATE(), 'user_action')
+            SELECT fecha_aud, accion, Resultado, Medio, DuracionMs, IdAlerta, detalle, [user]
+            FROM Auditoria
+            WHERE IdNotificacion = ?
             """
+            params = [notification_id]
+            if NotificationActionsService._existe_archivo('Auditoria_Archivo'):
+                query += """
+            UNION ALL
+            SELECT fecha_aud, accion, Resultado, Medio, DuracionMs, IdAlerta, detalle, [user]
+            FROM Auditoria_Archivo
+            WHERE IdNotificacion = ?
+            """
+                params.append(notification_id)
             
-            detail = f"ID_{notification_id}: {description}"
-            db_config.execute_non_query(query, [action, detail])
+            return db_config.execute_query(query + " ORDER BY fecha_aud", params)
             
         except Exception as e:
-            logger.error(f"Error registrando acción en auditoría: {e}")
+            NotificationActionsService._tablas_archivo.pop('Auditoria_Archivo', None)
+            logger.error(f"Error obteniendo historial de notificación {notification_id}: {e}")
+            return []
     
-
-
-
-
     @staticmethod
     def get_statistics():
         """
@@ -407,7 +436,7 @@ class NotificationActionsService:
                 COUNT(CASE WHEN FechaResuelto IS NOT NULL THEN 1 END) as resolved_count,
                 COUNT(CASE WHEN FechaCancelacion IS NOT NULL THEN 1 END) as cancelled_count
             FROM Notificaciones 
-            WHERE TokenRespuesta IS NOT NULL
+            WHERE (Medio = 'Email' OR Medio IS NULL) AND Fecha_Envio IS NOT NULL
             GROUP BY Estado
             """
             
@@ -0,0 +1,167 @@
+from app.utils.database_config import db_config
+from app.utils.tokens_accion import firmador_tokens
+import os
+import time
+import threading
+import logging
+from datetime import timedelta
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# Filas (Fecha, IdTipoNotificacion, Estado, Medio, Cantidad) entre @desde (DATE) y @hasta (DATETIME):
+# los días consolidados salen de Notificaciones_ResumenDiario y el resto (el día en curso y los
+# cerrados que el procesador todavía no consolidó) se agrupa en vivo desde Notificaciones.
+# Quien la usa declara @desde y @hasta antes del WITH.
+FUENTE_RESUMEN = """
+WITH Consolidado AS (
+    SELECT DATEADD(DAY, 1, MAX(Fecha)) AS Hasta FROM Notificaciones_ResumenDiario
+),
+Resumen AS (
+    SELECT r.Fecha, r.IdTipoNotificacion, r.Estado, r.Medio, r.Cantidad
+    FROM Notificaciones_ResumenDiario r
+    WHERE r.Fecha >= @desde AND r.Fecha <= @hasta
+    UNION ALL
+    SELECT CAST(n.Fecha_Envio AS DATE), n.IdTipoNotificacion, n.Estado, COALESCE(n.Medio, 'Email'), COUNT(*)
+    FROM Notificaciones n
+    CROSS JOIN Consolidado c
+    WHERE n.Fecha_Envio >= COALESCE(c.Hasta, @desde)
+      AND n.Fecha_Envio >= @desde
+      AND n.Fecha_Envio <= @hasta
+    GROUP BY CAST(n.Fecha_Envio AS DATE), n.IdTipoNotificacion, n.Estado, COALESCE(n.Medio, 'Email')
+)
+"""
+
+class ResumenDiario:
+    """
+    Mantiene Notificaciones_ResumenDiario (migrations/add_resumen_diario.sql): cantidad de
+    notificaciones por día de envío, tipo, estado y medio, para que el dashboard lea
+    O(días × tipos) filas en lugar de agrupar Notificaciones en cada consulta.
+    Solo se guardan días cerrados. Cada actualización recalcula los días que faltan y los últimos
+    RESUMEN_DIAS_RECALCULO (los botones de acción todavía cambian el estado de esas notificaciones).
+    El procesador la actualiza en un hilo propio (iniciar) cada RESUMEN_INTERVALO_SEGUNDOS, así la
+    primera consolidación de todo el historial no demora los envíos.
+    """
+
+    def __init__(self, dias_recalculo=None, intervalo_segundos=None, dias_lote=None):
+        self.dias_recalculo = int(dias_recalculo or os.getenv('RESUMEN_DIAS_RECALCULO', 8))
+        self.intervalo = int(intervalo_segundos or os.getenv('RESUMEN_INTERVALO_SEGUNDOS', 900))
+        self.dias_lote = int(dias_lote or os.getenv('RESUMEN_DIAS_LOTE', 31))
+        self._ultima = None  # time.monotonic() de la última actualización
+        self._fuente = None
+        self._fin = threading.Event()
+        self._hilo = None
+
+        # Los días con enlaces de acción vigentes pueden cambiar de estado: se recalculan siempre
+        dias_enlaces = -(-firmador_tokens.ttl_segundos // 86400) if firmador_tokens.habilitado else 7
+        if self.dias_recalculo <= dias_enlaces:
+            logger.warning(f"⚠️ RESUMEN_DIAS_RECALCULO ({self.dias_recalculo}) no supera la vigencia "
+                           f"de los enlaces ({dias_enlaces} días), se usa {dias_enlaces + 1}")
+            self.dias_recalculo = dias_enlaces + 1
+
+    def _origen(self):
+        """Notificaciones más su archivo si existe (la primera consolidación puede abarcar días ya archivados)"""
+        if self._fuente is None:
+            fila = db_config.execute_query("SELECT OBJECT_ID('Notificaciones_Archivo') AS Archivo")
+            if fila and fila[0]['Archivo'] is not None:
+                self._fuente = """(
+                    SELECT Fecha_Envio, IdTipoNotificacion, Estado, Medio FROM Notificaciones
+                    UNION ALL
+                    SELECT Fecha_Envio, IdTipoNotificacion, Estado, Medio FROM Notificaciones_Archivo
+                )"""
+            else:
+                self._fuente = "Notificaciones"
+        return self._fuente
+
+    def _consolidar(self, desde, hasta):
+        """Reemplaza en una transacción los días [desde, hasta) y retorna las filas escritas"""
+        query = f"""
+        SET NOCOUNT ON;
+        SET XACT_ABORT ON;
+
+        DECLARE @desde DATE = ?;
+        DECLARE @hasta DATE = ?;
+        DECLARE @filas INT;
+
+        BEGIN TRANSACTION;
+
+        DELETE FROM Notificaciones_ResumenDiario
+        WHERE Fecha >= @desde AND Fecha < @hasta;
+
+        INSERT INTO Notificaciones_ResumenDiario (Fecha, IdTipoNotificacion, Estado, Medio, Cantidad)
+        SELECT CAST(n.Fecha_Envio AS DATE), n.IdTipoNotificacion, n.Estado, COALESCE(n.Medio, 'Email'), COUNT(*)
+        FROM {self._origen()} n
+        WHERE n.Fecha_Envio >= @desde AND n.Fecha_Envio < @hasta
+        GROUP BY CAST(n.Fecha_Envio AS DATE), n.IdTipoNotificacion, n.Estado, COALESCE(n.Medio, 'Email');
+        SET @filas = @@ROWCOUNT;
+
+        COMMIT TRANSACTION;
+
+        SELECT @filas AS Filas;
+        """
+        return db_config.execute_query(query, [desde, hasta])[0]['Filas']
+
+    def actualizar(self):
+        """Consolida los días cerrados pendientes y los de la ventana de recálculo; retorna los días procesados"""
+        inicio = time.monotonic()
+        fila = db_config.execute_query("""
+        SELECT CAST(GETDATE() AS DATE) AS Hoy, MAX(Fecha) AS Ultimo
+        FROM Notificaciones_ResumenDiario
+        """)[0]
+        hoy, ultimo = fila['Hoy'], fila['Ultimo']
+
+        if ultimo is None:
+            # Primera ejecución: todo el historial, de a RESUMEN_DIAS_LOTE días por transacción
+            primero = db_config.execute_query(
+                f"SELECT CAST(MIN(Fecha_Envio) AS DATE) AS Primero FROM {self._origen()} n"
+            )[0]['Primero']
+            if primero is None:
+                self._ultima = time.monotonic()
+                return 0
+            desde = primero
+        else:
+            desde = min(ultimo + timedelta(days=1), hoy - timedelta(days=self.dias_recalculo))
+
+        dias = filas = 0
+        while desde < hoy and not self._fin.is_set():
+            hasta = min(desde + timedelta(days=self.dias_lote), hoy)
+            filas += self._consolidar(desde, hasta)
+            dias += (hasta - desde).days
+            desde = hasta
+
+        self._ultima = time.monotonic()
+        logger.info(f"📊 Resumen diario actualizado: {dias} días, {filas} filas "
+                    f"en {self._ultima - inicio:.1f} s")
+        return dias
+
+    def actualizar_si_corresponde(self):
+        """Llama a actualizar() si pasaron RESUMEN_INTERVALO_SEGUNDOS desde la última vez"""
+        if self._ultima is not None and time.monotonic() - self._ultima < self.intervalo:
+            return 0
+        try:
+            return self.actualizar()
+        except Exception as e:
+            # Se reintenta en la próxima llamada; mientras tanto el dashboard agrupa en vivo lo que falte.
+            # La tabla de archivo pudo crearse o eliminarse: se vuelve a verificar
+            self._ultima = time.monotonic()
+            self._fuente = None
+            logger.error(f"Error actualizando el resumen diario: {e}")
+            return 0
+
+    def iniciar(self):
+        """Actualiza el resumen en un hilo en segundo plano cada RESUMEN_INTERVALO_SEGUNDOS"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name='resumen-diario', daemon=True)
+            self._hilo.start()
+
+    def _ciclo(self):
+        while not self._fin.is_set():
+            self.actualizar_si_corresponde()
+            self._fin.wait(self.intervalo)
+
+    def detener(self, timeout=5):
+        """Detiene el hilo (una consolidación en curso termina su transacción)"""
+        self._fin.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
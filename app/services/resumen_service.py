@@ -0,0 +1,56 @@
+from app.utils.database_config import db_config
+import os
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+class DestinatariosResumen:
+    """
+    Cache en memoria de los destinatarios que eligieron recibir un resumen (digest) por lote
+    en lugar de un email por notificación (tabla ResumenDestinatarios).
+    Se recarga al vencer el TTL; si la base no responde se sigue usando la última versión.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = float(ttl if ttl is not None else os.getenv('RESUMEN_CACHE_TTL', 300))
+        self._emails = None
+        self._cargado = 0.0
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        query = """
+        SELECT EmailDestinatario
+        FROM ResumenDestinatarios
+        WHERE Activo = 1
+        """
+        self._emails = {fila['EmailDestinatario'].strip().lower() for fila in db_config.execute_query(query)}
+        self._cargado = time.monotonic()
+
+    def _asegurar_vigente(self):
+        with self._lock:
+            if self._emails is None or time.monotonic() - self._cargado > self.ttl:
+                try:
+                    self._cargar()
+                except Exception as e:
+                    logger.error(f"Error cargando destinatarios con modo resumen: {e}")
+                    if self._emails is None:
+                        # Sin datos: nadie recibe resumen por destinatario hasta el próximo intento
+                        self._emails = set()
+                        self._cargado = time.monotonic()
+            return self._emails
+
+    def contiene(self, email):
+        """True si el destinatario eligió recibir resúmenes"""
+        return bool(email) and email.strip().lower() in self._asegurar_vigente()
+
+    def invalidar(self):
+        """Fuerza la recarga en el próximo acceso"""
+        with self._lock:
+            self._emails = None
+
+# Instancia global para usar en todo el proyecto
+destinatarios_resumen = DestinatariosResumen()
@@ -0,0 +1,101 @@
+from app.utils.database_config import db_config
+import os
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+class CatalogoTiposNotificacion:
+    """
+    Cache en memoria de Notificaciones_Tipo compartida por el procesador y el dashboard.
+    Se carga una vez; al vencer el TTL se hace una verificación barata de cambios
+    (checksum de la tabla) y solo se recarga si algo cambió. invalidar() fuerza la recarga.
+    Si se pide un tipo que no está (por ejemplo, recién creado) se recarga enseguida, como
+    máximo una vez cada TIPOS_RECARGA_MIN_SEGUNDOS.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = float(ttl if ttl is not None else os.getenv('TIPOS_CACHE_TTL', 300))
+        self._tipos = None
+        self._firma = None
+        self._verificado = 0.0
+        self.recarga_minima = float(os.getenv('TIPOS_RECARGA_MIN_SEGUNDOS', 30))
+        self._ultima_recarga_faltante = None
+        self._lock = threading.Lock()
+
+    def _leer_firma(self):
+        query = """
+        SELECT COUNT(*) AS Cantidad, CHECKSUM_AGG(BINARY_CHECKSUM(*)) AS Firma
+        FROM Notificaciones_Tipo
+        """
+        fila = db_config.execute_query(query)[0]
+        return (fila['Cantidad'], fila['Firma'])
+
+    def _cargar(self):
+        query = """
+        SELECT IdTipoNotificacion, descripcion, destinatarios, asunto, cuerpo, ModoResumen
+        FROM Notificaciones_Tipo
+        """
+        firma = self._leer_firma()
+        tipos = {t['IdTipoNotificacion']: t for t in db_config.execute_query(query)}
+        self._tipos = tipos
+        self._firma = firma
+        self._verificado = time.monotonic()
+        logger.info(f"📚 Catálogo de tipos de notificación cargado ({len(tipos)} tipos)")
+
+    def _asegurar_vigente(self):
+        with self._lock:
+            try:
+                if self._tipos is None:
+                    self._cargar()
+                elif time.monotonic() - self._verificado > self.ttl:
+                    if self._leer_firma() != self._firma:
+                        self._cargar()
+                    else:
+                        self._verificado = time.monotonic()
+            except Exception as e:
+                # Si la base no responde se sigue usando la última versión conocida
+                logger.error(f"Error actualizando catálogo de tipos de notificación: {e}")
+                if self._tipos is None:
+                    raise
+            return self._tipos
+
+    def obtener(self, id_tipo):
+        """Retorna el tipo (dict) o None si no existe"""
+        if id_tipo is None:
+            return None
+        tipo = self._asegurar_vigente().get(id_tipo)
+        if tipo is None and self._recargar_por_faltante():
+            tipo = self._tipos.get(id_tipo)
+        return tipo
+    
+    def _recargar_por_faltante(self):
+        """Recarga el catálogo por un tipo que no está; retorna False si se recargó hace poco"""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._ultima_recarga_faltante is not None and ahora - self._ultima_recarga_faltante < self.recarga_minima:
+                return False
+            self._ultima_recarga_faltante = ahora
+            try:
+                self._cargar()
+            except Exception as e:
+                logger.error(f"Error recargando catálogo de tipos de notificación: {e}")
+                return False
+            return True
+
+    def listar(self):
+        """Retorna todos los tipos ordenados por descripción"""
+        tipos = self._asegurar_vigente().values()
+        return sorted(tipos, key=lambda t: (t['descripcion'] or ''))
+
+    def invalidar(self):
+        """Fuerza la recarga en el próximo acceso (por ejemplo, después de editar un tipo)"""
+        with self._lock:
+            self._tipos = None
+            self._firma = None
+
+# Instancia global para usar en todo el proyecto
+catalogo_tipos = CatalogoTiposNotificacion()
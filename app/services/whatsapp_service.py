@@ -1,49 +1,334 @@
 import os
+import json
+import time
 import logging
-import sys
+import threading
+import http.client
+from abc import ABC, abstractmethod
+from collections import deque
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
-# Solución al conflicto de nombres con carpeta 'app'
-# Guardar y remover temporalmente 'app' del sys.modules
-_app_backup = sys.modules.pop('app', None)
-_app_services_backup = sys.modules.pop('app.services', None)
-_app_utils_backup = sys.modules.pop('app.utils', None)
-
-try:
-    import pywhatkit
-    PYWHATKIT_DISPONIBLE = True
-except Exception as e:
-    pywhatkit = None
-    PYWHATKIT_DISPONIBLE = False
-    print(f"Error importando pywhatkit: {e}")
-
-# Restaurar módulos 'app' originales
-if _app_backup:
-    sys.modules['app'] = _app_backup
-if _app_services_backup:
-    sys.modules['app.services'] = _app_services_backup
-if _app_utils_backup:
-    sys.modules['app.utils'] = _app_utils_backup
-
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# pywhatkit arrastra el stack de navegador/GUI: se importa recién en el primer uso
+_pywhatkit = None
+_pywhatkit_error = None
+_pywhatkit_lock = threading.Lock()
+
+
+def cargar_pywhatkit():
+    """
+    Importa pywhatkit la primera vez que se necesita y retorna el módulo,
+    o None si no está instalado o falla su importación (el error se recuerda).
+    """
+    global _pywhatkit, _pywhatkit_error
+    with _pywhatkit_lock:
+        if _pywhatkit is None and _pywhatkit_error is None:
+            inicio = time.perf_counter()
+            try:
+                import pywhatkit
+                _pywhatkit = pywhatkit
+                logger.info(f"pywhatkit cargado en {time.perf_counter() - inicio:.2f}s")
+            except Exception as e:
+                _pywhatkit_error = e
+                logger.error(f"Error importando pywhatkit: {e}")
+        return _pywhatkit
+
+
+class ErrorWhatsApp(Exception):
+    """
+    Falla de envío de un WhatsApp, clasificada para la política de reintentos como ErrorSMTP:
+    tipo es el status del gateway ('HTTP400') o la clase de la excepción original ('TimeoutError'...);
+    permanente indica que reintentar no va a servir (4xx salvo 408 y 429: número, token o mensaje rechazados).
+    """
+
+    def __init__(self, mensaje, tipo, permanente=False):
+        super().__init__(mensaje)
+        self.tipo = tipo
+        self.permanente = permanente
+
+    @classmethod
+    def desde_status(cls, status, detalle):
+        permanente = 400 <= status < 500 and status not in (408, 429)
+        return cls(f"Gateway respondió HTTP {status}: {detalle}", f"HTTP{status}", permanente)
+
+    @classmethod
+    def desde_excepcion(cls, error):
+        if isinstance(error, cls):
+            return error
+        return cls(str(error), type(error).__name__, False)
+
+
+class ProveedorWhatsApp(ABC):
+    """
+    Interfaz de los backends de envío de WhatsApp.
+    enviar() recibe un número ya validado y el texto del mensaje, y lanza una excepción si falla.
+    Un backend que no implementa enviar() falla al crearse, no en el primer envío.
+    """
+    nombre = None
+    # Envíos simultáneos que admite el backend
+    max_concurrencia = 1
+
+    @property
+    def disponible(self):
+        return True
+
+    @abstractmethod
+    def enviar(self, numero, mensaje):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+class ProveedorPywhatkit(ProveedorWhatsApp):
+    """
+    Envío mediante WhatsApp Web con pywhatkit (abre una pestaña del navegador por mensaje).
+    Se mantiene por compatibilidad: alrededor de un mensaje por minuto y sin concurrencia.
+    """
+    nombre = 'pywhatkit'
+    max_concurrencia = 1
+
+    def __init__(self, wait_time=None, close_time=None):
+        self.wait_time = int(wait_time or os.getenv("WHATSAPP_WAIT_TIME", 50))  # Tiempo de espera antes de escribir
+        self.close_time = int(close_time or os.getenv("WHATSAPP_CLOSE_TIME", 10))  # Tiempo antes de cerrar pestaña
+
+    @property
+    def disponible(self):
+        return cargar_pywhatkit() is not None
+
+    def enviar(self, numero, mensaje):
+        pywhatkit = cargar_pywhatkit()
+        if pywhatkit is None:
+            raise RuntimeError(f"pywhatkit no está disponible: {_pywhatkit_error}")
+
+        logger.info(f"⏱️ Tiempos: wait={self.wait_time}s, close={self.close_time}s")
+
+        # wait_time: tiempo para que cargue WhatsApp Web antes de escribir
+        # close_time: tiempo antes de cerrar pestaña (para que se envíe el mensaje)
+        pywhatkit.sendwhatmsg_instantly(
+            phone_no=numero,
+            message=mensaje,
+            wait_time=self.wait_time,
+            tab_close=True,
+            close_time=self.close_time
+        )
+
+
+class HTTPSessionPool:
+    """
+    Pool de conexiones HTTP(S) keep-alive hacia un mismo servidor.
+    El tamaño del pool es también el límite de peticiones simultáneas; quien espera una conexión
+    libre más de espera_maxima segundos recibe un ErrorWhatsApp transitorio.
+    """
+
+    def __init__(self, url, max_size=8, idle_timeout=60, timeout=30, espera_maxima=60):
+        partes = urlsplit(url)
+        if partes.scheme not in ('http', 'https') or not partes.hostname:
+            raise ValueError(f"URL inválida para el gateway de WhatsApp: {url}")
+        self.https = partes.scheme == 'https'
+        self.host = partes.hostname
+        self.port = partes.port
+        self.path = partes.path or '/'
+        if partes.query:
+            self.path += '?' + partes.query
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.espera_maxima = espera_maxima
+
+        # Conexiones libres como dict {'conn', 'peticiones', 'ultimo_uso'}
+        self._idle = deque()
+        self._total = 0
+        self._cond = threading.Condition(threading.Lock())
+
+    def _conectar(self):
+        clase = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = clase(self.host, self.port, timeout=self.timeout)
+        return {'conn': conn, 'peticiones': 0, 'ultimo_uso': time.monotonic()}
+
+    @staticmethod
+    def _cerrar_conn(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _adquirir(self):
+        limite = time.monotonic() + self.espera_maxima
+        with self._cond:
+            while True:
+                if self._idle:
+                    sesion = self._idle.pop()
+                    break
+                if self._total < self.max_size:
+                    self._total += 1
+                    sesion = None
+                    break
+                # Un gateway colgado retiene todas las conexiones: no esperar indefinidamente
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise ErrorWhatsApp(f"Sin conexión libre al gateway después de {self.espera_maxima}s",
+                                        'EsperaConexionHTTP')
+                self._cond.wait(restante)
+
+        if sesion is not None and time.monotonic() - sesion['ultimo_uso'] > self.idle_timeout:
+            self._cerrar_conn(sesion['conn'])
+            sesion = None
+
+        if sesion is None:
+            sesion = self._conectar()
+        return sesion
+
+    def _liberar(self, sesion, descartar=False):
+        if descartar:
+            self._cerrar_conn(sesion['conn'])
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+
+        sesion['ultimo_uso'] = time.monotonic()
+        with self._cond:
+            self._idle.append(sesion)
+            self._cond.notify()
+
+    def post_json(self, datos, headers=None):
+        """
+        Envía datos como JSON por POST y retorna (status, cuerpo_respuesta_bytes).
+        Si una conexión reutilizada fue cerrada por el servidor, reintenta una vez con una nueva.
+        """
+        cuerpo = json.dumps(datos).encode('utf-8')
+        encabezados = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        encabezados.update(headers or {})
+
+        for intento in range(2):
+            sesion = self._adquirir()
+            reutilizada = sesion['peticiones'] > 0
+            try:
+                sesion['conn'].request('POST', self.path, body=cuerpo, headers=encabezados)
+                respuesta = sesion['conn'].getresponse()
+                contenido = respuesta.read()
+                sesion['peticiones'] += 1
+                self._liberar(sesion, descartar=respuesta.will_close)
+                return respuesta.status, contenido
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._liberar(sesion, descartar=True)
+                if intento == 1 or not reutilizada:
+                    raise
+                logger.debug("Conexión HTTP del gateway cerrada por el servidor, reintentando...")
+            except Exception:
+                self._liberar(sesion, descartar=True)
+                raise
+
+    def cerrar_todas(self):
+        """Cierra las conexiones ociosas del pool"""
+        with self._cond:
+            sesiones = list(self._idle)
+            self._idle.clear()
+            self._total -= len(sesiones)
+            self._cond.notify_all()
+        for sesion in sesiones:
+            self._cerrar_conn(sesion['conn'])
+
+
+class ProveedorHTTPGateway(ProveedorWhatsApp):
+    """
+    Envío por un gateway HTTP con formato de WhatsApp Cloud API
+    (POST JSON a WHATSAPP_API_URL con token Bearer), reutilizando conexiones keep-alive.
+    Admite varios envíos simultáneos, limitados por WHATSAPP_MAX_CONCURRENCIA.
+    """
+    nombre = 'http'
+
+    def __init__(self, url=None, token=None, max_concurrencia=None, timeout=None):
+        self.url = url or os.getenv("WHATSAPP_API_URL")
+        self.token = token or os.getenv("WHATSAPP_API_TOKEN")
+        self.max_concurrencia = max(int(max_concurrencia or os.getenv("WHATSAPP_MAX_CONCURRENCIA", 8)), 1)
+        self.session_pool = None
+
+        if self.url:
+            self.session_pool = HTTPSessionPool(
+                self.url,
+                max_size=self.max_concurrencia,
+                idle_timeout=int(os.getenv("WHATSAPP_API_IDLE_TIMEOUT", 60)),
+                timeout=float(timeout or os.getenv("WHATSAPP_API_TIMEOUT", 30)),
+                espera_maxima=float(os.getenv("WHATSAPP_API_ESPERA_MAXIMA", 60)),
+            )
+        else:
+            logger.error("❌ WHATSAPP_API_URL no configurada - gateway de WhatsApp deshabilitado")
+
+    @property
+    def disponible(self):
+        return self.session_pool is not None
+
+    def enviar(self, numero, mensaje):
+        if not self.disponible:
+            raise RuntimeError("Gateway HTTP de WhatsApp no configurado")
+
+        datos = {
+            'messaging_product': 'whatsapp',
+            'to': numero.lstrip('+').replace(' ', '').replace('-', ''),
+            'type': 'text',
+            'text': {'body': mensaje},
+        }
+        headers = {'Authorization': f"Bearer {self.token}"} if self.token else {}
+
+        status, contenido = self.session_pool.post_json(datos, headers)
+        if not 200 <= status < 300:
+            detalle = contenido.decode('utf-8', errors='replace')[:300]
+            raise ErrorWhatsApp.desde_status(status, detalle)
+
+        try:
+            respuesta = json.loads(contenido or b'{}')
+            return (respuesta.get('messages') or [{}])[0].get('id')
+        except (ValueError, AttributeError):
+            return None
+
+    def cerrar(self):
+        if self.session_pool is not None:
+            self.session_pool.cerrar_todas()
+
+
+PROVEEDORES_WHATSAPP = {
+    ProveedorPywhatkit.nombre: ProveedorPywhatkit,
+    ProveedorHTTPGateway.nombre: ProveedorHTTPGateway,
+}
+
+
+def crear_proveedor_whatsapp(nombre=None):
+    """
+    Crea el backend de envío configurado en WHATSAPP_PROVIDER (pywhatkit por defecto)
+    """
+    nombre = (nombre or os.getenv("WHATSAPP_PROVIDER", ProveedorPywhatkit.nombre)).strip().lower()
+    clase = PROVEEDORES_WHATSAPP.get(nombre)
+    if clase is None:
+        raise ValueError(f"Proveedor de WhatsApp desconocido: {nombre} "
+                         f"(opciones: {', '.join(PROVEEDORES_WHATSAPP)})")
+    return clase()
+
+
 class WhatsAppService:
     """
-    Servicio para enviar notificaciones por WhatsApp usando pywhatkit.
+    Servicio para enviar notificaciones por WhatsApp.
+    El envío lo hace un proveedor intercambiable (pywhatkit o gateway HTTP) elegido por configuración.
     LIMITACIONES: Solo envía mensajes de texto, sin botones interactivos.
     """
     
-    def __init__(self):
+    def __init__(self, proveedor=None):
         self.numero_default = os.getenv("WHATSAPP_PHONE_NUMBER")
-        self.wait_time = int(os.getenv("WHATSAPP_WAIT_TIME", 50))  # Tiempo de espera antes de escribir
-        self.close_time = int(os.getenv("WHATSAPP_CLOSE_TIME", 10))  # Tiempo antes de cerrar pestaña
-        self.disponible = PYWHATKIT_DISPONIBLE
-        
-        if not self.disponible:
-            logger.debug("pywhatkit no disponible - servicio WhatsApp deshabilitado")
-        else:
-            logger.debug("WhatsAppService inicializado correctamente")
+        self.proveedor = proveedor or crear_proveedor_whatsapp()
+        # La disponibilidad se verifica en el primer envío (carga perezosa del backend)
+        logger.debug(f"WhatsAppService inicializado (proveedor: {self.proveedor.nombre})")
+    
+    @property
+    def disponible(self):
+        return self.proveedor.disponible
+    
+    @property
+    def max_concurrencia(self):
+        return self.proveedor.max_concurrencia
     
     def validar_numero(self, numero):
         """
@@ -69,7 +354,7 @@ class WhatsAppService:
         
         return True, numero
     
-    def enviar_notificacion(self, destinatario, asunto, cuerpo):
+    def enviar_notificacion(self, destinatario, asunto, cuerpo, elevar_errores=False):
         """
         Envía notificación INFORMATIVA por WhatsApp (sin botones de respuesta).
         Solo para alertas que NO requieren interacción.
@@ -78,52 +363,49 @@ class WhatsAppService:
             destinatario: Número de teléfono con código de país (ej: +573001234567)
             asunto: Título del mensaje
             cuerpo: Contenido del mensaje
+            elevar_errores: si es True una falla lanza ErrorWhatsApp (tipo y si es permanente)
+                o ValueError (número inválido) en lugar de retornar False
             
         Returns:
             bool: True si se envió correctamente, False en caso de error
         """
         try:
-            # Verificar que pywhatkit esté disponible
+            # Verificar que el proveedor esté disponible
             if not self.disponible:
-                logger.error("❌ pywhatkit no está disponible")
-                return False
+                raise ErrorWhatsApp(f"Proveedor de WhatsApp '{self.proveedor.nombre}' no está disponible",
+                                    'ProveedorNoDisponible')
             
             # Usar número por defecto si no se proporciona destinatario
             numero = destinatario or self.numero_default
             
             if not numero:
-                logger.error("❌ No hay número de destinatario configurado")
-                return False
+                raise ValueError("No hay número de destinatario configurado")
             
             # Validar formato del número
             valido, resultado = self.validar_numero(numero)
             if not valido:
-                logger.error(f"❌ Número inválido: {resultado}")
-                return False
+                raise ValueError(f"Número inválido: {resultado}")
             
             numero = resultado  # Usar número validado
             
             # Construir mensaje de texto
             mensaje = f"🔔 *{asunto}*\n\n{cuerpo}"
             
-            logger.info(f"📱 Enviando WhatsApp a {numero}...")
-            logger.info(f"⏱️ Tiempos: wait={self.wait_time}s, close={self.close_time}s")
+            logger.info(f"📱 Enviando WhatsApp a {numero} ({self.proveedor.nombre})...")
             
-            # Enviar mensaje
-            # wait_time: tiempo para que cargue WhatsApp Web antes de escribir
-            # close_time: tiempo antes de cerrar pestaña (para que se envíe el mensaje)
-            pywhatkit.sendwhatmsg_instantly(
-                phone_no=numero,
-                message=mensaje,
-                wait_time=self.wait_time,
-                tab_close=True,
-                close_time=self.close_time
-            )
+            self.proveedor.enviar(numero, mensaje)
             
             logger.info(f"✅ WhatsApp enviado exitosamente a {numero}")
             return True
             
         except Exception as e:
             logger.error(f"❌ Error enviando WhatsApp a {destinatario}: {type(e).__name__} - {str(e)}")
+            if elevar_errores:
+                if isinstance(e, ValueError):
+                    raise
+                raise ErrorWhatsApp.desde_excepcion(e) from e
             return False
-
+    
+    def cerrar(self):
+        """Libera los recursos del proveedor (conexiones HTTP abiertas)"""
+        self.proveedor.cerrar()
@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class CacheConsultas:
+    """
+    Cache en memoria de resultados de consultas, por clave, con TTL y tamaño máximo (LRU).
+    Cada entrada guarda la función que la carga, así un hilo en segundo plano puede recargarla
+    cada intervalo_refresco segundos (antes de que venza) y apenas se llama a invalidar():
+    los usuarios solo esperan la primera consulta de cada clave.
+    Una entrada vencida o invalidada no se sirve. Si falla una recarga en segundo plano se sigue
+    sirviendo el valor anterior hasta que venza el TTL; si falla la carga en obtener() el error se propaga.
+    """
+
+    def __init__(self, ttl=60, max_entradas=32, intervalo_refresco=None):
+        self.ttl = float(ttl)
+        self.max_entradas = int(max_entradas)
+        self.intervalo_refresco = float(intervalo_refresco) if intervalo_refresco else self.ttl / 2
+        self._entradas = OrderedDict()  # clave -> [valor, cargado (monotonic), cargar, vigente]
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.refrescos = 0
+        self.errores_refresco = 0
+
+    def obtener(self, clave, cargar):
+        """Retorna el valor de la clave; si no está o venció lo carga con cargar()"""
+        self._asegurar_hilo()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[3] and time.monotonic() - entrada[1] < self.ttl:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[0]
+            self.fallos += 1
+
+        valor = cargar()
+        self._guardar(clave, valor, cargar)
+        return valor
+
+    def _guardar(self, clave, valor, cargar):
+        with self._lock:
+            self._entradas[clave] = [valor, time.monotonic(), cargar, True]
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, clave=None):
+        """Marca como vencida una clave (o todas) y despierta al hilo para recargarla enseguida"""
+        with self._lock:
+            if clave is None:
+                entradas = list(self._entradas.values())
+            else:
+                entradas = [self._entradas[clave]] if clave in self._entradas else []
+            for entrada in entradas:
+                entrada[3] = False
+        self._despertar.set()
+
+    def estadisticas(self):
+        """Contadores de aciertos y fallos del cache"""
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / total, 3) if total else None,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'refrescos': self.refrescos,
+                'errores_refresco': self.errores_refresco,
+                'ttl': self.ttl
+            }
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._refrescar, name='cache-consultas', daemon=True)
+                self._hilo.start()
+
+    def _refrescar(self):
+        while True:
+            self._despertar.wait(self.intervalo_refresco)
+            self._despertar.clear()
+
+            with self._lock:
+                pendientes = [(clave, entrada[2]) for clave, entrada in self._entradas.items()]
+
+            for clave, cargar in pendientes:
+                try:
+                    valor = cargar()
+                except Exception as e:
+                    self.errores_refresco += 1
+                    logger.error(f"Error refrescando el cache de '{clave}': {e}")
+                    continue
+                with self._lock:
+                    # Sin cambiar el orden LRU; si se desalojó mientras se recargaba no se vuelve a agregar
+                    entrada = self._entradas.get(clave)
+                    if entrada is not None:
+                        entrada[0], entrada[1], entrada[3] = valor, time.monotonic(), True
+                        self.refrescos += 1
@@ -1,11 +1,195 @@
 import pyodbc
 import os
+import time
 import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+
+class ConnectionPool:
+    """
+    Pool de conexiones pyodbc acotado y seguro entre hilos.
+    Reutiliza conexiones abiertas para evitar el login a SQL Server en cada consulta,
+    verifica cada conexión antes de entregarla (SELECT 1) y reemplaza automáticamente las
+    que están rotas. Con health_check_interval > 0 solo se verifican las que estuvieron
+    ociosas más de esos segundos (ahorra un round trip por consulta a cambio de entregar,
+    en ese intervalo, una conexión que el servidor pudo haber cortado).
+    """
+
+    def __init__(self, connection_factory, min_size=1, max_size=10, idle_timeout=300,
+                 health_check_interval=0, checkout_timeout=30):
+        self._connection_factory = connection_factory
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        # Conexiones libres como (conexion, ultimo_uso); LIFO para reutilizar las más recientes
+        self._idle = deque()
+        self._total = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'creations': 0,
+            'discards': 0,
+            'health_check_failures': 0,
+            'timeouts': 0,
+        }
+
+    def acquire(self):
+        """
+        Entrega una conexión del pool, creando una nueva si hay cupo.
+        Si el pool está lleno espera hasta checkout_timeout segundos.
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                self._prune_idle_locked()
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+
+                if self._total < self.max_size:
+                    # Reservar el cupo y crear la conexión fuera del lock
+                    self._total += 1
+                    conn, last_used = None, None
+                    break
+
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError(
+                        f"No hay conexiones disponibles en el pool (max_size={self.max_size})")
+                self._cond.wait(remaining)
+
+        if conn is not None and time.monotonic() - last_used >= self.health_check_interval:
+            if not self._is_healthy(conn):
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                self._close(conn)
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connection_factory()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['creations'] += 1
+
+        with self._cond:
+            self._stats['checkouts'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Devuelve una conexión al pool. Con discard=True se cierra y libera su cupo.
+        """
+        if discard:
+            self._close(conn)
+            with self._cond:
+                self._total -= 1
+                self._stats['discards'] += 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager que presta una conexión y la devuelve al terminar.
+        Si ocurre un error se hace rollback; si el rollback falla la conexión se descarta.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+                raise
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """Cierra todas las conexiones ociosas del pool"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def get_stats(self):
+        """Retorna contadores del pool (checkouts, waits, creations, etc.)"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._total - len(self._idle)
+            stats['size'] = self._total
+            stats['max_size'] = self.max_size
+        return stats
+
+    def _prune_idle_locked(self):
+        """Cierra conexiones ociosas más viejas que idle_timeout, respetando min_size"""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        # Las más antiguas están al inicio de la deque
+        while self._idle and self._total > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._total -= 1
+            self._stats['discards'] += 1
+            self._close(conn)
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexión del pool no responde, se reemplaza: {e}")
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
 class DatabaseConfig:
     def __init__ (self):
         self.server = os.getenv('DB_HOST')
@@ -13,18 +197,28 @@ class DatabaseConfig:
         self.username = os.getenv('DB_USER')
         self.password = os.getenv('DB_PASSWORD')
         self.driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-        
+
         # Validar configuración
         if not all([self.server, self.database, self.username, self.password]):
             logger.error("Faltan variables de entorno para la base de datos")
             raise ValueError("Configuración de base de datos incompleta")
-    
+
+        # Pool compartido por todos los servicios (las conexiones se crean bajo demanda)
+        self.pool = ConnectionPool(
+            self._connect,
+            min_size=int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            idle_timeout=int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+            health_check_interval=int(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 0)),
+            checkout_timeout=int(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 30)),
+        )
+
     def test_connection(self):
         """
         Prueba la conexión a la base de datos
         """
         try:
-            with pyodbc.connect(self.get_connection_string()) as conn:
+            with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT 1")
                 logger.info("Conexión a base de datos exitosa")
@@ -32,7 +226,7 @@ class DatabaseConfig:
         except Exception as e:
             logger.error(f"Error probando conexión: {e}")
             return False
-        
+
     def get_connection_string(self):
         # Configuración más robusta con timeout y opciones adicionales
         conn_str = (
@@ -46,50 +240,89 @@ class DatabaseConfig:
             f'TrustServerCertificate=yes;'
         )
         return conn_str
-    
+
+    def _connect(self):
+        return pyodbc.connect(self.get_connection_string())
+
+    @contextmanager
+    def get_connection(self):
+        """
+        Presta una conexión del pool. Hace commit al salir sin errores
+        y rollback si ocurre una excepción.
+        """
+        with self.pool.connection() as conn:
+            yield conn
+            conn.commit()
+
+    def get_pool_stats(self):
+        """
+        Retorna las estadísticas del pool de conexiones
+        """
+        return self.pool.get_stats()
+
     def execute_query(self, query, params=None):
         """
         Ejecuta una consulta SELECT y retorna los resultados como lista de diccionarios
         """
         try:
-            with pyodbc.connect(self.get_connection_string()) as conn:
+            with self.get_connection() as conn:
                 cursor = conn.cursor()
                 if params:
                     cursor.execute(query, params)
                 else:
                     cursor.execute(query)
-                
+
                 # Obtener nombres de columnas
                 columns = [column[0] for column in cursor.description]
-                
+
                 # Convertir resultados a diccionarios
                 results = []
                 for row in cursor.fetchall():
                     results.append(dict(zip(columns, row)))
-                
+
+                cursor.close()
                 return results
-                
+
         except Exception as e:
             logger.error(f"Error ejecutando consulta: {e}")
             raise
-    
+
     def execute_non_query(self, query, params=None):
         """
         Ejecuta una consulta INSERT, UPDATE o DELETE
         """
         try:
-            with pyodbc.connect(self.get_connection_string()) as conn:
+            with self.get_connection() as conn:
                 cursor = conn.cursor()
                 if params:
                     cursor.execute(query, params)
                 else:
                     cursor.execute(query)
-                conn.commit()
-                return cursor.rowcount
-                
+                rowcount = cursor.rowcount
+                cursor.close()
+                return rowcount
+
         except Exception as e:
             logger.error(f"Error ejecutando comando: {e}")
             raise
 
+    def execute_many(self, query, params_seq):
+        """
+        Ejecuta un INSERT/UPDATE para muchas filas en un solo envío (fast_executemany)
+        """
+        if not params_seq:
+            return 0
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.fast_executemany = True
+                cursor.executemany(query, params_seq)
+                cursor.close()
+                return len(params_seq)
+
+        except Exception as e:
+            logger.error(f"Error ejecutando comando masivo: {e}")
+            raise
+
 # Instancia global para usar en todo el proyecto
 db_config = DatabaseConfig()
@@ -0,0 +1,93 @@
+import os
+import time
+import socket
+import select
+import logging
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+WAKEUP_HOST = os.getenv('PROCESADOR_WAKEUP_HOST', '127.0.0.1')
+WAKEUP_PORT = int(os.getenv('PROCESADOR_WAKEUP_PORT', 8765))
+
+
+def notificar_procesador():
+    """
+    Despierta al procesador de notificaciones (por ejemplo, después de insertar una
+    notificación inmediata). Envía un datagrama UDP; si nadie escucha no pasa nada.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(b'wake', (WAKEUP_HOST, WAKEUP_PORT))
+        return True
+    except Exception as e:
+        logger.debug(f"No se pudo notificar al procesador: {e}")
+        return False
+
+
+class SenalProcesador:
+    """
+    Escucha las señales de despertar del procesador y calcula la espera entre ciclos:
+    sin trabajo, la espera crece de forma exponencial hasta intervalo_max;
+    al recibir una señal o procesar notificaciones vuelve a intervalo_min.
+    """
+
+    def __init__(self, intervalo_min=None, intervalo_max=None):
+        self.intervalo_min = float(intervalo_min or os.getenv('PROCESADOR_INTERVALO_MIN', 1))
+        self.intervalo_max = float(intervalo_max or os.getenv('PROCESADOR_INTERVALO_MAX', 60))
+        self.intervalo_actual = self.intervalo_min
+        self._socket = None
+
+        try:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.bind((WAKEUP_HOST, WAKEUP_PORT))
+            self._socket.setblocking(False)
+            logger.info(f"🔔 Escuchando señales de despertar en {WAKEUP_HOST}:{WAKEUP_PORT}")
+        except OSError as e:
+            # Otro procesador ya escucha en el puerto: se usa solo el intervalo adaptativo
+            logger.warning(f"⚠️ No se pudo abrir el puerto de despertar {WAKEUP_PORT}: {e}")
+            self._cerrar_socket()
+
+    def registrar_ciclo(self, procesadas):
+        """Ajusta la espera según si el ciclo encontró trabajo"""
+        if procesadas > 0:
+            self.intervalo_actual = self.intervalo_min
+        else:
+            self.intervalo_actual = min(self.intervalo_actual * 2, self.intervalo_max)
+
+    def esperar(self, timeout=None):
+        """
+        Espera hasta recibir una señal o hasta que pase el intervalo actual.
+        Retorna True si se despertó por una señal.
+        """
+        timeout = self.intervalo_actual if timeout is None else timeout
+
+        if self._socket is None:
+            time.sleep(timeout)
+            return False
+
+        listos, _, _ = select.select([self._socket], [], [], timeout)
+        if not listos:
+            return False
+
+        # Vaciar todas las señales acumuladas: un solo ciclo atiende a todas
+        try:
+            while True:
+                self._socket.recvfrom(64)
+        except (BlockingIOError, OSError):
+            pass
+
+        self.intervalo_actual = self.intervalo_min
+        return True
+
+    def _cerrar_socket(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except Exception:
+                pass
+        self._socket = None
+
+    def cerrar(self):
+        self._cerrar_socket()
@@ -0,0 +1,101 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import logging
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# Acciones de los botones del email (último segmento de la URL)
+ACCIONES = ('received', 'resolved', 'cancel')
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode('ascii')
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+class FirmadorTokensAccion:
+    """
+    Tokens de acción firmados con HMAC-SHA256 que se validan en memoria, sin guardarlos
+    ni buscarlos en la base de datos. Formato: <payload>.<firma> en base64url, donde el
+    payload es "IdNotificacion:accion:expiracion_unix:kid".
+
+    Claves en ACTION_TOKEN_KEYS ("kid1:secreto1,kid2:secreto2"); se firma con ACTION_TOKEN_KID
+    (por defecto la primera) y se aceptan todas, así una clave se puede rotar sin invalidar
+    los enlaces ya enviados. Sin claves configuradas se siguen usando los tokens en la base.
+    """
+
+    def __init__(self, claves=None, kid_activo=None, ttl_dias=None):
+        if claves is None:
+            claves = os.getenv('ACTION_TOKEN_KEYS', '')
+        self.claves = {}
+        for par in filter(None, (p.strip() for p in claves.split(','))):
+            kid, _, secreto = par.partition(':')
+            if not kid or not secreto:
+                logger.error(f"Clave de ACTION_TOKEN_KEYS mal formada (se espera kid:secreto): '{kid}'")
+                continue
+            self.claves[kid] = secreto.encode('utf-8')
+
+        kid_activo = kid_activo or os.getenv('ACTION_TOKEN_KID') or next(iter(self.claves), None)
+        if kid_activo is not None and kid_activo not in self.claves:
+            logger.error(f"ACTION_TOKEN_KID '{kid_activo}' no está en ACTION_TOKEN_KEYS, no se firmarán tokens")
+            kid_activo = None
+        self.kid_activo = kid_activo
+        self.ttl_segundos = int(float(ttl_dias if ttl_dias is not None else os.getenv('ACTION_TOKEN_TTL_DIAS', 7)) * 86400)
+
+    @property
+    def habilitado(self):
+        """True si hay una clave activa para firmar"""
+        return self.kid_activo is not None
+
+    def _firma(self, secreto, payload):
+        return hmac.new(secreto, payload, hashlib.sha256).digest()
+
+    def firmar(self, notification_id, accion, expira=None):
+        """Genera el token de una acción; expira es un timestamp unix (por defecto ahora + TTL)"""
+        if not self.habilitado:
+            raise RuntimeError("No hay clave activa para firmar tokens de acción")
+        if expira is None:
+            expira = int(time.time()) + self.ttl_segundos
+        payload = f"{int(notification_id)}:{accion}:{int(expira)}:{self.kid_activo}".encode('utf-8')
+        return f"{_b64(payload)}.{_b64(self._firma(self.claves[self.kid_activo], payload))}"
+
+    @staticmethod
+    def es_firmado(token):
+        """Los tokens aleatorios guardados en la base (token_urlsafe) nunca tienen punto"""
+        return bool(token) and '.' in token
+
+    def verificar(self, token, notification_id, accion):
+        """
+        Valida firma, notificación, acción y vencimiento sin consultar la base.
+        Retorna (valido, motivo) donde motivo explica el rechazo.
+        """
+        try:
+            payload_b64, firma_b64 = token.split('.', 1)
+            payload = _desde_b64(payload_b64)
+            firma = _desde_b64(firma_b64)
+            id_token, accion_token, expira, kid = payload.decode('utf-8').split(':')
+        except Exception:
+            return False, 'formato inválido'
+
+        secreto = self.claves.get(kid)
+        if secreto is None:
+            return False, f"clave desconocida '{kid}'"
+        if not hmac.compare_digest(firma, self._firma(secreto, payload)):
+            return False, 'firma inválida'
+        if id_token != str(int(notification_id)) or accion_token != accion:
+            return False, 'token de otra notificación o acción'
+        if int(expira) < time.time():
+            return False, 'token expirado'
+        return True, None
+
+
+# Instancia global para usar en todo el proyecto
+firmador_tokens = FirmadorTokensAccion()
@@ -5,11 +5,16 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from app.utils.database_config import db_config
+from app.utils.senal_procesador import notificar_procesador
+from app.services.tipos_notificacion_service import catalogo_tipos
+from app.services.resumen_diario_service import FUENTE_RESUMEN
+from app.utils.cache_consultas import CacheConsultas
 import logging
 import dash
 from dash import dcc, html, Input, Output, callback, State
 from dash.exceptions import PreventUpdate
 import os
+import threading
 from dotenv import load_dotenv
 import warnings
 
@@ -21,23 +26,34 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Días y título de cada período del gráfico de líneas
+PERIODOS = {
+    '1_semana': (7, "Última Semana"),
+    '1_mes': (30, "Último Mes"),
+    '3_meses': (90, "Últimos 3 Meses")
+}
+
+# Cache compartido por todas las instancias del dashboard; un hilo lo recarga antes de que venza
+cache_dashboard = CacheConsultas(
+    ttl=os.getenv('DASHBOARD_CACHE_TTL', 60),
+    max_entradas=os.getenv('DASHBOARD_CACHE_MAX_ENTRADAS', 32),
+    intervalo_refresco=os.getenv('DASHBOARD_CACHE_REFRESCO_SEGUNDOS', 30)
+)
+
 class DashboardNotificacionesPlotly:
     def __init__(self):
         self.periodo_actual = '1_mes'
-        self.datos_cache = {}
     
     def obtener_tipos_notificacion(self):
         """
         Obtiene los tipos de notificación disponibles
         """
-        query = """
-        SELECT IdTipoNotificacion, descripcion 
-        FROM Notificaciones_Tipo 
-        ORDER BY descripcion
-        """
         try:
-            resultados = db_config.execute_query(query)
-            return resultados
+            # Catálogo en memoria compartido con el procesador
+            return [
+                {'IdTipoNotificacion': tipo['IdTipoNotificacion'], 'descripcion': tipo['descripcion']}
+                for tipo in catalogo_tipos.listar()
+            ]
         except Exception as e:
             logger.error(f"Error al obtener tipos de notificación: {e}")
             return []
@@ -61,7 +77,13 @@ class DashboardNotificacionesPlotly:
             
             db_config.execute_non_query(query, params)
             
-            fecha_info = f" programada para {fecha_programada.strftime('%d/%m/%Y')}" if fecha_programada else " inmediata"
+            # Los gráficos se recargan en segundo plano con la nueva notificación
+            cache_dashboard.invalidar()
+            
+            # Despertar al procesador para que la envíe sin esperar al siguiente ciclo
+            notificar_procesador()
+            
+            fecha_info = f" programada para {fecha_programada.strftime('%d/%m/%Y %H:%M')}" if fecha_programada else " inmediata"
             logger.info(f"Notificación creada - Tipo: {tipo_id}{fecha_info}")
             return True, "Notificación creada exitosamente"
         except Exception as e:
@@ -72,73 +94,83 @@ class DashboardNotificacionesPlotly:
         """
         Se obtiene datos de notificaciones por período para el gráfico de líneas
         """
-        if periodo in self.datos_cache:
-            return self.datos_cache[periodo]
-            
-        fecha_fin = datetime.now()
-        if periodo == '1_semana':
-            fecha_inicio = fecha_fin - timedelta(days=7)
-            titulo_periodo = "Última Semana"
-        elif periodo == '1_mes':
-            fecha_inicio = fecha_fin - timedelta(days=30)
-            titulo_periodo = "Último Mes"
-        elif periodo == '3_meses':
-            fecha_inicio = fecha_fin - timedelta(days=90)
-            titulo_periodo = "Últimos 3 Meses"
-        else:
+        if periodo not in PERIODOS:
             raise ValueError("Período no válido")
         
-        query = """
+        try:
+            return cache_dashboard.obtener(('periodo', periodo), lambda: self._consultar_datos_por_periodo(periodo))
+        except Exception as e:
+            logger.error(f"Error al obtener datos por período: {e}")
+            return {'resultados': [], 'titulo_periodo': PERIODOS[periodo][1]}
+    
+    def _consultar_datos_por_periodo(self, periodo):
+        dias, titulo_periodo = PERIODOS[periodo]
+        fecha_fin = datetime.now()
+        fecha_inicio = fecha_fin - timedelta(days=dias)
+        
+        # Días cerrados desde Notificaciones_ResumenDiario, el día en curso en vivo
+        query = f"""
+        SET NOCOUNT ON;
+        DECLARE @desde DATE = ?;
+        DECLARE @hasta DATETIME = ?;
+        {FUENTE_RESUMEN}
         SELECT 
             nt.IdTipoNotificacion,
             nt.descripcion as TipoDescripcion,
-            CAST(n.Fecha_Envio AS DATE) as Fecha,
-            COUNT(n.IdNotificacion) as Cantidad,
-            COUNT(CASE WHEN n.Estado = 'enviado' THEN 1 END) as CantidadEnviadas,
-            COUNT(CASE WHEN n.Estado = 'error' THEN 1 END) as CantidadError,
-            COUNT(CASE WHEN n.Estado = 'pendiente' THEN 1 END) as CantidadPendientes
-        FROM Notificaciones n
-        INNER JOIN Notificaciones_Tipo nt ON n.IdTipoNotificacion = nt.IdTipoNotificacion
-        WHERE n.Fecha_Envio >= ? AND n.Fecha_Envio <= ?
-        GROUP BY nt.IdTipoNotificacion, nt.descripcion, CAST(n.Fecha_Envio AS DATE)
-        ORDER BY Fecha ASC, nt.descripcion
+            r.Fecha,
+            SUM(r.Cantidad) as Cantidad,
+            SUM(CASE WHEN r.Estado = 'enviado' THEN r.Cantidad ELSE 0 END) as CantidadEnviadas,
+            SUM(CASE WHEN r.Estado IN ('error', 'fallido') THEN r.Cantidad ELSE 0 END) as CantidadError,
+            SUM(CASE WHEN r.Estado = 'pendiente' THEN r.Cantidad ELSE 0 END) as CantidadPendientes
+        FROM Resumen r
+        INNER JOIN Notificaciones_Tipo nt ON r.IdTipoNotificacion = nt.IdTipoNotificacion
+        GROUP BY nt.IdTipoNotificacion, nt.descripcion, r.Fecha
+        ORDER BY r.Fecha ASC, nt.descripcion
         """
         
-        try:
-            resultados = db_config.execute_query(query, [fecha_inicio, fecha_fin])
-            datos = {
-                'resultados': resultados,
-                'titulo_periodo': titulo_periodo,
-                'fecha_inicio': fecha_inicio,
-                'fecha_fin': fecha_fin
-            }
-            self.datos_cache[periodo] = datos
-            return datos
-        except Exception as e:
-            logger.error(f"Error al obtener datos por período: {e}")
-            return {'resultados': [], 'titulo_periodo': titulo_periodo}
+        resultados = db_config.execute_query(query, [fecha_inicio, fecha_fin])
+        return {
+            'resultados': resultados,
+            'titulo_periodo': titulo_periodo,
+            'fecha_inicio': fecha_inicio,
+            'fecha_fin': fecha_fin
+        }
     
     def obtener_datos_estados(self):
         """
         Se obtiene datos para el gráfico de dona (distribución de estados)
         """
-        query = """
-        SELECT 
-            n.Estado,
-            COUNT(n.IdNotificacion) as Cantidad
-        FROM Notificaciones n
-        WHERE n.Fecha_Envio >= DATEADD(month, -1, GETDATE())
-        GROUP BY n.Estado
-        ORDER BY Cantidad DESC
-        """
-        
         try:
-            resultados = db_config.execute_query(query)
-            return resultados
+            return cache_dashboard.obtener(('estados',), self._consultar_datos_estados)
         except Exception as e:
             logger.error(f"Error al obtener datos de estados: {e}")
             return []
     
+    def _consultar_datos_estados(self):
+        query = f"""
+        SET NOCOUNT ON;
+        DECLARE @desde DATE = DATEADD(month, -1, GETDATE());
+        DECLARE @hasta DATETIME = GETDATE();
+        {FUENTE_RESUMEN}
+        SELECT 
+            r.Estado,
+            SUM(r.Cantidad) as Cantidad
+        FROM Resumen r
+        GROUP BY r.Estado
+        ORDER BY Cantidad DESC
+        """
+        
+        return db_config.execute_query(query)
+    
+    def precargar_cache(self):
+        """
+        Carga en el cache todos los períodos y la distribución de estados; desde ahí
+        el hilo del cache los mantiene vigentes
+        """
+        for periodo in PERIODOS:
+            self.obtener_datos_por_periodo(periodo)
+        self.obtener_datos_estados()
+    
     def crear_grafico_lineas(self, periodo='1_mes'):
         """
         Crea el gráfico de líneas con tendencia temporal usando Plotly
@@ -261,7 +293,10 @@ class DashboardNotificacionesPlotly:
         colores_estados = {
             'enviado': '#2ecc71',    # Verde
             'pendiente': '#f39c12',  # Naranja
-            'error': '#e74c3c'       # Rojo
+            'reintentar': '#f1c40f', # Amarillo
+            'error': '#e74c3c',      # Rojo
+            'fallido': '#c0392b',    # Rojo oscuro
+            'suprimido': '#bdc3c7'   # Gris claro
         }
         
         colores = [colores_estados.get(estado.lower(), '#95a5a6') for estado in estados]
@@ -359,7 +394,10 @@ class DashboardNotificacionesPlotly:
             colores_estados = {
                 'enviado': '#2ecc71',
                 'pendiente': '#f39c12',
-                'error': '#e74c3c'
+                'reintentar': '#f1c40f',
+                'error': '#e74c3c',
+                'fallido': '#c0392b',
+                'suprimido': '#bdc3c7'
             }
             colores = [colores_estados.get(estado.lower(), '#95a5a6') for estado in estados]
             
@@ -446,7 +484,13 @@ def crear_dashboard_dash():
                         display_format='DD/MM/YYYY',
                         style={'width': '100%', 'marginBottom': '15px'}
                     ),
-                    html.Small("Si no selecciona fecha, se enviará inmediatamente. Las notificaciones se procesan a partir del día seleccionado (cualquier hora).", 
+                    dcc.Input(
+                        id='hora-programada-input',
+                        type='text',
+                        placeholder='Hora de envío HH:MM (opcional, por defecto 00:00)',
+                        style={'width': '100%', 'marginBottom': '15px', 'padding': '8px'}
+                    ),
+                    html.Small("Si no selecciona fecha ni hora, se enviará inmediatamente. Las notificaciones programadas se envían a la fecha y hora indicadas (precisión de un minuto).", 
                               style={'color': '#666', 'fontSize': '12px', 'display': 'block', 'marginBottom': '15px'}),
                 ], style={'width': '48%', 'display': 'inline-block', 'verticalAlign': 'top'}),
                 
@@ -516,6 +560,17 @@ def crear_dashboard_dash():
         ])
     ])
     
+    # Nadie espera la primera consulta: el cache se llena en segundo plano al iniciar
+    threading.Thread(target=dashboard.precargar_cache, name='precarga-dashboard', daemon=True).start()
+    
+    @app.server.route('/cache/stats')
+    def estadisticas_cache():
+        """Aciertos y fallos del cache de consultas del dashboard"""
+        return {
+            'cache': cache_dashboard.estadisticas(),
+            'timestamp': datetime.now().isoformat()
+        }
+    
     @app.callback(
         [Output('grafico-lineas', 'figure'),
          Output('grafico-dona', 'figure')],
@@ -533,10 +588,11 @@ def crear_dashboard_dash():
          State('asunto-input', 'value'),
          State('cuerpo-textarea', 'value'),
          State('destinatarios-input', 'value'),
-         State('fecha-programada-picker', 'date')],
+         State('fecha-programada-picker', 'date'),
+         State('hora-programada-input', 'value')],
         prevent_initial_call=True
     )
-    def crear_nueva_notificacion(n_clicks, tipo_id, asunto, cuerpo, destinatarios, fecha_programada):
+    def crear_nueva_notificacion(n_clicks, tipo_id, asunto, cuerpo, destinatarios, fecha_programada, hora_programada):
         if n_clicks is None or n_clicks == 0:
             raise PreventUpdate
         
@@ -550,11 +606,26 @@ def crear_dashboard_dash():
             
             # Procesar fecha programada
             fecha_prog_procesada = None
-            if fecha_programada:
+            hora_programada = (hora_programada or '').strip()
+            if fecha_programada or hora_programada:
                 from datetime import datetime
                 try:
-                    # Convertir string de fecha a datetime
-                    fecha_prog_procesada = datetime.strptime(fecha_programada, '%Y-%m-%d')
+                    # Convertir string de fecha a datetime (solo hora: hoy)
+                    if fecha_programada:
+                        fecha_prog_procesada = datetime.strptime(fecha_programada, '%Y-%m-%d')
+                    else:
+                        fecha_prog_procesada = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                    
+                    if hora_programada:
+                        hora = datetime.strptime(hora_programada, '%H:%M')
+                        fecha_prog_procesada = fecha_prog_procesada.replace(hour=hora.hour, minute=hora.minute)
+                        
+                        # Validar que la fecha y hora no sean pasadas
+                        if fecha_prog_procesada < datetime.now().replace(second=0, microsecond=0):
+                            return html.Div([
+                                html.P("❌ Error: La fecha y hora programadas no pueden ser anteriores a ahora", 
+                                       style={'color': 'red', 'fontWeight': 'bold', 'margin': '0'})
+                            ])
                     
                     # Validar que la fecha no sea pasada
                     if fecha_prog_procesada.date() < datetime.now().date():
@@ -564,7 +635,7 @@ def crear_dashboard_dash():
                         ])
                 except ValueError:
                     return html.Div([
-                        html.P("❌ Error: Formato de fecha inválido", 
+                        html.P("❌ Error: Formato de fecha u hora inválido (use HH:MM)", 
                                style={'color': 'red', 'fontWeight': 'bold', 'margin': '0'})
                     ])
             
@@ -580,7 +651,7 @@ def crear_dashboard_dash():
             if exito:
                 mensaje_adicional = ""
                 if fecha_prog_procesada:
-                    mensaje_adicional = f" Se enviará el {fecha_prog_procesada.strftime('%d/%m/%Y')}."
+                    mensaje_adicional = f" Se enviará el {fecha_prog_procesada.strftime('%d/%m/%Y a las %H:%M')}."
                 else:
                     mensaje_adicional = " Será procesada inmediatamente."
                 
@@ -0,0 +1,28 @@
+"""
+Script para archivar notificaciones terminadas y auditoría antigua (datos fríos).
+Pensado para ejecutarse periódicamente (por ejemplo, una vez por noche con el Programador de tareas).
+"""
+import logging
+from app.services.archivo_service import ArchivadorHistorico
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+if __name__ == "__main__":
+    print("\n" + "="*80)
+    print("🗄️ ARCHIVANDO HISTÓRICO".center(80))
+    print("="*80 + "\n")
+    
+    archivador = ArchivadorHistorico()
+    resumen = archivador.ejecutar()
+    
+    print(f"\n📦 Notificaciones archivadas: {resumen['notificaciones']} "
+          f"(destinatarios: {resumen['destinatarios']}) en {resumen['segundos_notificaciones']} s")
+    print(f"📝 Filas de auditoría archivadas: {resumen['auditoria']} en {resumen['segundos_auditoria']} s")
+    
+    print("\n" + "="*80)
+    print("✅ PROCESO COMPLETADO".center(80))
+    print("="*80 + "\n")
@@ -0,0 +1,34 @@
+"""
+Configuración de gunicorn para servir web_server.py en Linux:
+
+    gunicorn -c gunicorn.conf.py web_server:app
+
+Recarga ordenada (sin cortar los clics en curso): kill -HUP <pid del master>
+Cada worker tiene su propio pool de conexiones a la base (DB_POOL_MAX_SIZE >= WEB_THREADS).
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5000)}"
+
+# Procesos y hilos por proceso (worker gthread: los hilos esperan a SQL Server sin bloquear al resto)
+workers = int(os.getenv('WEB_WORKERS', 2))
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread'
+worker_connections = int(os.getenv('WEB_CONNECTION_LIMIT', 500))
+backlog = int(os.getenv('WEB_BACKLOG', 1024))
+
+# Keep-alive para las ráfagas de clics de un mismo cliente/proxy
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+
+# Un request más lento que esto reinicia el worker; en la recarga se espera graceful_timeout
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+
+# Reciclar workers cada tantos requests (0 = nunca)
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
@@ -1,5 +1,8 @@
-from app.services.alertas_service import ProcesadorNotificaciones
-from app.web.dashboard_plotly import get_app
+from app.services.alertas_service import ProcesadorNotificaciones, DespachoEmails, DespachoWhatsApp
+from app.utils.senal_procesador import SenalProcesador
+from app.services.agenda_programadas import AgendaProgramadas
+from app.services.auditoria_service import auditoria
+from app.services.resumen_diario_service import ResumenDiario
 import time
 import logging
 import threading
@@ -40,6 +43,8 @@ def start_dashboard():
     logger.info("=" * 60)
     
     try:
+        # Dash/plotly/pandas se importan solo en el hilo del dashboard, sin demorar al procesador
+        from app.web.dashboard_plotly import get_app
         dash_app = get_app()
         dash_app.run(host=host, port=port, debug=False)
     except Exception as e:
@@ -57,6 +62,11 @@ if __name__ == "__main__":
     
     logger.info("Iniciando procesador de notificaciones...")
     ciclo = 0
+    senal = SenalProcesador()
+    agenda = AgendaProgramadas()
+    # Consolidar los días cerrados para el dashboard en segundo plano, sin frenar los envíos
+    resumen_diario = ResumenDiario()
+    resumen_diario.iniciar()
     
     try:
         while True:
@@ -67,26 +77,47 @@ if __name__ == "__main__":
                 
                 # Procesar notificaciones de Email
                 logger.info("📧 Procesando notificaciones de Email...")
-                ProcesadorNotificaciones.procesar_pendientes()
+                procesadas = ProcesadorNotificaciones.procesar_pendientes()
                 
                 # Procesar notificaciones de WhatsApp
                 logger.info("📱 Procesando notificaciones de WhatsApp...")
-                ProcesadorNotificaciones.procesar_whatsapp_pendientes()
+                procesadas += ProcesadorNotificaciones.procesar_whatsapp_pendientes()
                 
                 end_time = time.time()
                 logger.info(f"✅ Ciclo #{ciclo} completado en {end_time - start_time:.2f} segundos")
-    
                 
             except Exception as e:
                 logger.error(f"❌ Error en ciclo #{ciclo}: {e}")
                 logger.info("⚠️ Continuando con el siguiente ciclo...")
+                procesadas = 0
+            
+            # Con trabajo pendiente se encadena otro ciclo; sin trabajo la espera crece hasta el máximo
+            senal.registrar_ciclo(procesadas)
+            
+            if procesadas > 0:
+                continue
+            
+            # Despertar a la hora exacta de la próxima programada si llega antes que el intervalo
+            agenda.refrescar()
+            espera = senal.intervalo_actual
+            proxima = agenda.segundos_hasta_proxima()
+            if proxima is not None and proxima < espera:
+                espera = proxima
             
-            logger.info("⏳ Esperando 60 segundos para el siguiente ciclo...")
-            time.sleep(60)
+            logger.info(f"⏳ Esperando hasta {espera:.0f} segundos para el siguiente ciclo...")
+            if senal.esperar(espera):
+                logger.info("🔔 Nueva notificación recibida, iniciando ciclo")
+            elif agenda.descartar_vencidas():
+                logger.info("🗓️ Notificación programada vencida, iniciando ciclo")
             
     except KeyboardInterrupt:
         logger.info("🔴 Sistema detenido por el usuario (Ctrl+C)")
     except Exception as e:
         logger.error(f"💥 Error crítico en el bucle principal: {e}")
     finally:
+        senal.cerrar()
+        resumen_diario.detener()
+        DespachoEmails.cerrar()
+        DespachoWhatsApp.cerrar()
+        auditoria.cerrar()
         logger.info("🏁 Sistema de notificaciones finalizado")
\ No newline at end of file
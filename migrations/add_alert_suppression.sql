@@ -0,0 +1,61 @@
+-- Script para suprimir copias repetidas de una misma alerta (IdAlerta)
+-- Ejecutar en SQL Server Management Studio
+-- Requiere migrations/add_id_alerta_field.sql y migrations/add_retry_policy.sql
+--
+-- IdSuprimidaPor: notificación que se envió en lugar de esta (estado 'suprimido')
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.columns
+    WHERE object_id = OBJECT_ID('Notificaciones')
+    AND name = 'IdSuprimidaPor'
+)
+BEGIN
+    ALTER TABLE Notificaciones
+    ADD IdSuprimidaPor INT NULL
+        CONSTRAINT FK_Notificaciones_IdSuprimidaPor REFERENCES Notificaciones(IdNotificacion);
+    PRINT 'Columna IdSuprimidaPor agregada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La columna IdSuprimidaPor ya existe';
+END
+GO
+
+-- Agregar el estado 'suprimido' al CHECK constraint de Estado
+IF EXISTS (
+    SELECT 1
+    FROM sys.check_constraints
+    WHERE name = 'CHK_Notificaciones_Estado'
+)
+BEGIN
+    ALTER TABLE Notificaciones DROP CONSTRAINT CHK_Notificaciones_Estado;
+END
+
+ALTER TABLE Notificaciones
+ADD CONSTRAINT CHK_Notificaciones_Estado
+CHECK (Estado IN ('pendiente', 'procesando', 'reintentar', 'enviado', 'recibido', 'error', 'parcial', 'fallido', 'suprimido', 'cancelado', 'resuelto'));
+GO
+
+-- Índice para buscar las copias recientes de una alerta sin leer la tabla
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Notificaciones_IdAlerta_Envio'
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_IdAlerta_Envio
+    ON Notificaciones(IdAlerta, Fecha_Envio)
+    INCLUDE (Estado, Medio, IdTipoNotificacion)
+    WHERE IdAlerta IS NOT NULL;
+    PRINT 'Índice IX_Notificaciones_IdAlerta_Envio creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_IdAlerta_Envio ya existe';
+END
+GO
+
+PRINT 'Script ejecutado correctamente';
+PRINT 'Estados válidos: pendiente, procesando, reintentar, enviado, recibido, error, parcial, fallido, suprimido, cancelado, resuelto';
@@ -0,0 +1,99 @@
+-- Script para crear las tablas de archivo (datos fríos) de Notificaciones, NotificacionDestinatarios y Auditoria
+-- Ejecutar en SQL Server Management Studio
+-- Requiere migrations/add_auditoria_estructurada.sql
+-- El traspaso lo hace archivar_historico.py (por lotes, con pausa entre lotes)
+--
+-- Las tablas se crean con las mismas columnas que la tabla original. El UNION ALL evita copiar
+-- la propiedad IDENTITY, así se conservan los IDs originales. No tienen FK, CHECK ni triggers
+-- (requisito de DELETE ... OUTPUT INTO). Si más adelante se agregan columnas a la tabla original,
+-- agregarlas también al archivo: el traspaso solo copia las columnas que existen en ambas.
+
+IF OBJECT_ID('Notificaciones_Archivo') IS NULL
+BEGIN
+    SELECT TOP 0 * INTO Notificaciones_Archivo FROM Notificaciones
+    UNION ALL
+    SELECT TOP 0 * FROM Notificaciones;
+
+    ALTER TABLE Notificaciones_Archivo ALTER COLUMN IdNotificacion INT NOT NULL;
+    ALTER TABLE Notificaciones_Archivo
+    ADD CONSTRAINT PK_Notificaciones_Archivo PRIMARY KEY (IdNotificacion);
+
+    ALTER TABLE Notificaciones_Archivo
+    ADD FechaArchivo DATETIME2(0) NOT NULL CONSTRAINT DF_Notificaciones_Archivo_FechaArchivo DEFAULT GETDATE();
+    PRINT 'Tabla Notificaciones_Archivo creada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla Notificaciones_Archivo ya existe';
+END
+GO
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Notificaciones_Archivo_IdAlerta'
+    AND object_id = OBJECT_ID('Notificaciones_Archivo')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_Archivo_IdAlerta
+    ON Notificaciones_Archivo(IdAlerta)
+    WHERE IdAlerta IS NOT NULL;
+    CREATE INDEX IX_Notificaciones_Archivo_Source_IdNotificacion
+    ON Notificaciones_Archivo(Source_IdNotificacion)
+    WHERE Source_IdNotificacion IS NOT NULL;
+    PRINT 'Índices de Notificaciones_Archivo creados correctamente';
+END
+GO
+
+IF OBJECT_ID('NotificacionDestinatarios_Archivo') IS NULL
+BEGIN
+    SELECT TOP 0 * INTO NotificacionDestinatarios_Archivo FROM NotificacionDestinatarios
+    UNION ALL
+    SELECT TOP 0 * FROM NotificacionDestinatarios;
+
+    CREATE CLUSTERED INDEX IX_NotificacionDestinatarios_Archivo_IdNotificacion
+    ON NotificacionDestinatarios_Archivo(IdNotificacion);
+    PRINT 'Tabla NotificacionDestinatarios_Archivo creada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla NotificacionDestinatarios_Archivo ya existe';
+END
+GO
+
+IF OBJECT_ID('Auditoria_Archivo') IS NULL
+BEGIN
+    SELECT TOP 0 * INTO Auditoria_Archivo FROM Auditoria
+    UNION ALL
+    SELECT TOP 0 * FROM Auditoria;
+
+    CREATE CLUSTERED INDEX IX_Auditoria_Archivo_fecha_aud ON Auditoria_Archivo(fecha_aud);
+    CREATE INDEX IX_Auditoria_Archivo_IdNotificacion
+    ON Auditoria_Archivo(IdNotificacion, fecha_aud)
+    WHERE IdNotificacion IS NOT NULL;
+    PRINT 'Tabla Auditoria_Archivo creada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla Auditoria_Archivo ya existe';
+END
+GO
+
+-- El traspaso de Auditoria recorre las filas más antiguas por fecha
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Auditoria_fecha_aud'
+    AND object_id = OBJECT_ID('Auditoria')
+)
+BEGIN
+    CREATE INDEX IX_Auditoria_fecha_aud ON Auditoria(fecha_aud);
+    PRINT 'Índice IX_Auditoria_fecha_aud creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Auditoria_fecha_aud ya existe';
+END
+GO
+
+PRINT 'Tablas de archivo configuradas';
@@ -0,0 +1,73 @@
+-- Script para agregar columnas estructuradas a Auditoria (en lugar de "ID_<n>: ..." dentro de detalle)
+-- Ejecutar en SQL Server Management Studio
+-- Después de este script ejecutar migrations/backfill_auditoria_estructurada.sql para completar las filas anteriores
+--
+-- IdNotificacion: notificación auditada
+-- IdAlerta:       alerta de origen de la notificación
+-- Medio:          Email o Whatsapp
+-- DuracionMs:     duración del envío o de la acción del usuario en milisegundos
+-- Resultado:      estado resultante (enviado, parcial, reintentar, fallido, error, suprimido, recibido, resuelto, cancelado)
+-- Sin FK a Notificaciones: el historial se conserva aunque la notificación se archive o elimine
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.columns
+    WHERE object_id = OBJECT_ID('Auditoria')
+    AND name = 'IdNotificacion'
+)
+BEGIN
+    ALTER TABLE Auditoria
+    ADD IdNotificacion INT NULL,
+        IdAlerta INT NULL,
+        Medio NVARCHAR(20) NULL,
+        DuracionMs INT NULL,
+        Resultado NVARCHAR(20) NULL;
+    PRINT 'Columnas IdNotificacion, IdAlerta, Medio, DuracionMs y Resultado agregadas correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'Las columnas estructuradas de Auditoria ya existen';
+END
+GO
+
+-- Historial de una notificación por búsqueda en el índice (sin LIKE 'ID_123:%' sobre toda la tabla)
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Auditoria_IdNotificacion'
+    AND object_id = OBJECT_ID('Auditoria')
+)
+BEGIN
+    CREATE INDEX IX_Auditoria_IdNotificacion
+    ON Auditoria(IdNotificacion, fecha_aud)
+    INCLUDE (accion, Resultado, Medio, DuracionMs)
+    WHERE IdNotificacion IS NOT NULL;
+    PRINT 'Índice IX_Auditoria_IdNotificacion creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Auditoria_IdNotificacion ya existe';
+END
+GO
+
+-- Historial de todas las notificaciones de una alerta
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Auditoria_IdAlerta'
+    AND object_id = OBJECT_ID('Auditoria')
+)
+BEGIN
+    CREATE INDEX IX_Auditoria_IdAlerta
+    ON Auditoria(IdAlerta, fecha_aud)
+    INCLUDE (IdNotificacion, accion, Resultado)
+    WHERE IdAlerta IS NOT NULL;
+    PRINT 'Índice IX_Auditoria_IdAlerta creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Auditoria_IdAlerta ya existe';
+END
+GO
+
+PRINT 'Auditoría estructurada configurada';
@@ -0,0 +1,74 @@
+-- Script para permitir varios procesadores en paralelo (reclamo/lease de notificaciones)
+-- Ejecutar en SQL Server Management Studio
+
+-- Columna con el identificador del worker que reclamó la notificación
+IF NOT EXISTS (
+    SELECT 1 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_NAME = 'Notificaciones' 
+    AND COLUMN_NAME = 'WorkerId'
+)
+BEGIN
+    ALTER TABLE Notificaciones 
+    ADD WorkerId NVARCHAR(100) NULL;
+    
+    PRINT 'Columna WorkerId agregada correctamente a la tabla Notificaciones';
+END
+ELSE
+BEGIN
+    PRINT 'La columna WorkerId ya existe en la tabla Notificaciones';
+END
+
+-- Columna con la expiración del lease (si vence, la notificación vuelve a 'pendiente')
+IF NOT EXISTS (
+    SELECT 1 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_NAME = 'Notificaciones' 
+    AND COLUMN_NAME = 'LeaseExpira'
+)
+BEGIN
+    ALTER TABLE Notificaciones 
+    ADD LeaseExpira DATETIME2(0) NULL;
+    
+    PRINT 'Columna LeaseExpira agregada correctamente a la tabla Notificaciones';
+END
+ELSE
+BEGIN
+    PRINT 'La columna LeaseExpira ya existe en la tabla Notificaciones';
+END
+GO
+
+-- Agregar el estado 'procesando' al CHECK constraint de Estado
+IF EXISTS (
+    SELECT 1 
+    FROM sys.check_constraints 
+    WHERE name = 'CHK_Notificaciones_Estado'
+)
+BEGIN
+    ALTER TABLE Notificaciones DROP CONSTRAINT CHK_Notificaciones_Estado;
+END
+
+ALTER TABLE Notificaciones 
+ADD CONSTRAINT CHK_Notificaciones_Estado 
+CHECK (Estado IN ('pendiente', 'procesando', 'enviado', 'recibido', 'error', 'parcial', 'cancelado', 'resuelto'));
+
+-- Índice filtrado para que el reaper de leases expirados no recorra toda la tabla
+IF NOT EXISTS (
+    SELECT 1 
+    FROM sys.indexes 
+    WHERE name = 'IX_Notificaciones_LeaseExpira' 
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_LeaseExpira 
+    ON Notificaciones(LeaseExpira) 
+    WHERE Estado = 'procesando';
+    PRINT 'Índice IX_Notificaciones_LeaseExpira creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_LeaseExpira ya existe';
+END
+
+PRINT 'Script ejecutado correctamente';
+PRINT 'Estados válidos: pendiente, procesando, enviado, recibido, error, parcial, cancelado, resuelto';
@@ -0,0 +1,44 @@
+-- Script para habilitar el modo resumen (digest): varias notificaciones para un mismo
+-- destinatario se envían en un solo email por lote del procesador
+-- Ejecutar en SQL Server Management Studio
+--
+-- Notificaciones_Tipo.ModoResumen = 1: las notificaciones de ese tipo se agrupan por destinatario
+-- ResumenDestinatarios: destinatarios que eligieron recibir resúmenes para cualquier tipo
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.columns
+    WHERE object_id = OBJECT_ID('Notificaciones_Tipo')
+    AND name = 'ModoResumen'
+)
+BEGIN
+    ALTER TABLE Notificaciones_Tipo
+    ADD ModoResumen BIT NOT NULL CONSTRAINT DF_Notificaciones_Tipo_ModoResumen DEFAULT 0;
+    PRINT 'Columna ModoResumen agregada correctamente a Notificaciones_Tipo';
+END
+ELSE
+BEGIN
+    PRINT 'La columna ModoResumen ya existe';
+END
+GO
+
+IF OBJECT_ID('ResumenDestinatarios', 'U') IS NULL
+BEGIN
+    CREATE TABLE ResumenDestinatarios (
+        EmailDestinatario NVARCHAR(255) NOT NULL PRIMARY KEY,
+        Activo BIT NOT NULL CONSTRAINT DF_ResumenDestinatarios_Activo DEFAULT 1,
+        FechaCreacion DATETIME2(0) NOT NULL CONSTRAINT DF_ResumenDestinatarios_FechaCreacion DEFAULT GETDATE()
+    );
+    PRINT 'Tabla ResumenDestinatarios creada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla ResumenDestinatarios ya existe';
+END
+GO
+
+-- Ejemplos:
+-- UPDATE Notificaciones_Tipo SET ModoResumen = 1 WHERE IdTipoNotificacion = 3;
+-- INSERT INTO ResumenDestinatarios (EmailDestinatario) VALUES ('operaciones@ejemplo.com');
+
+PRINT 'Script ejecutado correctamente';
@@ -0,0 +1,77 @@
+-- Script para agregar índices a las consultas más frecuentes del procesador y de los botones de acción
+-- Ejecutar en SQL Server Management Studio
+-- Para comparar planes y tiempos: python tests/verificar_planes_indices.py --etiqueta antes
+-- antes de ejecutar este script, y con --etiqueta despues al terminar.
+
+-- Índice filtrado y cubriente para la búsqueda/reclamo de notificaciones pendientes
+-- (filtra por Medio y Fecha_Programada, pagina por IdNotificacion y lee el tipo sin ir a la tabla)
+IF NOT EXISTS (
+    SELECT 1 
+    FROM sys.indexes 
+    WHERE name = 'IX_Notificaciones_Pendientes' 
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_Pendientes 
+    ON Notificaciones(Medio, Fecha_Programada, IdNotificacion) 
+    INCLUDE (IdTipoNotificacion, Estado)
+    WHERE Estado = 'pendiente';
+    PRINT 'Índice IX_Notificaciones_Pendientes creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_Pendientes ya existe';
+END
+
+-- Índice para validar los tokens de los botones de acción (IdNotificacion + TokenRespuesta)
+IF NOT EXISTS (
+    SELECT 1 
+    FROM sys.indexes 
+    WHERE name = 'IX_Notificaciones_TokenRespuesta' 
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_TokenRespuesta 
+    ON Notificaciones(TokenRespuesta) 
+    INCLUDE (IdNotificacion, Estado, FechaExpiracion)
+    WHERE TokenRespuesta IS NOT NULL;
+    PRINT 'Índice IX_Notificaciones_TokenRespuesta creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_TokenRespuesta ya existe';
+END
+
+-- Índice para la cancelación en cascada por Source_IdNotificacion
+IF NOT EXISTS (
+    SELECT 1 
+    FROM sys.indexes 
+    WHERE name = 'IX_Notificaciones_Source_IdNotificacion' 
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_Source_IdNotificacion 
+    ON Notificaciones(Source_IdNotificacion, Estado) 
+    WHERE Source_IdNotificacion IS NOT NULL;
+    PRINT 'Índice IX_Notificaciones_Source_IdNotificacion creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_Source_IdNotificacion ya existe';
+END
+
+-- Actualizar estadísticas para que los nuevos planes se basen en datos actuales
+UPDATE STATISTICS Notificaciones;
+
+-- Verificar los índices de la tabla
+SELECT 
+    i.name AS indice,
+    i.type_desc,
+    i.has_filter,
+    i.filter_definition
+FROM sys.indexes i
+WHERE i.object_id = OBJECT_ID('Notificaciones')
+ORDER BY i.name;
+
+PRINT 'Script ejecutado correctamente';
+PRINT 'NOTA: las consultas de pendientes usan Fecha_Programada <= GETDATE() (fecha y hora, sargable)';
@@ -0,0 +1,74 @@
+-- Script para registrar el estado de envío por destinatario en NotificacionDestinatarios
+-- Requiere migrations/add_notification_recipients.sql
+-- Ejecutar en SQL Server Management Studio
+
+-- Estado del envío a cada destinatario: pendiente, enviado o error
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.columns
+    WHERE object_id = OBJECT_ID('NotificacionDestinatarios')
+    AND name = 'Estado'
+)
+BEGIN
+    ALTER TABLE NotificacionDestinatarios
+    ADD Estado NVARCHAR(20) NOT NULL
+        CONSTRAINT DF_NotificacionDestinatarios_Estado DEFAULT 'pendiente'
+        CONSTRAINT CK_NotificacionDestinatarios_Estado CHECK (Estado IN ('pendiente', 'enviado', 'error'));
+    PRINT 'Columna Estado agregada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La columna Estado ya existe';
+END
+GO
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.columns
+    WHERE object_id = OBJECT_ID('NotificacionDestinatarios')
+    AND name = 'FechaEnvio'
+)
+BEGIN
+    ALTER TABLE NotificacionDestinatarios
+    ADD FechaEnvio DATETIME2(0) NULL,
+        Intentos INT NOT NULL CONSTRAINT DF_NotificacionDestinatarios_Intentos DEFAULT 0,
+        UltimoError NVARCHAR(500) NULL;
+    PRINT 'Columnas FechaEnvio, Intentos y UltimoError agregadas correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'Las columnas FechaEnvio, Intentos y UltimoError ya existen';
+END
+GO
+
+-- Los destinatarios migrados de notificaciones ya procesadas se consideran entregados
+UPDATE d
+SET Estado = 'enviado', FechaEnvio = COALESCE(n.Fecha_Envio, d.FechaCreacion)
+FROM NotificacionDestinatarios d
+INNER JOIN Notificaciones n ON n.IdNotificacion = d.IdNotificacion
+WHERE d.Estado = 'pendiente'
+  AND d.FechaEnvio IS NULL
+  AND n.Estado NOT IN ('pendiente', 'procesando');
+GO
+
+-- Índice filtrado para leer solo los destinatarios sin entregar de una notificación
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_NotificacionDestinatarios_SinEntregar'
+    AND object_id = OBJECT_ID('NotificacionDestinatarios')
+)
+BEGIN
+    CREATE INDEX IX_NotificacionDestinatarios_SinEntregar
+    ON NotificacionDestinatarios(IdNotificacion)
+    INCLUDE (EmailDestinatario, Estado, Intentos)
+    WHERE Estado <> 'enviado';
+    PRINT 'Índice IX_NotificacionDestinatarios_SinEntregar creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_NotificacionDestinatarios_SinEntregar ya existe';
+END
+GO
+
+PRINT 'Seguimiento de envío por destinatario configurado';
@@ -0,0 +1,50 @@
+-- Script para crear la tabla de resumen diario que lee el dashboard
+-- Ejecutar en SQL Server Management Studio
+-- La tabla la completa el procesador (app/services/resumen_diario_service.py): en la primera
+-- ejecución consolida todo el historial y después recalcula solo los últimos días cerrados.
+--
+-- Una fila por día de envío, tipo, estado y medio con la cantidad de notificaciones.
+-- El día en curso no se guarda: el dashboard lo calcula en vivo desde Notificaciones.
+
+IF OBJECT_ID('Notificaciones_ResumenDiario') IS NULL
+BEGIN
+    CREATE TABLE Notificaciones_ResumenDiario (
+        Fecha DATE NOT NULL,
+        IdTipoNotificacion INT NULL,
+        Estado NVARCHAR(50) NULL,
+        Medio NVARCHAR(20) NOT NULL,
+        Cantidad INT NOT NULL,
+        FechaActualizacion DATETIME2(0) NOT NULL CONSTRAINT DF_Notificaciones_ResumenDiario_FechaActualizacion DEFAULT GETDATE()
+    );
+
+    CREATE CLUSTERED INDEX IX_Notificaciones_ResumenDiario_Fecha
+    ON Notificaciones_ResumenDiario(Fecha, IdTipoNotificacion, Estado, Medio);
+    PRINT 'Tabla Notificaciones_ResumenDiario creada correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla Notificaciones_ResumenDiario ya existe';
+END
+GO
+
+-- Índice para el recálculo de los días cerrados y para el día en curso del dashboard
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Notificaciones_Fecha_Envio'
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_Fecha_Envio
+    ON Notificaciones(Fecha_Envio)
+    INCLUDE (IdTipoNotificacion, Estado, Medio)
+    WHERE Fecha_Envio IS NOT NULL;
+    PRINT 'Índice IX_Notificaciones_Fecha_Envio creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_Fecha_Envio ya existe';
+END
+GO
+
+PRINT 'Resumen diario configurado';
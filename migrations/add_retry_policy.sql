@@ -0,0 +1,64 @@
+-- Script para agregar reintentos con backoff exponencial a las notificaciones
+-- Ejecutar en SQL Server Management Studio
+-- Requiere migrations/add_claim_lease.sql
+--
+-- Intentos:        envíos realizados de la notificación
+-- ProximoIntento:  cuándo se puede volver a reclamar una notificación en estado 'reintentar'
+-- UltimoErrorTipo: clase del último error (por ejemplo ErrorEnvio)
+-- Estados nuevos:  'reintentar' (esperando el próximo intento) y 'fallido' (sin más reintentos)
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.columns
+    WHERE object_id = OBJECT_ID('Notificaciones')
+    AND name = 'Intentos'
+)
+BEGIN
+    ALTER TABLE Notificaciones
+    ADD Intentos INT NOT NULL CONSTRAINT DF_Notificaciones_Intentos DEFAULT 0,
+        ProximoIntento DATETIME2(0) NULL,
+        UltimoErrorTipo NVARCHAR(100) NULL;
+    PRINT 'Columnas Intentos, ProximoIntento y UltimoErrorTipo agregadas correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'Las columnas de reintentos ya existen';
+END
+GO
+
+-- Agregar los estados 'reintentar' y 'fallido' al CHECK constraint de Estado
+IF EXISTS (
+    SELECT 1
+    FROM sys.check_constraints
+    WHERE name = 'CHK_Notificaciones_Estado'
+)
+BEGIN
+    ALTER TABLE Notificaciones DROP CONSTRAINT CHK_Notificaciones_Estado;
+END
+
+ALTER TABLE Notificaciones
+ADD CONSTRAINT CHK_Notificaciones_Estado
+CHECK (Estado IN ('pendiente', 'procesando', 'reintentar', 'enviado', 'recibido', 'error', 'parcial', 'fallido', 'cancelado', 'resuelto'));
+GO
+
+-- Índice filtrado para que el reclamo de reintentos vencidos solo lea las filas en espera
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Notificaciones_Reintentos'
+    AND object_id = OBJECT_ID('Notificaciones')
+)
+BEGIN
+    CREATE INDEX IX_Notificaciones_Reintentos
+    ON Notificaciones(Medio, ProximoIntento)
+    WHERE Estado = 'reintentar';
+    PRINT 'Índice IX_Notificaciones_Reintentos creado correctamente';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Notificaciones_Reintentos ya existe';
+END
+GO
+
+PRINT 'Script ejecutado correctamente';
+PRINT 'Estados válidos: pendiente, procesando, reintentar, enviado, recibido, error, parcial, fallido, cancelado, resuelto';
@@ -0,0 +1,74 @@
+-- Completa las columnas estructuradas de las filas de Auditoria anteriores a
+-- migrations/add_auditoria_estructurada.sql, leyendo el "ID_<n>: ..." de detalle.
+-- Ejecutar en SQL Server Management Studio (se puede cortar y volver a ejecutar: sigue donde quedó)
+--
+-- Actualiza de a @lote filas, cada lote en su propia transacción corta y con una pausa
+-- entre lotes para no bloquear a los procesadores ni al servidor web.
+-- IdAlerta y Medio se toman de la notificación (si todavía existe);
+-- Resultado se deduce de la acción registrada.
+
+SET NOCOUNT ON;
+
+-- Índice temporal para que cada lote encuentre las filas pendientes sin recorrer las ya completadas
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes
+    WHERE name = 'IX_Auditoria_Backfill'
+    AND object_id = OBJECT_ID('Auditoria')
+)
+BEGIN
+    CREATE INDEX IX_Auditoria_Backfill
+    ON Auditoria(fecha_aud)
+    INCLUDE (accion, detalle)
+    WHERE IdNotificacion IS NULL;
+END
+
+DECLARE @lote INT = 5000;
+DECLARE @filas INT = 1;
+DECLARE @total INT = 0;
+
+WHILE @filas > 0
+BEGIN
+    UPDATE TOP (@lote) a
+    SET IdNotificacion = p.IdNotificacion,
+        IdAlerta = n.IdAlerta,
+        Medio = n.Medio,
+        Resultado = CASE
+            WHEN a.accion = 'NOTIFICACION_ENVIADA' THEN
+                -- "x/y enviados": parcial si no se entregó a todos
+                CASE WHEN p.Texto LIKE '[0-9]%/[0-9]% enviados%' THEN
+                    CASE WHEN LEFT(p.Texto, CHARINDEX('/', p.Texto) - 1)
+                              <> SUBSTRING(p.Texto, CHARINDEX('/', p.Texto) + 1, CHARINDEX(' ', p.Texto) - CHARINDEX('/', p.Texto) - 1)
+                         THEN 'parcial' ELSE 'enviado' END
+                ELSE 'enviado' END
+            WHEN a.accion = 'NOTIFICACION_WHATSAPP_ENVIADA' THEN 'enviado'
+            WHEN a.accion LIKE 'ERROR_NOTIFICACION%' THEN 'error'
+            WHEN a.accion = 'REINTENTO_PROGRAMADO' THEN 'reintentar'
+            WHEN a.accion = 'NOTIFICACION_FALLIDA' THEN 'fallido'
+            WHEN a.accion = 'NOTIFICACION_SUPRIMIDA' THEN 'suprimido'
+            WHEN a.accion = 'MARKED_RECEIVED' THEN 'recibido'
+            WHEN a.accion IN ('NOTIFICACION_RESUELTA', 'ALERTAS_PENDIENTES_RESUELTAS') THEN 'resuelto'
+            WHEN a.accion IN ('NOTIFICATION_CANCELLED', 'ALERTAS_PENDIENTES_CANCELADAS') THEN 'cancelado'
+        END
+    FROM Auditoria a
+    CROSS APPLY (SELECT CHARINDEX(':', a.detalle) AS Pos) c
+    CROSS APPLY (
+        SELECT TRY_CAST(SUBSTRING(a.detalle, 4, CASE WHEN c.Pos > 4 THEN c.Pos - 4 ELSE 0 END) AS INT) AS IdNotificacion,
+               LTRIM(SUBSTRING(a.detalle, c.Pos + 1, 200)) AS Texto
+    ) p
+    LEFT JOIN Notificaciones n ON n.IdNotificacion = p.IdNotificacion
+    WHERE a.IdNotificacion IS NULL
+      AND a.detalle LIKE 'ID[_][0-9]%:%'
+      AND p.IdNotificacion IS NOT NULL;
+
+    SET @filas = @@ROWCOUNT;
+    SET @total += @filas;
+    RAISERROR('Auditoria: %d filas completadas', 0, 1, @total) WITH NOWAIT;
+
+    IF @filas > 0
+        WAITFOR DELAY '00:00:00.200';
+END
+
+DROP INDEX IX_Auditoria_Backfill ON Auditoria;
+
+PRINT 'Backfill de Auditoria terminado';
@@ -2,7 +2,8 @@
 Script para procesar y enviar notificaciones de WhatsApp pendientes
 """
 import logging
-from app.services.alertas_service import ProcesadorNotificaciones
+from app.services.alertas_service import ProcesadorNotificaciones, DespachoWhatsApp
+from app.services.auditoria_service import auditoria
 
 # Configurar logging
 logging.basicConfig(
@@ -16,7 +17,11 @@ if __name__ == "__main__":
     print("="*80 + "\n")
     
     # Procesar todas las notificaciones de WhatsApp pendientes
-    ProcesadorNotificaciones.procesar_whatsapp_pendientes()
+    try:
+        ProcesadorNotificaciones.procesar_whatsapp_pendientes()
+    finally:
+        DespachoWhatsApp.cerrar()
+        auditoria.cerrar()
     
     print("\n" + "="*80)
     print("✅ PROCESO COMPLETADO".center(80))
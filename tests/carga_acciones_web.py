@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de las rutas de acción del servidor web (los botones de los emails).
+Simula la ráfaga de clics de una lista de distribución grande: varios clientes concurrentes
+con conexiones keep-alive, y muestra throughput, latencias (p50/p90/p99) y códigos de respuesta.
+
+Con ACTION_TOKEN_KEYS configurado se firman tokens válidos para las notificaciones indicadas;
+con --token-invalido se mide el rechazo en memoria (no toca la base).
+Las acciones válidas cambian el estado de las notificaciones: usar una base de prueba.
+
+Uso:
+    python tests/carga_acciones_web.py --ids 1-200 --peticiones 5000 --concurrencia 100
+    python tests/carga_acciones_web.py --token-invalido --peticiones 20000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import http.client
+from pathlib import Path
+from collections import Counter
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.utils.tokens_accion import firmador_tokens, ACCIONES
+
+
+def parsear_ids(texto):
+    """'1-100' o '5,8,13' → lista de ids"""
+    ids = []
+    for parte in texto.split(','):
+        inicio, _, fin = parte.partition('-')
+        ids.extend(range(int(inicio), int(fin or inicio) + 1))
+    return ids
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+class Cliente(threading.local):
+    """Una conexión keep-alive por hilo, como un navegador o proxy que reutiliza la conexión"""
+    conexion = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de las rutas de acción de web_server.py')
+    parser.add_argument('--url', default=os.getenv('BASE_URL', 'http://127.0.0.1:5000'), help='URL base del servidor')
+    parser.add_argument('--ids', default='1-100', help="Notificaciones a usar: '1-100' o '5,8,13'")
+    parser.add_argument('--accion', choices=ACCIONES, default='received', help='Acción a ejecutar')
+    parser.add_argument('--peticiones', type=int, default=2000, help='Cantidad total de peticiones')
+    parser.add_argument('--concurrencia', type=int, default=50, help='Clientes concurrentes')
+    parser.add_argument('--token-invalido', action='store_true', help='Usar tokens falsos (rechazo sin base de datos)')
+    parser.add_argument('--timeout', type=float, default=30, help='Timeout por petición en segundos')
+    args = parser.parse_args()
+
+    destino = urlsplit(args.url)
+    ids = parsear_ids(args.ids)
+
+    if args.token_invalido:
+        tokens = {i: 'falso.token' for i in ids}
+    elif firmador_tokens.habilitado:
+        tokens = {i: firmador_tokens.firmar(i, args.accion) for i in ids}
+    else:
+        print("❌ ACTION_TOKEN_KEYS no está configurado: usa --token-invalido o configura las claves")
+        return 1
+
+    cliente = Cliente()
+
+    def peticion(_):
+        id_notificacion = random.choice(ids)
+        ruta = f"/notifications/{id_notificacion}/{args.accion}?token={tokens[id_notificacion]}"
+        inicio = time.perf_counter()
+        try:
+            if cliente.conexion is None:
+                cliente.conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=args.timeout)
+            cliente.conexion.request('GET', ruta)
+            respuesta = cliente.conexion.getresponse()
+            respuesta.read()
+            estado = respuesta.status
+            if respuesta.getheader('Connection', '').lower() == 'close':
+                cliente.conexion.close()
+                cliente.conexion = None
+        except Exception as e:
+            if cliente.conexion is not None:
+                cliente.conexion.close()
+                cliente.conexion = None
+            estado = type(e).__name__
+        return time.perf_counter() - inicio, estado
+
+    print("=" * 80)
+    print(f"CARGA: {args.peticiones} peticiones '{args.accion}' a {args.url} con {args.concurrencia} clientes")
+    print("=" * 80)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as executor:
+        resultados = list(executor.map(peticion, range(args.peticiones)))
+    duracion = time.perf_counter() - inicio
+
+    latencias = sorted(latencia * 1000 for latencia, _ in resultados)
+    codigos = Counter(estado for _, estado in resultados)
+
+    print(f"\n⏱️  Duración: {duracion:.2f} s  |  Throughput: {len(resultados) / duracion:.1f} peticiones/s")
+    print(f"📈 Latencia (ms): p50 {percentil(latencias, 50):.1f}  p90 {percentil(latencias, 90):.1f}  "
+          f"p99 {percentil(latencias, 99):.1f}  máx {latencias[-1]:.1f}")
+    print("📊 Respuestas:")
+    for estado, cantidad in codigos.most_common():
+        print(f"   {estado}: {cantidad}")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Script para medir el tiempo de importación (arranque en frío) de cada punto de entrada
+usando `python -X importtime`. Muestra el tiempo total y los paquetes que más pesan.
+
+Uso:
+    python tests/medir_tiempo_arranque.py
+    python tests/medir_tiempo_arranque.py --top 15 main procesar_whatsapp
+"""
+
+import re
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+# Directorio raíz del proyecto (donde están los puntos de entrada)
+root_dir = Path(__file__).parent.parent
+
+PUNTOS_DE_ENTRADA = ['main', 'procesar_whatsapp', 'web_server']
+
+# Formato de cada línea: "import time:   self [us] | cumulative | imported package"
+LINEA_IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def medir(modulo):
+    """
+    Importa el módulo en un intérprete nuevo con -X importtime.
+    Retorna (lista de (cumulative_us, paquete), total_us, error).
+    """
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+        cwd=root_dir, capture_output=True, text=True
+    )
+
+    paquetes = []
+    total_us = 0
+    otras_lineas = []
+    for linea in proceso.stderr.splitlines():
+        coincidencia = LINEA_IMPORTTIME.match(linea)
+        if not coincidencia:
+            otras_lineas.append(linea)
+            continue
+        propio, acumulado, sangria, nombre = coincidencia.groups()
+        total_us += int(propio)
+        # Imports de primer nivel y los directos del punto de entrada
+        # (su acumulado ya incluye a sus dependencias)
+        if len(sangria) <= 3 and nombre != modulo:
+            paquetes.append((int(acumulado), nombre))
+
+    error = None
+    if proceso.returncode != 0:
+        error = otras_lineas[-1] if otras_lineas else f"código de salida {proceso.returncode}"
+    return paquetes, total_us, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mide el tiempo de importación de los puntos de entrada')
+    parser.add_argument('modulos', nargs='*', default=PUNTOS_DE_ENTRADA,
+                        help='Módulos a medir (por defecto: todos los puntos de entrada)')
+    parser.add_argument('--top', type=int, default=10, help='Cantidad de paquetes a mostrar')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("TIEMPO DE ARRANQUE POR PUNTO DE ENTRADA (python -X importtime)")
+    print("=" * 80)
+
+    for modulo in args.modulos:
+        paquetes, total_us, error = medir(modulo)
+
+        print(f"\n📦 {modulo}: {total_us / 1000:.1f} ms en imports")
+        if error:
+            print(f"   ⚠️ La importación terminó con error: {error}")
+
+        for acumulado, nombre in sorted(paquetes, reverse=True)[:args.top]:
+            print(f"   {acumulado / 1000:>9.1f} ms  {nombre}")
+
+    print()
+
+
+if __name__ == "__main__":
+    main()
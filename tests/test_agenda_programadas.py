@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime, timedelta
+
+from app.services import agenda_programadas
+from app.services.agenda_programadas import AgendaProgramadas
+
+
+class NotificacionesEnMemoria:
+    """Reemplazo de db_config con la tabla Notificaciones en memoria y el reloj del servidor"""
+
+    def __init__(self, ahora):
+        self.ahora = ahora
+        self.filas = []  # (IdNotificacion, Fecha_Programada, Estado)
+        self.consultas = 0
+
+    def agregar(self, fecha, estado='pendiente'):
+        self.filas.append((len(self.filas) + 1, fecha, estado))
+
+    def execute_query(self, query, params=None):
+        if 'GETDATE()' in query:
+            return [{'MaxId': max((f[0] for f in self.filas), default=None), 'Ahora': self.ahora}]
+        self.consultas += 1
+        desde, hasta, ultimo_id, hasta_anterior = params
+        return [{'IdNotificacion': id_notif, 'Fecha_Programada': fecha}
+                for id_notif, fecha, estado in self.filas
+                if estado == 'pendiente' and desde < fecha <= hasta
+                and (id_notif > ultimo_id or fecha > hasta_anterior)]
+
+
+class TestAgendaProgramadas(unittest.TestCase):
+    """Pruebas de la agenda en memoria de agenda_programadas.py"""
+
+    def setUp(self):
+        self.db_config = agenda_programadas.db_config
+        # Reloj del servidor una hora adelantado respecto del equipo
+        self.base = NotificacionesEnMemoria(datetime.now().replace(microsecond=0) + timedelta(hours=1))
+        agenda_programadas.db_config = self.base
+        self.agenda = AgendaProgramadas(ventana_segundos=600)
+
+    def tearDown(self):
+        agenda_programadas.db_config = self.db_config
+
+    def minutos(self, n):
+        return self.base.ahora + timedelta(minutes=n)
+
+    def test_ordena_por_fecha_programada(self):
+        for n in (8, 2, 5, 30):
+            self.base.agregar(self.minutos(n))
+        self.base.agregar(self.minutos(1), estado='enviado')
+
+        self.assertEqual(self.agenda.refrescar(), 3)
+        self.assertEqual([fecha for fecha, _ in sorted(self.agenda._heap)],
+                         [self.minutos(2), self.minutos(5), self.minutos(8)])
+        # Medido con el reloj del servidor, no con el local
+        self.assertAlmostEqual(self.agenda.segundos_hasta_proxima(), 120, delta=2)
+
+        self.agenda._desfase += timedelta(minutes=6)
+        self.assertEqual(self.agenda.descartar_vencidas(), 2)
+        self.assertAlmostEqual(self.agenda.segundos_hasta_proxima(), 120, delta=2)
+
+    def test_refresco_incremental(self):
+        self.base.agregar(self.minutos(3))
+        self.base.agregar(self.minutos(15))  # fuera de la ventana de 10 minutos
+        self.assertEqual(self.agenda.refrescar(), 1)
+
+        # Nuevas: una dentro de la ventana ya cargada y la que entra al extender la ventana
+        self.base.agregar(self.minutos(8))
+        self.base.ahora = self.minutos(6)
+        self.assertEqual(self.agenda.refrescar(), 2)
+        self.assertEqual(sorted(id_notif for _, id_notif in self.agenda._heap), [1, 2, 3])
+
+        # Sin cambios no se vuelve a agregar nada
+        self.assertEqual(self.agenda.refrescar(), 0)
+        self.assertEqual(len(self.agenda._heap), 3)
+
+    def test_sin_programadas(self):
+        self.assertEqual(self.agenda.refrescar(), 0)
+        self.assertIsNone(self.agenda.segundos_hasta_proxima())
+        self.assertEqual(self.agenda.descartar_vencidas(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import time
+import tempfile
+import unittest
+
+from app.services.auditoria_service import AuditoriaAsincrona
+
+
+class AuditoriaEnMemoria(AuditoriaAsincrona):
+    """Escritor que inserta en una lista en lugar de la tabla Auditoria"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.insertados = []
+        self.base_disponible = True
+
+    def _insertar(self, registros):
+        if not self.base_disponible:
+            raise ConnectionError("base no disponible")
+        self.insertados.append(list(registros))
+
+
+class HiloDetenido:
+    """Hilo que figura vivo pero no consume la cola"""
+
+    def is_alive(self):
+        return True
+
+
+class TestAuditoriaAsincrona(unittest.TestCase):
+    """Pruebas del escritor de auditoría en segundo plano de auditoria_service.py"""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.archivo = os.path.join(self.directorio.name, 'auditoria_pendiente.jsonl')
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def crear(self, **kwargs):
+        kwargs.setdefault('intervalo', 0.05)
+        kwargs.setdefault('archivo', self.archivo)
+        auditoria = AuditoriaEnMemoria(**kwargs)
+        self.addCleanup(auditoria.cerrar)
+        return auditoria
+
+    def test_inserta_en_bloque_al_cerrar(self):
+        auditoria = self.crear(tamano_lote=100, intervalo=60)
+        for i in range(10):
+            auditoria.registrar('ACCION', f'ID_{i}: prueba')
+        self.assertEqual(auditoria.insertados, [])
+        auditoria.cerrar()
+        self.assertEqual(sum(len(lote) for lote in auditoria.insertados), 10)
+        self.assertEqual(len(auditoria.insertados), 1)
+
+    def test_vacia_por_tamano_de_lote(self):
+        auditoria = self.crear(tamano_lote=5, intervalo=60)
+        for i in range(5):
+            auditoria.registrar('ACCION', f'ID_{i}: prueba')
+        limite = time.monotonic() + 2
+        while not auditoria.insertados and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertEqual(len(auditoria.insertados[0]), 5)
+
+    def test_archivo_local_si_la_base_no_responde(self):
+        auditoria = self.crear()
+        auditoria.base_disponible = False
+        auditoria.registrar('ACCION', 'ID_1: sin base')
+        limite = time.monotonic() + 2
+        while not os.path.exists(self.archivo) and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(self.archivo))
+
+        # Cuando la base vuelve, el archivo se inserta y se elimina
+        auditoria.base_disponible = True
+        auditoria.registrar('ACCION', 'ID_2: con base')
+        auditoria.cerrar()
+        detalles = [r[1] for lote in auditoria.insertados for r in lote]
+        self.assertCountEqual(detalles, ['ID_1: sin base', 'ID_2: con base'])
+        self.assertFalse(os.path.exists(self.archivo))
+        self.assertFalse(os.path.exists(self.archivo + '.reproceso'))
+
+    def test_cola_llena_descartar(self):
+        auditoria = self.crear(capacidad=1, politica='descartar', intervalo=60, tamano_lote=100)
+        # Sin hilo consumidor la cola se llena enseguida
+        auditoria._hilo = HiloDetenido()
+        auditoria.registrar('ACCION', 'ID_1: entra')
+        auditoria.registrar('ACCION', 'ID_2: se descarta')
+        self.assertEqual(auditoria.descartados, 1)
+        auditoria._hilo = None
+
+    def test_el_hilo_sobrevive_a_un_error_del_archivo(self):
+        auditoria = self.crear()
+        auditoria.registrar('ACCION', 'ID_1: antes')
+        # Un error de E/S al reprocesar no debe detener al escritor
+        auditoria._reprocesar_archivo = lambda: (_ for _ in ()).throw(OSError("disco"))
+        auditoria._hay_archivo = lambda: True
+        auditoria.registrar('ACCION', 'ID_2: durante')
+        time.sleep(0.2)
+        self.assertTrue(auditoria._hilo.is_alive())
+        auditoria.cerrar()
+        detalles = [r[1] for lote in auditoria.insertados for r in lote]
+        self.assertCountEqual(detalles, ['ID_1: antes', 'ID_2: durante'])
+
+    def test_reinicia_el_hilo_si_se_detuvo(self):
+        auditoria = self.crear()
+        auditoria.registrar('ACCION', 'ID_1: primero')
+        primero = auditoria._hilo
+        auditoria._cola.put(None)
+        primero.join(2)
+        self.assertFalse(primero.is_alive())
+        auditoria.registrar('ACCION', 'ID_2: segundo')
+        self.assertIsNot(auditoria._hilo, primero)
+        auditoria.cerrar()
+        detalles = [r[1] for lote in auditoria.insertados for r in lote]
+        self.assertCountEqual(detalles, ['ID_1: primero', 'ID_2: segundo'])
+
+    def test_archivo_por_proceso_y_adopcion_de_huerfanos(self):
+        os.environ['AUDITORIA_DIRECTORIO_PENDIENTE'] = self.directorio.name
+        self.addCleanup(os.environ.pop, 'AUDITORIA_DIRECTORIO_PENDIENTE')
+        auditoria = AuditoriaEnMemoria(intervalo=0.05)
+        self.addCleanup(auditoria.cerrar)
+        self.assertIn(str(os.getpid()), os.path.basename(auditoria.archivo))
+        self.assertTrue(os.path.isabs(auditoria.archivo))
+
+        # Archivo que dejó otro proceso y que nadie modifica hace rato
+        huerfano = os.path.join(self.directorio.name, 'auditoria_pendiente_999999.jsonl')
+        with open(huerfano, 'w', encoding='utf-8') as f:
+            f.write('{"accion": "ACCION", "detalle": "ID_9: huerfano", "fecha": "2026-01-01T00:00:00"}\n')
+        viejo = time.time() - auditoria.huerfano - 1
+        os.utime(huerfano, (viejo, viejo))
+
+        auditoria.registrar('ACCION', 'ID_1: actual')
+        auditoria.cerrar()
+        detalles = [r[1] for lote in auditoria.insertados for r in lote]
+        self.assertCountEqual(detalles, ['ID_9: huerfano', 'ID_1: actual'])
+        self.assertEqual(os.listdir(self.directorio.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
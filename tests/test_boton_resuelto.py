@@ -8,6 +8,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.notification_actions_service import NotificationActionsService
+from app.services.auditoria_service import auditoria
 from app.services.email_service import EmailService  
 from app.utils.database_config import db_config
 from datetime import datetime, timedelta
@@ -131,11 +132,13 @@ def test_resolved_functionality():
         audit_query = """
         SELECT accion, detalle, fecha_aud 
         FROM Auditoria 
-        WHERE detalle LIKE ? 
+        WHERE IdNotificacion = ? 
         ORDER BY fecha_aud DESC
         """
         
-        audit_results = db_config.execute_query(audit_query, [f'%{notification_id}%'])
+        # El escritor de auditoría inserta en segundo plano: vaciarlo antes de consultar
+        auditoria.cerrar()
+        audit_results = db_config.execute_query(audit_query, [notification_id])
         
         if audit_results:
             for audit in audit_results[:2]:  # Mostrar últimos 2
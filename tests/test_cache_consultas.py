@@ -0,0 +1,90 @@
+import time
+import unittest
+
+from app.utils.cache_consultas import CacheConsultas
+
+
+class Cargador:
+    """Función de carga que cuenta sus llamadas"""
+
+    def __init__(self, valor='v'):
+        self.valor = valor
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        return f'{self.valor}{self.llamadas}'
+
+
+class TestCacheConsultas(unittest.TestCase):
+    """Pruebas del cache con TTL de cache_consultas.py"""
+
+    def esperar(self, condicion, segundos=2):
+        limite = time.monotonic() + segundos
+        while not condicion() and time.monotonic() < limite:
+            time.sleep(0.01)
+        return condicion()
+
+    def test_aciertos_y_fallos(self):
+        cache = CacheConsultas(ttl=60, intervalo_refresco=60)
+        cargar = Cargador()
+        self.assertEqual(cache.obtener('a', cargar), 'v1')
+        self.assertEqual(cache.obtener('a', cargar), 'v1')
+        self.assertEqual(cargar.llamadas, 1)
+        estadisticas = cache.estadisticas()
+        self.assertEqual((estadisticas['aciertos'], estadisticas['fallos']), (1, 1))
+
+    def test_vence_por_ttl(self):
+        cache = CacheConsultas(ttl=0.05, intervalo_refresco=60)
+        cargar = Cargador()
+        cache.obtener('a', cargar)
+        time.sleep(0.06)
+        self.assertEqual(cache.obtener('a', cargar), 'v2')
+
+    def test_tamano_maximo_desaloja_la_menos_usada(self):
+        cache = CacheConsultas(ttl=60, max_entradas=2, intervalo_refresco=60)
+        cargadores = {clave: Cargador(clave) for clave in 'abc'}
+        cache.obtener('a', cargadores['a'])
+        cache.obtener('b', cargadores['b'])
+        cache.obtener('a', cargadores['a'])
+        cache.obtener('c', cargadores['c'])
+        self.assertEqual(cache.estadisticas()['entradas'], 2)
+        cache.obtener('a', cargadores['a'])
+        cache.obtener('b', cargadores['b'])
+        self.assertEqual(cargadores['a'].llamadas, 1)
+        self.assertEqual(cargadores['b'].llamadas, 2)
+
+    def test_invalidar_recarga_en_segundo_plano(self):
+        cache = CacheConsultas(ttl=60, intervalo_refresco=60)
+        cargar = Cargador()
+        cache.obtener('a', cargar)
+        cache.invalidar()
+        self.assertTrue(self.esperar(lambda: cargar.llamadas == 2))
+        self.assertTrue(self.esperar(lambda: cache.estadisticas()['refrescos'] == 1))
+        # El valor recargado se sirve sin volver a consultar
+        self.assertEqual(cache.obtener('a', cargar), 'v2')
+        self.assertEqual(cargar.llamadas, 2)
+
+    def test_refresco_periodico_mantiene_vigente(self):
+        cache = CacheConsultas(ttl=0.2, intervalo_refresco=0.05)
+        cargar = Cargador()
+        cache.obtener('a', cargar)
+        time.sleep(0.3)
+        cache.obtener('a', cargar)
+        self.assertEqual(cache.estadisticas()['fallos'], 1)
+
+    def test_error_en_el_refresco_conserva_el_valor(self):
+        cache = CacheConsultas(ttl=60, intervalo_refresco=60)
+        cache.obtener('a', lambda: 'v1')
+
+        def falla():
+            raise ConnectionError("base no disponible")
+
+        cache._entradas['a'][2] = falla
+        cache._despertar.set()
+        self.assertTrue(self.esperar(lambda: cache.estadisticas()['errores_refresco'] >= 1))
+        self.assertEqual(cache.obtener('a', falla), 'v1')
+
+
+if __name__ == '__main__':
+    unittest.main()
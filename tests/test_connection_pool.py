@@ -0,0 +1,128 @@
+import unittest
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Configuración básica del logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+logger = logging.getLogger(__name__)
+
+class TestConnectionPool(unittest.TestCase):
+    """Pruebas del pool de conexiones compartido de database_config.py"""
+
+    def setUp(self):
+        """Preparar el entorno para las pruebas"""
+        load_dotenv()
+
+        required_vars = ['DB_HOST', 'DB_NAME', 'DB_USER', 'DB_PASSWORD']
+        missing_vars = [var for var in required_vars if not os.getenv(var)]
+
+        if missing_vars:
+            self.skipTest(f"Faltan variables de entorno: {', '.join(missing_vars)}")
+
+        from app.utils.database_config import db_config
+        self.db_config = db_config
+
+    def test_reutiliza_conexiones(self):
+        """Varias consultas seguidas deben reutilizar la misma conexión"""
+        antes = self.db_config.get_pool_stats()
+
+        for _ in range(5):
+            resultado = self.db_config.execute_query("SELECT 1 AS test_value")
+            self.assertEqual(resultado[0]['test_value'], 1)
+
+        despues = self.db_config.get_pool_stats()
+        self.assertEqual(despues['checkouts'] - antes['checkouts'], 5)
+        self.assertLessEqual(despues['creations'] - antes['creations'], 1)
+        logger.info(f"✅ Estadísticas del pool: {despues}")
+
+    def test_concurrencia_respeta_max_size(self):
+        """Consultas concurrentes nunca superan el tamaño máximo del pool"""
+        errores = []
+
+        def consultar():
+            try:
+                self.db_config.execute_query("SELECT 1 AS test_value")
+            except Exception as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=consultar) for _ in range(20)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        stats = self.db_config.get_pool_stats()
+        self.assertEqual(errores, [])
+        self.assertLessEqual(stats['size'], stats['max_size'])
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_conexion_rota_se_descarta(self):
+        """Una conexión que murió mientras estaba en el pool se reemplaza al entregarla"""
+        pool = self.db_config.pool
+        conn = pool.acquire()
+        # Se devuelve al pool como si siguiera sana; después se corta (p. ej. el servidor la cerró)
+        pool.release(conn)
+        conn.close()
+        antes = pool.get_stats()
+
+        resultado = self.db_config.execute_query("SELECT 1 AS test_value")
+        self.assertEqual(resultado[0]['test_value'], 1)
+
+        despues = pool.get_stats()
+        self.assertEqual(despues['health_check_failures'] - antes['health_check_failures'], 1)
+        self.assertEqual(despues['creations'] - antes['creations'], 1)
+
+    def test_reemplaza_conexion_cortada_por_el_servidor(self):
+        """Con conexiones simuladas: la que deja de responder se descarta en el checkout"""
+        from app.utils.database_config import ConnectionPool
+
+        class ConexionSimulada:
+            def __init__(self):
+                self.viva = True
+                self.cerrada = False
+
+            def cursor(self):
+                conexion = self
+
+                class Cursor:
+                    def execute(self, sql):
+                        if not conexion.viva:
+                            raise ConnectionError("Communication link failure")
+
+                    def fetchone(self):
+                        return (1,)
+
+                    def close(self):
+                        pass
+
+                return Cursor()
+
+            def close(self):
+                self.cerrada = True
+
+        creadas = []
+
+        def crear():
+            creadas.append(ConexionSimulada())
+            return creadas[-1]
+
+        pool = ConnectionPool(crear, max_size=1)
+        primera = pool.acquire()
+        pool.release(primera)
+        primera.viva = False
+
+        segunda = pool.acquire()
+        self.assertIsNot(segunda, primera)
+        self.assertTrue(primera.cerrada)
+        self.assertEqual(len(creadas), 2)
+        stats = pool.get_stats()
+        self.assertEqual((stats['health_check_failures'], stats['size']), (1, 1))
+        pool.release(segunda)
+
+if __name__ == '__main__':
+    print("\n🔍 Ejecutando pruebas del pool de conexiones...")
+    unittest.main()
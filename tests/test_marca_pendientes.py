@@ -0,0 +1,163 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from app.services import alertas_service
+from app.services.alertas_service import MarcaPendientes, NotificacionesService
+
+
+class MarcaEnMemoria(MarcaPendientes):
+    """Marca de agua que lee el máximo ID y la hora de atributos en lugar de la base"""
+
+    def __init__(self):
+        super().__init__()
+        self.max_id = 0
+        self.ahora = datetime(2026, 1, 1, 12, 0)
+
+    def _consultar_marca(self):
+        return self.max_id, self.ahora
+
+    def ciclo(self, max_id, minutos=1):
+        """Inicia un ciclo con max_id filas y el reloj del servidor adelantado"""
+        self.max_id = max_id
+        self.ahora += timedelta(minutes=minutos)
+        self.iniciar_ciclo()
+
+
+class BaseEnMemoria:
+    """Reemplazo de db_config que registra las sentencias y retorna filas fijas"""
+
+    def __init__(self, filas=()):
+        self.filas = list(filas)
+        self.sentencias = []
+
+    def execute_non_query(self, query, params=None):
+        self.sentencias.append((query, params))
+        return len(params or [])
+
+    def execute_query(self, query, params=None):
+        self.sentencias.append((query, params))
+        return self.filas
+
+
+class TestMarcaPendientes(unittest.TestCase):
+    """Pruebas de la marca de agua de pendientes de alertas_service.py"""
+
+    def test_primer_ciclo_es_barrido_completo(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(100)
+        self.assertEqual(marca.filtro_sql(), ("", []))
+        marca.finalizar_ciclo()
+        self.assertEqual(marca.ultimo_id, 100)
+
+    def test_filtro_incremental_despues_de_un_ciclo(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(100)
+        corte_anterior = marca.ahora
+        marca.finalizar_ciclo()
+
+        marca.ciclo(150)
+        filtro, params = marca.filtro_sql()
+        self.assertIn("n.IdNotificacion > ?", filtro)
+        # Lo nuevo desde el ciclo anterior: IDs mayores y programadas vencidas entre ambos cortes
+        self.assertEqual(params, [100, corte_anterior, marca.ahora])
+        marca.finalizar_ciclo()
+        self.assertEqual((marca.ultimo_id, marca.corte), (150, marca.ahora))
+
+    def test_tabla_vacia_no_saltea_filas(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(0)
+        marca.finalizar_ciclo()
+        marca.ciclo(0)
+        self.assertEqual(marca.filtro_sql()[1][0], 0)
+
+    def test_sin_marca_confiable_repite_barrido_completo(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(100)
+        marca.finalizar_ciclo()
+
+        def falla():
+            raise ConnectionError("base no disponible")
+
+        marca._consultar_marca = falla
+        marca.iniciar_ciclo()
+        self.assertEqual(marca.filtro_sql(), ("", []))
+        self.assertIsNone(marca.corte_ciclo)
+        marca.finalizar_ciclo()
+        self.assertIsNone(marca.ultimo_id)
+
+    def test_barrido_completo_periodico(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(100)
+        marca.finalizar_ciclo()
+        marca.ciclo(100)
+        self.assertNotEqual(marca.filtro_sql(), ("", []))
+        marca.finalizar_ciclo()
+
+        marca.ultimo_barrido = time.monotonic() - alertas_service.PROCESADOR_BARRIDO_COMPLETO_SEGUNDOS - 1
+        marca.ciclo(120)
+        self.assertEqual(marca.filtro_sql(), ("", []))
+        marca.finalizar_ciclo()
+        self.assertGreater(marca.ultimo_barrido, time.monotonic() - 5)
+        self.assertEqual(marca.ultimo_id, 120)
+
+    def test_invalidar_entre_ciclos(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(100)
+        marca.finalizar_ciclo()
+        # Por ejemplo, liberar_leases_expirados antes de iniciar el ciclo
+        marca.invalidar()
+        marca.ciclo(100)
+        self.assertEqual(marca.filtro_sql(), ("", []))
+        marca.finalizar_ciclo()
+        self.assertEqual(marca.ultimo_id, 100)
+
+    def test_invalidar_durante_el_ciclo_fuerza_barrido_completo(self):
+        marca = MarcaEnMemoria()
+        marca.ciclo(100)
+        marca.finalizar_ciclo()
+        barrido = marca.ultimo_barrido
+
+        marca.ciclo(200)
+        # Filas devueltas a 'pendiente' por debajo de la marca a mitad del ciclo
+        marca.invalidar()
+        marca.finalizar_ciclo()
+        self.assertIsNone(marca.ultimo_id)
+        self.assertEqual(marca.ultimo_barrido, barrido)
+
+        marca.ciclo(200)
+        self.assertEqual(marca.filtro_sql(), ("", []))
+        marca.finalizar_ciclo()
+        self.assertEqual(marca.ultimo_id, 200)
+
+
+class TestInvalidacionEnElCiclo(unittest.TestCase):
+    """Las filas que vuelven a 'pendiente' durante un ciclo se ven en el ciclo siguiente"""
+
+    def setUp(self):
+        self.marcas = dict(alertas_service.MARCAS_PENDIENTES)
+        self.db_config = alertas_service.db_config
+        self.marca = MarcaEnMemoria()
+        alertas_service.MARCAS_PENDIENTES['Email'] = self.marca
+        alertas_service.MARCAS_PENDIENTES['Whatsapp'] = MarcaEnMemoria()
+        alertas_service.db_config = self.base = BaseEnMemoria()
+
+        self.marca.ciclo(100)
+        self.marca.finalizar_ciclo()
+        self.marca.ciclo(200)
+
+    def tearDown(self):
+        alertas_service.MARCAS_PENDIENTES.update(self.marcas)
+        alertas_service.db_config = self.db_config
+
+    def test_posponer_sin_tipo_fuerza_barrido_completo(self):
+        NotificacionesService._posponer_sin_tipo([50, 51], 'procesando')
+        self.marca.finalizar_ciclo()
+
+        self.assertIn("SET Estado = 'pendiente'", self.base.sentencias[0][0])
+        self.marca.ciclo(200)
+        self.assertEqual(self.marca.filtro_sql(), ("", []))
+
+
+if __name__ == '__main__':
+    unittest.main()
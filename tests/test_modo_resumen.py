@@ -0,0 +1,150 @@
+import unittest
+
+from app.services import alertas_service
+from app.services.alertas_service import NotificacionesService, ProcesadorNotificaciones, ResumenesPendientes
+from app.services.email_service import EmailService
+
+
+def notificacion(id_notificacion, asunto=None):
+    return {'IdNotificacion': id_notificacion, 'medio': 'Email', 'id_alerta': None, 'intentos': 0,
+            'asunto': asunto or f"Alerta {id_notificacion}", 'cuerpo': f"<p>Detalle {id_notificacion}</p>",
+            'tipo_descripcion': 'Incidente', 'token_respuesta': f"tok-{id_notificacion}"}
+
+
+def fila(email):
+    return {'IdDestinatario': None, 'EmailDestinatario': email, 'Estado': 'pendiente'}
+
+
+def acumular(resumenes, notif, *emails):
+    """Acumula la notificación con todos sus destinatarios en modo resumen"""
+    filas = [fila(email) for email in emails]
+    resumenes.agregar(notif, filas, filas, 0, [(notif, email) for email in emails], {})
+
+
+class EmailEnMemoria(EmailService):
+    """EmailService que registra los emails en lugar de enviarlos por SMTP"""
+
+    def __init__(self):
+        super().__init__()
+        self.enviados = []
+
+    def enviar_email(self, destinatario, asunto, cuerpo, notification_id=None, token_respuesta=None,
+                     elevar_errores=False):
+        self.enviados.append({'destinatario': destinatario, 'asunto': asunto, 'cuerpo': cuerpo,
+                              'notification_id': notification_id})
+        return True
+
+
+class TestResumenesPendientes(unittest.TestCase):
+    """Pruebas del acumulador de envíos en modo resumen de alertas_service.py"""
+
+    def test_agrupa_por_destinatario_entre_lotes(self):
+        resumenes = ResumenesPendientes(ventana_segundos=60)
+        # Primer lote
+        acumular(resumenes, notificacion(1), 'ana@x.com', 'beto@x.com')
+        # Segundo lote: mismo destinatario con otra capitalización
+        acumular(resumenes, notificacion(2), 'Ana@X.com')
+
+        self.assertEqual(resumenes.ids(), [1, 2])
+        self.assertEqual(sorted(resumenes.por_destinatario), ['ana@x.com', 'beto@x.com'])
+        self.assertEqual([(notif['IdNotificacion'], email) for notif, email in resumenes.por_destinatario['ana@x.com']],
+                         [(1, 'ana@x.com'), (2, 'Ana@X.com')])
+
+    def test_vencido_segun_la_ventana(self):
+        self.assertFalse(ResumenesPendientes(ventana_segundos=0).vencido())
+
+        inmediato = ResumenesPendientes(ventana_segundos=0)
+        acumular(inmediato, notificacion(1), 'ana@x.com')
+        self.assertTrue(inmediato.vencido())
+
+        espera = ResumenesPendientes(ventana_segundos=60)
+        acumular(espera, notificacion(1), 'ana@x.com')
+        self.assertFalse(espera.vencido())
+
+    def test_vaciar_retorna_lo_acumulado_y_reinicia(self):
+        resumenes = ResumenesPendientes(ventana_segundos=0)
+        acumular(resumenes, notificacion(1), 'ana@x.com')
+
+        notificaciones, por_destinatario, futures = resumenes.vaciar()
+        self.assertEqual([notif['IdNotificacion'] for notif, _, _, _ in notificaciones], [1])
+        self.assertEqual(list(por_destinatario), ['ana@x.com'])
+        self.assertEqual(futures, {})
+
+        self.assertEqual(resumenes.ids(), [])
+        self.assertEqual(resumenes.por_destinatario, {})
+        self.assertFalse(resumenes.vencido())
+
+
+class TestDespacharResumenes(unittest.TestCase):
+    """Pruebas del envío de lo acumulado en ProcesadorNotificaciones._despachar_resumenes"""
+
+    def setUp(self):
+        self.email_service = alertas_service.email_service
+        self.actualizar_destinatarios_lote = NotificacionesService.actualizar_destinatarios_lote
+        self.confirmar_resultados_lote = NotificacionesService.confirmar_resultados_lote
+        alertas_service.email_service = self.email = EmailEnMemoria()
+
+        self.resultados = []
+        NotificacionesService.actualizar_destinatarios_lote = staticmethod(lambda seguimiento: None)
+        NotificacionesService.confirmar_resultados_lote = staticmethod(
+            lambda resultados, usuario='sistema': self.resultados.extend(resultados))
+
+    def tearDown(self):
+        alertas_service.email_service = self.email_service
+        NotificacionesService.actualizar_destinatarios_lote = staticmethod(self.actualizar_destinatarios_lote)
+        NotificacionesService.confirmar_resultados_lote = staticmethod(self.confirmar_resultados_lote)
+
+    def test_un_resumen_por_destinatario_con_varias_notificaciones(self):
+        resumenes = ResumenesPendientes(ventana_segundos=0)
+        acumular(resumenes, notificacion(1, 'Disco lleno'), 'ana@x.com', 'beto@x.com')
+        acumular(resumenes, notificacion(2, 'CPU alta'), 'ana@x.com')
+
+        confirmadas = ProcesadorNotificaciones._despachar_resumenes(resumenes)
+
+        self.assertEqual(confirmadas, [1, 2])
+        por_destinatario = {}
+        for enviado in self.email.enviados:
+            por_destinatario.setdefault(enviado['destinatario'], []).append(enviado)
+        # ana@x.com recibe un solo resumen con ambas notificaciones
+        self.assertEqual(len(por_destinatario['ana@x.com']), 1)
+        resumen = por_destinatario['ana@x.com'][0]
+        self.assertTrue(resumen['asunto'].startswith("Resumen: 2 notificaciones"))
+        self.assertIn("Disco lleno", resumen['cuerpo'])
+        self.assertIn("CPU alta", resumen['cuerpo'])
+        # beto@x.com tiene una sola notificación: va como email individual
+        self.assertEqual(len(por_destinatario['beto@x.com']), 1)
+        self.assertEqual(por_destinatario['beto@x.com'][0]['notification_id'], 1)
+        self.assertEqual(por_destinatario['beto@x.com'][0]['asunto'], 'Disco lleno')
+
+        self.assertEqual(sorted((r['IdNotificacion'], r['estado']) for r in self.resultados),
+                         [(1, 'enviado'), (2, 'enviado')])
+        self.assertEqual(resumenes.ids(), [])
+
+    def test_sin_acumulados_no_envia_ni_confirma(self):
+        self.assertEqual(ProcesadorNotificaciones._despachar_resumenes(ResumenesPendientes()), [])
+        self.assertEqual(self.email.enviados, [])
+        self.assertEqual(self.resultados, [])
+
+
+class TestBuildDigestEmail(unittest.TestCase):
+    """Pruebas del HTML del email de resumen de email_service.py"""
+
+    def test_una_seccion_con_botones_por_notificacion(self):
+        email = EmailService()
+        email.base_url = 'https://alertas.example.com'
+        cuerpo = email.build_digest_email([notificacion(7, 'Disco lleno'), notificacion(8, 'CPU alta')])
+
+        self.assertIn("Resumen de 2 notificaciones", cuerpo)
+        for id_notificacion, asunto in ((7, 'Disco lleno'), (8, 'CPU alta')):
+            self.assertIn(f"#{id_notificacion} · Incidente", cuerpo)
+            self.assertIn(f"<h3 style=\"margin: 0 0 12px 0;\">{asunto}</h3>", cuerpo)
+            self.assertIn(f"<p>Detalle {id_notificacion}</p>", cuerpo)
+            for accion in ('received', 'resolved', 'cancel'):
+                self.assertIn(f"https://alertas.example.com/notifications/{id_notificacion}/{accion}"
+                              f"?token=tok-{id_notificacion}", cuerpo)
+        # Las secciones respetan el orden de las notificaciones
+        self.assertLess(cuerpo.index("#7 ·"), cuerpo.index("#8 ·"))
+
+
+if __name__ == '__main__':
+    unittest.main()
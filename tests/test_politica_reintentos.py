@@ -0,0 +1,97 @@
+import smtplib
+import unittest
+
+from app.services.alertas_service import (
+    NotificacionesService, ProcesadorNotificaciones,
+    REINTENTOS_MAX, REINTENTO_BASE_SEGUNDOS, REINTENTO_MAX_SEGUNDOS
+)
+from app.services.email_service import ErrorSMTP
+
+
+def notificacion(intentos=0):
+    return {'IdNotificacion': 1, 'medio': 'Email', 'id_alerta': None, 'intentos': intentos}
+
+
+def resultado_error(intentos=0, error_tipo='SMTPServerDisconnected', permanente=False):
+    return {'IdNotificacion': 1, 'estado': 'error', 'accion': 'ERROR_NOTIFICACION', 'descripcion': 'falla',
+            'medio': 'Email', 'intentos': intentos, 'error_tipo': error_tipo, 'permanente': permanente}
+
+
+class TestClasificacionErroresSMTP(unittest.TestCase):
+    """Pruebas de ErrorSMTP.desde_excepcion de email_service.py"""
+
+    def test_destinatario_rechazado_5xx_es_permanente(self):
+        error = ErrorSMTP.desde_excepcion(smtplib.SMTPRecipientsRefused({'a@x.com': (550, b'No such user')}))
+        self.assertEqual((error.tipo, error.permanente), ('SMTP550', True))
+
+    def test_destinatario_rechazado_4xx_es_transitorio(self):
+        error = ErrorSMTP.desde_excepcion(smtplib.SMTPRecipientsRefused({'a@x.com': (450, b'Mailbox busy')}))
+        self.assertEqual((error.tipo, error.permanente), ('SMTP450', False))
+
+    def test_respuesta_del_servidor_segun_codigo(self):
+        permanente = ErrorSMTP.desde_excepcion(smtplib.SMTPDataError(554, b'Message rejected'))
+        transitorio = ErrorSMTP.desde_excepcion(smtplib.SMTPSenderRefused(421, b'Try later', 'yo@x.com'))
+        self.assertEqual((permanente.tipo, permanente.permanente), ('SMTP554', True))
+        self.assertEqual((transitorio.tipo, transitorio.permanente), ('SMTP421', False))
+
+    def test_autenticacion_y_conexion_son_transitorios(self):
+        autenticacion = ErrorSMTP.desde_excepcion(smtplib.SMTPAuthenticationError(535, b'Bad credentials'))
+        desconectado = ErrorSMTP.desde_excepcion(smtplib.SMTPServerDisconnected('Connection unexpectedly closed'))
+        timeout = ErrorSMTP.desde_excepcion(TimeoutError('timed out'))
+        self.assertEqual((autenticacion.tipo, autenticacion.permanente), ('SMTP535', False))
+        self.assertEqual((desconectado.tipo, desconectado.permanente), ('SMTPServerDisconnected', False))
+        self.assertEqual((timeout.tipo, timeout.permanente), ('TimeoutError', False))
+
+
+class TestPlanificarReintento(unittest.TestCase):
+    """Pruebas de la política de reintentos de NotificacionesService._planificar_reintento"""
+
+    def test_backoff_con_jitter_dentro_de_limites(self):
+        for intentos in range(REINTENTOS_MAX['Email'] - 1):
+            espera_completa = min(REINTENTO_BASE_SEGUNDOS * (2 ** intentos), REINTENTO_MAX_SEGUNDOS)
+            esperas = set()
+            for _ in range(200):
+                resultado = NotificacionesService._planificar_reintento(resultado_error(intentos))
+                self.assertEqual(resultado['estado'], 'reintentar')
+                self.assertGreaterEqual(resultado['espera_segundos'], int(espera_completa / 2))
+                self.assertLessEqual(resultado['espera_segundos'], espera_completa)
+                esperas.add(resultado['espera_segundos'])
+            # Con jitter los reintentos no quedan sincronizados
+            if espera_completa >= 4:
+                self.assertGreater(len(esperas), 1)
+
+    def test_sin_mas_intentos_pasa_a_fallido(self):
+        resultado = NotificacionesService._planificar_reintento(resultado_error(REINTENTOS_MAX['Email'] - 1))
+        self.assertEqual((resultado['estado'], resultado['accion']), ('fallido', 'NOTIFICACION_FALLIDA'))
+        self.assertNotIn('espera_segundos', resultado)
+
+    def test_error_permanente_no_se_reintenta(self):
+        errores = [ErrorSMTP.desde_excepcion(smtplib.SMTPRecipientsRefused({'a@x.com': (550, b'No such user')}))]
+        resultado = ProcesadorNotificaciones._resultado_email(notificacion(), ['a@x.com'], 0, errores)
+        self.assertTrue(resultado['permanente'])
+
+        resultado = NotificacionesService._planificar_reintento(resultado)
+        self.assertEqual(resultado['estado'], 'fallido')
+        self.assertNotIn('espera_segundos', resultado)
+
+    def test_parcial_con_fallas_permanentes_no_se_reprograma(self):
+        errores = [ErrorSMTP('rechazado', 'SMTP550', permanente=True)]
+        resultado = ProcesadorNotificaciones._resultado_email(notificacion(), ['a@x.com', 'b@x.com'], 1, errores)
+        resultado = NotificacionesService._planificar_reintento(resultado)
+        self.assertEqual(resultado['estado'], 'parcial')
+        self.assertNotIn('espera_segundos', resultado)
+
+    def test_parcial_con_falla_transitoria_se_reintenta_hasta_el_maximo(self):
+        errores = [ErrorSMTP('rechazado', 'SMTP550', permanente=True), ErrorSMTP('timeout', 'TimeoutError')]
+        destinatarios = ['a@x.com', 'b@x.com', 'c@x.com']
+        resultado = ProcesadorNotificaciones._resultado_email(notificacion(), destinatarios, 1, errores)
+        self.assertEqual(resultado['error_tipo'], 'TimeoutError')
+        self.assertEqual(NotificacionesService._planificar_reintento(resultado)['estado'], 'reintentar')
+
+        ultimo = notificacion(REINTENTOS_MAX['Email'] - 1)
+        resultado = ProcesadorNotificaciones._resultado_email(ultimo, destinatarios, 1, errores)
+        self.assertEqual(NotificacionesService._planificar_reintento(resultado)['estado'], 'parcial')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import socket
+import time
+import unittest
+
+from app.utils import senal_procesador
+from app.utils.senal_procesador import SenalProcesador, notificar_procesador
+
+
+class TestSenalProcesador(unittest.TestCase):
+    """Pruebas de la señal de despertar del procesador (UDP en localhost) de senal_procesador.py"""
+
+    def setUp(self):
+        self.puerto = senal_procesador.WAKEUP_PORT
+        # Un puerto libre para no chocar con un procesador en ejecución
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.bind(('127.0.0.1', 0))
+            senal_procesador.WAKEUP_PORT = s.getsockname()[1]
+        self.senal = SenalProcesador(intervalo_min=1, intervalo_max=8)
+
+    def tearDown(self):
+        self.senal.cerrar()
+        senal_procesador.WAKEUP_PORT = self.puerto
+
+    def test_despierta_al_recibir_una_senal(self):
+        self.senal.intervalo_actual = 8
+        self.assertTrue(notificar_procesador())
+        inicio = time.monotonic()
+        self.assertTrue(self.senal.esperar(5))
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(self.senal.intervalo_actual, 1)
+
+    def test_varias_senales_despiertan_un_solo_ciclo(self):
+        for _ in range(5):
+            notificar_procesador()
+        time.sleep(0.05)
+        self.assertTrue(self.senal.esperar(1))
+        self.assertFalse(self.senal.esperar(0.1))
+
+    def test_sin_senal_espera_el_timeout(self):
+        inicio = time.monotonic()
+        self.assertFalse(self.senal.esperar(0.2))
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.2)
+
+    def test_espera_crece_sin_trabajo(self):
+        for esperado in (2, 4, 8, 8):
+            self.senal.registrar_ciclo(0)
+            self.assertEqual(self.senal.intervalo_actual, esperado)
+        self.senal.registrar_ciclo(3)
+        self.assertEqual(self.senal.intervalo_actual, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import smtplib
+import time
+import unittest
+
+from app.services.email_service import SMTPSessionPool, ErrorSMTP
+
+
+class ServidorSimulado:
+    """Sesión SMTP en memoria: registra los envíos y puede cortarse como lo haría el servidor"""
+
+    def __init__(self):
+        self.viva = True
+        self.cerrada = False
+        self.enviados = []
+
+    def noop(self):
+        if not self.viva:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return (250, b'OK')
+
+    def sendmail(self, remitente, destinatario, mensaje):
+        if not self.viva:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.enviados.append(destinatario)
+
+    def rset(self):
+        pass
+
+    def quit(self):
+        self.cerrada = True
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolSimulado(SMTPSessionPool):
+    """Pool que abre sesiones simuladas en lugar de conectarse al servidor SMTP"""
+
+    def __init__(self, **kwargs):
+        super().__init__('smtp.prueba', 587, 'usuario', 'clave', **kwargs)
+        self.servidores = []
+
+    def _conectar(self):
+        self.servidores.append(ServidorSimulado())
+        return {'server': self.servidores[-1], 'mensajes': 0, 'ultimo_uso': time.monotonic()}
+
+
+class TestSMTPSessionPool(unittest.TestCase):
+    """Pruebas del pool de sesiones SMTP de email_service.py con sesiones simuladas"""
+
+    def test_reutiliza_la_sesion(self):
+        pool = PoolSimulado()
+        for destinatario in ('a@x.com', 'b@x.com', 'c@x.com'):
+            pool.enviar('yo@x.com', destinatario, 'mensaje')
+        self.assertEqual(len(pool.servidores), 1)
+        self.assertEqual(pool.servidores[0].enviados, ['a@x.com', 'b@x.com', 'c@x.com'])
+
+    def test_reemplaza_sesion_ociosa_caida(self):
+        pool = PoolSimulado(noop_interval=0)
+        pool.enviar('yo@x.com', 'a@x.com', 'mensaje')
+        primera = pool.servidores[0]
+        primera.viva = False
+
+        pool.enviar('yo@x.com', 'b@x.com', 'mensaje')
+        self.assertEqual(len(pool.servidores), 2)
+        self.assertTrue(primera.cerrada)
+        self.assertEqual(pool.servidores[1].enviados, ['b@x.com'])
+
+    def test_reintenta_una_vez_si_se_corta_durante_el_envio(self):
+        # noop_interval alto: la sesión se reutiliza sin verificar y se corta en el envío
+        pool = PoolSimulado(noop_interval=60)
+        pool.enviar('yo@x.com', 'a@x.com', 'mensaje')
+        pool.servidores[0].viva = False
+
+        pool.enviar('yo@x.com', 'b@x.com', 'mensaje')
+        self.assertEqual(len(pool.servidores), 2)
+        self.assertEqual(pool.servidores[1].enviados, ['b@x.com'])
+        self.assertEqual(pool._total, 1)
+
+    def test_renueva_al_llegar_al_maximo_de_mensajes(self):
+        pool = PoolSimulado(max_mensajes_por_conexion=2)
+        for i in range(5):
+            pool.enviar('yo@x.com', f'{i}@x.com', 'mensaje')
+        self.assertEqual([len(s.enviados) for s in pool.servidores], [2, 2, 1])
+        self.assertTrue(all(s.cerrada for s in pool.servidores[:2]))
+
+    def test_pool_lleno_falla_despues_de_espera_maxima(self):
+        pool = PoolSimulado(max_size=1, espera_maxima=0.2)
+        ocupada = pool._adquirir()
+        inicio = time.monotonic()
+        with self.assertRaises(ErrorSMTP) as contexto:
+            pool.enviar('yo@x.com', 'a@x.com', 'mensaje')
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.2)
+        self.assertEqual((contexto.exception.tipo, contexto.exception.permanente), ('EsperaSesionSMTP', False))
+
+        pool._liberar(ocupada)
+        pool.enviar('yo@x.com', 'a@x.com', 'mensaje')
+        self.assertEqual(len(pool.servidores), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
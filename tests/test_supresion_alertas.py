@@ -0,0 +1,109 @@
+import unittest
+
+from app.services import alertas_service
+from app.services.alertas_service import MarcaPendientes, NotificacionesService, ProcesadorNotificaciones
+
+NUMERO = '+573001234567'
+
+
+class BaseEnMemoria:
+    """Reemplazo de db_config para la supresión: copias previas, transiciones y copias suprimidas"""
+
+    def __init__(self, previas=(), suprimidas=()):
+        self.previas = list(previas)          # (IdNotificacion, Estado) de la alerta 'A1'
+        self.suprimidas = list(suprimidas)    # (IdNotificacion, IdSuprimidaPor)
+        self.sentencias = []
+
+    def execute_query(self, query, params=None):
+        self.sentencias.append((query, params))
+        if 'DECLARE @transiciones' in query:
+            # Todas las transiciones se aplican (5 parámetros por notificación y el WorkerId al final)
+            return [{'IdNotificacion': id_notif} for id_notif in params[:-1:5]]
+        if 'deleted.IdSuprimidaPor' in query:
+            return [{'IdNotificacion': id_notif, 'IdSuprimidaPor': por, 'IdAlerta': 'A1', 'Medio': 'Whatsapp'}
+                    for id_notif, por in self.suprimidas if por in params]
+        return [{'IdNotificacion': id_notif, 'IdAlerta': 'A1', 'IdTipoNotificacion': 1,
+                 'Destinatario': NUMERO, 'Medio': 'Whatsapp', 'Estado': estado}
+                for id_notif, estado in self.previas]
+
+
+class AuditoriaEnMemoria:
+    def __init__(self):
+        self.registros = []
+
+    def registrar(self, accion, detalle, usuario='sistema', **columnas):
+        self.registros.append((accion, columnas.get('id_notificacion'), columnas.get('resultado')))
+
+
+def notificacion(id_notificacion, destinatario=NUMERO):
+    return {'IdNotificacion': id_notificacion, 'id_alerta': 'A1', 'medio': 'Whatsapp',
+            'destinatario': destinatario, 'intentos': 0}
+
+
+class TestSupresionAlertas(unittest.TestCase):
+    """Pruebas de la supresión de alertas repetidas de alertas_service.py"""
+
+    def setUp(self):
+        self.originales = (alertas_service.db_config, alertas_service.auditoria,
+                           alertas_service.SUPRESION_VENTANA_SEGUNDOS, dict(alertas_service.MARCAS_PENDIENTES))
+        alertas_service.auditoria = self.auditoria = AuditoriaEnMemoria()
+        alertas_service.SUPRESION_VENTANA_SEGUNDOS = 600
+        for medio in alertas_service.MARCAS_PENDIENTES:
+            alertas_service.MARCAS_PENDIENTES[medio] = MarcaPendientes()
+
+    def tearDown(self):
+        (alertas_service.db_config, alertas_service.auditoria,
+         alertas_service.SUPRESION_VENTANA_SEGUNDOS, marcas) = self.originales
+        alertas_service.MARCAS_PENDIENTES.update(marcas)
+
+    def suprimir(self, lote, previas=()):
+        alertas_service.db_config = BaseEnMemoria(previas=previas)
+        a_enviar, suprimidas = ProcesadorNotificaciones._suprimir_repetidas(lote)
+        return [n['IdNotificacion'] for n in a_enviar], {r['IdNotificacion']: r['suprimida_por'] for r in suprimidas}
+
+    def test_copias_del_lote_se_envian_una_vez(self):
+        lote = [notificacion(12), notificacion(10), notificacion(11, '+573009999999')]
+        self.assertEqual(self.suprimir(lote), ([10, 11], {12: 10}))
+
+    def test_suprime_detras_de_una_copia_viva(self):
+        for estado in ('enviado', 'recibido', 'reintentar'):
+            self.assertEqual(self.suprimir([notificacion(10)], previas=[(5, estado)]), ([], {10: 5}), estado)
+
+    def test_no_suprime_detras_de_una_copia_que_no_llego(self):
+        for estado in ('parcial', 'error', 'fallido', 'suprimido', 'cancelado'):
+            self.assertEqual(self.suprimir([notificacion(10)], previas=[(5, estado)]), ([10], {}), estado)
+
+    def test_copia_en_envio_solo_suprime_si_es_anterior(self):
+        self.assertEqual(self.suprimir([notificacion(10)], previas=[(5, 'procesando')]), ([], {10: 5}))
+        self.assertEqual(self.suprimir([notificacion(10)], previas=[(15, 'procesando')]), ([10], {}))
+
+    def test_fallida_libera_sus_copias_suprimidas(self):
+        alertas_service.db_config = base = BaseEnMemoria(suprimidas=[(11, 10), (12, 10), (21, 20)])
+        marca = alertas_service.MARCAS_PENDIENTES['Whatsapp']
+        marca.ultimo_id = 100
+
+        NotificacionesService.confirmar_resultados_lote([
+            {'IdNotificacion': 10, 'estado': 'error', 'accion': 'ERROR_NOTIFICACION_WHATSAPP', 'descripcion': 'HTTP400',
+             'medio': 'Whatsapp', 'intentos': 0, 'error_tipo': 'HTTP400', 'permanente': True},
+            {'IdNotificacion': 20, 'estado': 'enviado', 'accion': 'NOTIFICACION_WHATSAPP_ENVIADA',
+             'descripcion': 'ok', 'medio': 'Whatsapp', 'intentos': 0, 'error_tipo': None},
+        ])
+
+        liberacion = [params for query, params in base.sentencias if 'deleted.IdSuprimidaPor' in query]
+        self.assertEqual(liberacion, [[10]])
+        self.assertEqual(sorted((id_notif, resultado) for accion, id_notif, resultado in self.auditoria.registros
+                                if accion == 'SUPRESION_LIBERADA'), [(11, 'pendiente'), (12, 'pendiente')])
+        # Quedaron por debajo de la marca de agua: el próximo ciclo hace barrido completo
+        self.assertIsNone(marca.ultimo_id)
+
+    def test_sin_fallidas_no_libera(self):
+        alertas_service.db_config = base = BaseEnMemoria(suprimidas=[(11, 10)])
+        NotificacionesService.confirmar_resultados_lote([
+            {'IdNotificacion': 10, 'estado': 'enviado', 'accion': 'NOTIFICACION_WHATSAPP_ENVIADA',
+             'descripcion': 'ok', 'medio': 'Whatsapp', 'intentos': 0, 'error_tipo': None},
+        ])
+        self.assertFalse(any('deleted.IdSuprimidaPor' in query for query, _ in base.sentencias))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import time
+import unittest
+
+from app.utils.tokens_accion import FirmadorTokensAccion
+
+
+class TestTokensAccion(unittest.TestCase):
+    """Pruebas de los tokens de acción firmados de tokens_accion.py (sin base de datos)"""
+
+    def setUp(self):
+        self.firmador = FirmadorTokensAccion(claves='k1:secreto-uno,k2:secreto-dos', kid_activo='k2', ttl_dias=7)
+
+    def test_token_valido(self):
+        token = self.firmador.firmar(42, 'resolved')
+        self.assertTrue(FirmadorTokensAccion.es_firmado(token))
+        self.assertEqual(self.firmador.verificar(token, 42, 'resolved'), (True, None))
+
+    def test_rechaza_otra_notificacion_o_accion(self):
+        token = self.firmador.firmar(42, 'received')
+        self.assertFalse(self.firmador.verificar(token, 43, 'received')[0])
+        self.assertFalse(self.firmador.verificar(token, 42, 'cancel')[0])
+
+    def test_rechaza_token_expirado(self):
+        token = self.firmador.firmar(42, 'cancel', expira=int(time.time()) - 1)
+        self.assertEqual(self.firmador.verificar(token, 42, 'cancel'), (False, 'token expirado'))
+
+    def test_rechaza_firma_alterada(self):
+        token = self.firmador.firmar(42, 'received')
+        payload, firma = token.split('.')
+        otro_payload = self.firmador.firmar(99, 'received').split('.')[0]
+        self.assertEqual(self.firmador.verificar(f"{otro_payload}.{firma}", 99, 'received'), (False, 'firma inválida'))
+        self.assertFalse(self.firmador.verificar('basura.sin-firma', 42, 'received')[0])
+
+    def test_rotacion_de_claves(self):
+        anterior = FirmadorTokensAccion(claves='k1:secreto-uno', ttl_dias=7)
+        token_anterior = anterior.firmar(7, 'resolved')
+        # La clave anterior sigue aceptándose mientras esté en la lista
+        self.assertTrue(self.firmador.verificar(token_anterior, 7, 'resolved')[0])
+        # Al retirarla, sus enlaces dejan de ser válidos
+        sin_k1 = FirmadorTokensAccion(claves='k2:secreto-dos', ttl_dias=7)
+        self.assertFalse(sin_k1.verificar(token_anterior, 7, 'resolved')[0])
+
+    def test_tokens_guardados_en_base_no_son_firmados(self):
+        import secrets
+        self.assertFalse(FirmadorTokensAccion.es_firmado(secrets.token_urlsafe(32)))
+        self.assertFalse(FirmadorTokensAccion(claves='').habilitado)
+
+
+if __name__ == '__main__':
+    unittest.main()
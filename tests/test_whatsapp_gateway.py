@@ -0,0 +1,136 @@
+import unittest
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.whatsapp_service import (
+    WhatsAppService, ProveedorWhatsApp, ProveedorHTTPGateway, ErrorWhatsApp, HTTPSessionPool
+)
+
+# Configuración básica del logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+logger = logging.getLogger(__name__)
+
+
+class _GatewayStub(BaseHTTPRequestHandler):
+    """Servidor local que imita el endpoint /messages de WhatsApp Cloud API"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        servidor = self.server
+        datos = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with servidor.lock:
+            servidor.recibidos.append((self.headers.get('Authorization'), datos))
+            servidor.conexiones.add(self.client_address)
+
+        status = servidor.status
+        cuerpo = json.dumps({'messages': [{'id': f"wamid.{len(servidor.recibidos)}"}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestWhatsAppGateway(unittest.TestCase):
+    """Pruebas del proveedor HTTP de whatsapp_service.py contra un gateway local"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _GatewayStub)
+        self.server.lock = threading.Lock()
+        self.server.recibidos = []
+        self.server.conexiones = set()
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/v19.0/123/messages"
+        self.proveedor = ProveedorHTTPGateway(url=url, token='token-prueba', max_concurrencia=4)
+        self.service = WhatsAppService(proveedor=self.proveedor)
+
+    def tearDown(self):
+        self.service.cerrar()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_envia_formato_cloud_api(self):
+        """El mensaje se envía como JSON de Cloud API con el token Bearer"""
+        exito = self.service.enviar_notificacion('+57 300-123-4567', 'Alerta', 'Servidor caído')
+
+        self.assertTrue(exito)
+        autorizacion, datos = self.server.recibidos[0]
+        self.assertEqual(autorizacion, 'Bearer token-prueba')
+        self.assertEqual(datos['to'], '573001234567')
+        self.assertEqual(datos['type'], 'text')
+        self.assertIn('Servidor caído', datos['text']['body'])
+
+    def test_error_http_retorna_false(self):
+        """Una respuesta de error del gateway se informa como envío fallido"""
+        self.server.status = 500
+        self.assertFalse(self.service.enviar_notificacion('+573001234567', 'Alerta', 'Cuerpo'))
+
+    def test_errores_4xx_son_permanentes(self):
+        """Número, token o mensaje rechazados (4xx) no se reintentan; 408, 429 y 5xx sí"""
+        for status, permanente in ((400, True), (401, True), (404, True), (408, False), (429, False), (503, False)):
+            self.server.status = status
+            with self.assertRaises(ErrorWhatsApp) as contexto:
+                self.service.enviar_notificacion('+573001234567', 'Alerta', 'Cuerpo', elevar_errores=True)
+            self.assertEqual(contexto.exception.tipo, f"HTTP{status}")
+            self.assertEqual(contexto.exception.permanente, permanente, status)
+
+    def test_numero_invalido_es_error_de_validacion(self):
+        """Un número mal formado no llega al gateway y se informa como ValueError"""
+        with self.assertRaises(ValueError):
+            self.service.enviar_notificacion('3001234567', 'Alerta', 'Cuerpo', elevar_errores=True)
+        self.assertEqual(self.server.recibidos, [])
+
+    def test_pool_lleno_falla_despues_de_espera_maxima(self):
+        """Con todas las conexiones tomadas, la siguiente petición falla (transitoria) en lugar de colgarse"""
+        pool = HTTPSessionPool(self.proveedor.url, max_size=1, espera_maxima=0.2)
+        ocupada = pool._adquirir()
+        with self.assertRaises(ErrorWhatsApp) as contexto:
+            pool.post_json({'a': 1})
+        self.assertEqual((contexto.exception.tipo, contexto.exception.permanente), ('EsperaConexionHTTP', False))
+
+        pool._liberar(ocupada)
+        self.assertEqual(pool.post_json({'a': 1})[0], 200)
+        pool.cerrar_todas()
+
+    def test_concurrencia_reutiliza_conexiones(self):
+        """Muchos envíos en paralelo reutilizan como máximo max_concurrencia conexiones"""
+        resultados = []
+
+        def enviar(i):
+            resultados.append(self.service.enviar_notificacion('+573001234567', f"Alerta {i}", 'Cuerpo'))
+
+        hilos = [threading.Thread(target=enviar, args=(i,)) for i in range(40)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(resultados), 40)
+        self.assertTrue(all(resultados))
+        self.assertEqual(len(self.server.recibidos), 40)
+        self.assertLessEqual(len(self.server.conexiones), self.proveedor.max_concurrencia)
+        logger.info(f"✅ 40 envíos usando {len(self.server.conexiones)} conexiones")
+
+
+class TestProveedorWhatsApp(unittest.TestCase):
+    """Interfaz de los backends de whatsapp_service.py"""
+
+    def test_proveedor_sin_enviar_falla_al_crearse(self):
+        class ProveedorIncompleto(ProveedorWhatsApp):
+            nombre = 'incompleto'
+
+        with self.assertRaises(TypeError):
+            ProveedorIncompleto()
+
+
+if __name__ == '__main__':
+    unittest.main()
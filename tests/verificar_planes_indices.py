@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Script para capturar planes de ejecución y tiempos de las consultas más frecuentes
+del procesador y de los botones de acción, antes y después de aplicar
+migrations/add_pending_indexes.sql.
+
+Uso:
+    python tests/verificar_planes_indices.py --etiqueta antes
+    (ejecutar migrations/add_pending_indexes.sql)
+    python tests/verificar_planes_indices.py --etiqueta despues
+"""
+
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.utils.database_config import db_config
+
+logger = logging.getLogger(__name__)
+
+# Consultas de solo lectura equivalentes a las del procesador y de las acciones
+CONSULTAS = {
+    'pendientes_email': """
+        SELECT TOP (50) n.IdNotificacion, n.IdTipoNotificacion, n.Fecha_Programada
+        FROM Notificaciones n
+        WHERE (n.Fecha_Programada IS NULL OR n.Fecha_Programada <= GETDATE())
+          AND n.Estado = 'pendiente'
+          AND (n.Medio = 'Email' OR n.Medio IS NULL)
+          AND n.IdNotificacion > 0
+        ORDER BY n.IdNotificacion ASC
+    """,
+    'pendientes_email_no_sargable': """
+        SELECT TOP (50) n.IdNotificacion, n.IdTipoNotificacion, n.Fecha_Programada
+        FROM Notificaciones n
+        WHERE (n.Fecha_Programada IS NULL OR CAST(n.Fecha_Programada AS DATE) <= CAST(GETDATE() AS DATE))
+          AND n.Estado = 'pendiente'
+          AND (n.Medio = 'Email' OR n.Medio IS NULL)
+        ORDER BY
+            CASE WHEN n.Fecha_Programada IS NULL THEN 0 ELSE 1 END,
+            n.Fecha_Programada ASC,
+            n.IdNotificacion ASC
+    """,
+    'pendientes_whatsapp': """
+        SELECT TOP (50) n.IdNotificacion, n.IdTipoNotificacion, n.Fecha_Programada
+        FROM Notificaciones n
+        WHERE (n.Fecha_Programada IS NULL OR n.Fecha_Programada <= GETDATE())
+          AND n.Estado = 'pendiente'
+          AND n.Medio = 'Whatsapp'
+          AND n.IdNotificacion > 0
+        ORDER BY n.IdNotificacion ASC
+    """,
+    'token_accion': """
+        SELECT IdNotificacion, Estado, FechaExpiracion
+        FROM Notificaciones
+        WHERE TokenRespuesta = (SELECT TOP 1 TokenRespuesta FROM Notificaciones WHERE TokenRespuesta IS NOT NULL)
+    """,
+    'cascada_source': """
+        SELECT COUNT(*) AS Cantidad
+        FROM Notificaciones
+        WHERE Source_IdNotificacion = (SELECT TOP 1 Source_IdNotificacion FROM Notificaciones WHERE Source_IdNotificacion IS NOT NULL)
+          AND Estado = 'pendiente'
+    """,
+}
+
+def capturar_plan(nombre, query):
+    """Ejecuta la consulta con SET STATISTICS XML ON y retorna el XML del plan real"""
+    with db_config.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SET STATISTICS XML ON")
+        try:
+            cursor.execute(query)
+            plan = None
+            # El plan llega como un result set adicional después de los datos
+            while True:
+                if cursor.description:
+                    filas = cursor.fetchall()
+                    columna = cursor.description[0][0]
+                    if 'showplan' in columna.lower() and filas:
+                        plan = filas[0][0]
+                if not cursor.nextset():
+                    break
+            return plan
+        finally:
+            cursor.execute("SET STATISTICS XML OFF")
+
+def medir_tiempo(query, repeticiones):
+    """Ejecuta la consulta varias veces y retorna el tiempo promedio en milisegundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        db_config.execute_query(query)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return sum(tiempos) / len(tiempos), tiempos[len(tiempos) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description='Captura planes y tiempos de las consultas frecuentes')
+    parser.add_argument('--etiqueta', default='antes', help='Nombre de la medición (antes / despues)')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--salida', default=str(root_dir / 'planes'))
+    args = parser.parse_args()
+    
+    carpeta = Path(args.salida) / args.etiqueta
+    carpeta.mkdir(parents=True, exist_ok=True)
+    
+    print(f"📊 CAPTURANDO PLANES Y TIEMPOS - {args.etiqueta.upper()}")
+    print("=" * 60)
+    
+    resumen = []
+    for nombre, query in CONSULTAS.items():
+        try:
+            plan = capturar_plan(nombre, query)
+            if plan:
+                (carpeta / f"{nombre}.sqlplan").write_text(plan, encoding='utf-8')
+            promedio, mediana = medir_tiempo(query, args.repeticiones)
+            usa_indice = [ix for ix in ('IX_Notificaciones_Pendientes', 'IX_Notificaciones_TokenRespuesta',
+                                        'IX_Notificaciones_Source_IdNotificacion') if plan and ix in plan]
+            resumen.append(f"{nombre}\t{promedio:.2f}\t{mediana:.2f}\t{','.join(usa_indice) or '-'}")
+            print(f"✅ {nombre}: promedio {promedio:.2f} ms, mediana {mediana:.2f} ms, índices: {', '.join(usa_indice) or 'ninguno nuevo'}")
+        except Exception as e:
+            print(f"❌ {nombre}: {e}")
+    
+    (carpeta / 'tiempos.tsv').write_text(
+        "consulta\tpromedio_ms\tmediana_ms\tindices\n" + "\n".join(resumen) + "\n", encoding='utf-8')
+    print(f"\n📁 Planes (.sqlplan, abrir con SSMS) y tiempos guardados en {carpeta}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -3,6 +3,7 @@ from flask import Flask, request, render_template_string, redirect, url_for
 from app.services.notification_actions_service import NotificationActionsService
 import logging
 import os
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Configurar logging
@@ -235,6 +236,27 @@ def get_status(notification_id):
     else:
         return {'error': 'Notification not found'}, 404
 
+@app.route('/notifications/<int:notification_id>/history')
+def get_history(notification_id):
+    """Historial de auditoría de una notificación (para investigar incidentes)"""
+    historial = NotificationActionsService.get_audit_history(notification_id)
+    return {
+        'notification_id': notification_id,
+        'history': [
+            {
+                'at': str(fila['fecha_aud']),
+                'action': fila['accion'],
+                'result': fila['Resultado'],
+                'channel': fila['Medio'],
+                'duration_ms': fila['DuracionMs'],
+                'alert_id': fila['IdAlerta'],
+                'detail': fila['detalle'],
+                'user': fila['user']
+            }
+            for fila in historial
+        ]
+    }
+
 @app.route('/admin/stats')
 def admin_stats():
     """Estadísticas administrativas"""
@@ -263,15 +285,45 @@ def server_error(error):
         timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     ), 500
 
-if __name__ == '__main__':
-    from datetime import datetime
+def servir_produccion(host, port):
+    """
+    Sirve la app con waitress: servidor WSGI multihilo con keep-alive que funciona en Windows
+    y Linux. En Linux también se puede usar gunicorn con gunicorn.conf.py (varios procesos y
+    recarga ordenada con HUP). Si waitress no está instalado se usa el servidor de Flask multihilo.
+    """
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.warning("⚠️ waitress no está instalado, se usa el servidor de Flask en modo multihilo")
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
     
+    threads = int(os.getenv('WEB_THREADS', 8))
+    logger.info(f"🧵 waitress con {threads} hilos")
+    serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        # Conexiones abiertas a la vez (incluye las keep-alive ociosas)
+        connection_limit=int(os.getenv('WEB_CONNECTION_LIMIT', 500)),
+        # Cierra las conexiones sin actividad (keep-alive ociosas o clientes lentos)
+        channel_timeout=int(os.getenv('WEB_TIMEOUT', 30)),
+        backlog=int(os.getenv('WEB_BACKLOG', 1024)),
+        ident='Sistema de Notificaciones',
+    )
+
+if __name__ == '__main__':
     # Configuración del servidor
     host = os.getenv('FLASK_HOST', '0.0.0.0')
     port = int(os.getenv('FLASK_PORT', 5000))
     debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+    modo = os.getenv('WEB_SERVER_MODO', 'desarrollo' if debug else 'produccion').lower()
     
-    logger.info(f"🚀 Iniciando servidor de notificaciones en {host}:{port}")
+    logger.info(f"🚀 Iniciando servidor de notificaciones en {host}:{port} (modo {modo})")
     logger.info(f"🔍 Debug mode: {debug}")
     
-    app.run(host=host, port=port, debug=debug)
\ No newline at end of file
+    if modo == 'produccion':
+        servir_produccion(host, port)
+    else:
+        app.run(host=host, port=port, debug=debug)